@@ -1,8 +1,16 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-from io import StringIO
-import base64
+from importlib.util import find_spec
+import os
+import sqlite3
+import time
+import uuid
+
+# Only what the upload page needs is imported here; pandas, NumPy and the
+# analysis modules are imported further down once there is data to show
+from formats import PERFORMANCE_COLUMNS, SEASONAL_COLUMNS, UPLOAD_TYPES
+from profiling import PROFILE_TOOLS, Profiler
+from runs import run_store
+from stages import Stage, StageGraph
 
 # Initialize session state variables for KPI calculation
 if 'kpi_calculated' not in st.session_state:
@@ -12,6 +20,11 @@ if 'kpi_df' not in st.session_state:
 if 'filtered_results' not in st.session_state:
     st.session_state.filtered_results = None
 
+# Identifies this session's holds on the shared dataset store
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+session_id = st.session_state.session_id
+
 # Set page config
 st.set_page_config(
     page_title="AG Selection Tool",
@@ -20,531 +33,1310 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-# Custom CSS
+# Custom CSS, read from app.css once per server process. Streamlit drops
+# elements a rerun does not emit, so the small style tag is sent on every
+# run; it loads nothing over the network.
+@st.cache_resource(show_spinner=False)
+def load_custom_css():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.css')) as f:
+        return f"<style>\n{f.read()}</style>"
+
 def add_custom_css():
-    st.markdown("""
-    <style>
-    @import url('https://fonts.googleapis.com/css2?family=Poppins:wght@400;700&display=swap');
+    st.markdown(load_custom_css(), unsafe_allow_html=True)
+
+add_custom_css()
+
+# Labels of the selection modes, as stored in the run history
+RUN_MODES = {'filters': "Hard filters", 'ranked': "Ranked score", 'grouped': "Periods or stores"}
+
+# Optional performance panel in the sidebar; it is filled in at the end of the run
+with st.sidebar:
+    st.markdown("### Performance")
+    show_performance = st.checkbox("Show performance panel", key="show_performance",
+                                   help="Time, peak memory, row counts and cache hits per stage")
+    track_memory = capture_tool = None
+    if show_performance:
+        track_memory = st.checkbox("Track peak memory (slower)", key="track_memory")
+        capture_tool = st.selectbox("Profile the next analysis run", ['Off'] + PROFILE_TOOLS,
+                                    key="capture_tool")
+    performance_panel = st.container()
     
-    html, body, [class*="css"] {
-        font-family: 'Poppins', sans-serif;
-    }
+    # Past runs, stored locally; filled in at the end so this run is listed too
+    st.markdown("### Run history")
+    run_history_panel = st.container()
+
+# Download panel for one result table. Bytes are only serialized when the user
+# asks for them, and the panel reruns on its own so the page is not rebuilt.
+@st.fragment
+def show_download(df, version, name, label, key_prefix=''):
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        fmt_label = st.selectbox("Format", list(DOWNLOAD_FORMATS), key=f"{key_prefix}{name}_download_format",
+                                 label_visibility="collapsed")
+    fmt, ext, mime = DOWNLOAD_FORMATS[fmt_label]
+    cache_key = (version, name, fmt)
     
-    h1, h2, h3, h4, h5, h6 {
-        font-family: 'Poppins', sans-serif;
-        font-weight: 700;
-    }
+    with col2:
+        data = download_cache.get(cache_key)
+        if data is None and st.button(f"Prepare {label}", key=f"{key_prefix}{name}_prepare_download"):
+            data = download_cache.serialize(cache_key, df, fmt)
+        if data is not None:
+            st.download_button(
+                f"Download {label} ({format_size(len(data))})",
+                data=data,
+                file_name=f"{name}.{ext}",
+                mime=mime,
+                key=f"{key_prefix}{name}_download",
+                on_click="ignore",
+            )
+
+# Paged results table. Sorting and filtering run on the typed columns, and
+# only the visible page is formatted, so large selections render quickly.
+@st.fragment
+def show_results_table(df, version, columns, default_sort='SUM sales', name='results'):
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        sort_column = st.selectbox("Sort by", columns, index=columns.index(default_sort),
+                                   key=f"{name}_sort_column")
+    with col2:
+        descending = st.checkbox("Descending", value=True, key=f"{name}_descending")
+    with col3:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+                                 key=f"{name}_page_size")
     
-    .main-header {
-        color: #1A314B;
-        font-weight: 700;
-    }
+    col1, col2 = st.columns(2)
+    with col1:
+        filter_column = st.selectbox("Filter by", [None] + columns, key=f"{name}_filter_column",
+                                     format_func=lambda col: "No filter" if col is None else col)
+    query = low = high = None
+    if filter_column is not None:
+        with col2:
+            if is_numeric_column(df, filter_column):
+                col_low, col_high = st.columns(2)
+                with col_low:
+                    low = st.number_input("Min", value=None, key=f"{name}_filter_low")
+                with col_high:
+                    high = st.number_input("Max", value=None, key=f"{name}_filter_high")
+            else:
+                query = st.text_input("Contains", key=f"{name}_filter_query")
     
-    .subheader {
-        color: #1F6C6D;
-        font-weight: 400;
-    }
+    # Reuse the row order until the result, filter or sort changes
+    view_key = (version, filter_column, query, low, high, sort_column, descending)
+    cached = st.session_state.get(f"{name}_view")
+    if cached is None or cached[0] != view_key:
+        positions = filter_positions(df, filter_column, query, low, high)
+        positions = sort_positions(df, positions, sort_column, ascending=not descending)
+        st.session_state[f"{name}_view"] = (view_key, positions)
+        st.session_state[f"{name}_page"] = 1
+    positions = st.session_state[f"{name}_view"][1]
     
-    .highlight {
-        color: #FD604A;
-    }
+    pages = max(1, -(-len(positions) // page_size))
+    if st.session_state.get(f"{name}_page", 1) > pages:
+        st.session_state[f"{name}_page"] = pages
+    page = get_page(df, positions, st.session_state.get(f"{name}_page", 1), page_size)
     
-    .stButton button {
-        background-color: #1F6C6D;
-        color: white;
-        font-family: 'Poppins', sans-serif;
-    }
+    st.dataframe(format_page(page.rows[columns]), height=300)
     
-    .stButton button:hover {
-        background-color: #184E4F;
-    }
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        st.number_input("Page", min_value=1, max_value=pages, key=f"{name}_page",
+                        label_visibility="collapsed")
+    with col2:
+        first = (page.page - 1) * page_size
+        st.caption(f"Page {page.page} of {page.pages}: rows {min(first + 1, page.matched):,}-"
+                   f"{min(first + page_size, page.matched):,} of {page.matched:,}"
+                   + (f" matching (out of {len(df):,})" if page.matched != len(df) else ""))
+
+# Function to show the top recommendations as cards
+def show_recommendation_cards(top_recommendations):
+    for i, (idx, row) in enumerate(top_recommendations.iterrows(), 1):
+        score = f" (score {row['Score']:.2f})" if 'Score' in row else ""
+        st.markdown(f"""
+        <div class="success-card">
+            <h4>{i}. {row['AG']}{score}</h4>
+            <p><strong>Sales:</strong> ${row['SUM sales']:,.2f} | 
+            <strong>Availability:</strong> {row['AVG availability (%)']:.2f}%</p>
+            <p><strong>SKUs:</strong> {row['SKU Qty']} | 
+            <strong>Products:</strong> {row['Product Qty']}</p>
+            <p><strong>Dynamics:</strong> Surplus Cost: ${row['Surplus cost']:,.2f} | 
+            Lost Sales: ${row['Lost sales']:,.2f}</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+# Function to show the recommendation cards, the results table, the KPI
+# analysis and the downloads for one analysis run
+def show_recommendations(filtered_df, kpi_results, rendered, key_prefix=''):
+    if not filtered_df.empty:
+        st.markdown("### Recommended AGs for Pilot")
+        
+        # Top recommendations by sales
+        with profiler.stage('render_cards', rows_in=len(filtered_df)) as info:
+            show_recommendation_cards(rendered['top_recommendations'])
+            info['rows_out'] = len(rendered['top_recommendations'])
+        
+        # Store results in session state
+        result_version = rendered['version']
+        if not key_prefix:
+            st.session_state.kpi_df = kpi_results
+            
+            # Keep a reference to the results in session state; they are never
+            # modified in place, so no copy is needed
+            st.session_state.filtered_results = filtered_df
+        
+        # Complete results in a table with KPIs integrated
+        st.markdown("### Complete Results with KPI Recommendations")
+        
+        # Show the results page by page with KPI Recommendations right after AG
+        show_results_table(filtered_df, result_version, rendered['ordered_cols'],
+                           'Score' if 'Score' in filtered_df.columns else 'SUM sales', f"{key_prefix}results")
+        
+        # Download button
+        show_download(filtered_df, result_version, "filtered_results", "results", key_prefix)
+        
+        # Add KPI analysis section
+        st.markdown("### KPI Analysis")
+        
+        # KPI counts for the bar chart
+        kpi_counts = rendered['kpi_counts']
+        
+        # Display bar chart of KPI distribution
+        st.markdown("#### KPI Distribution Across All AGs")
+        
+        # Setup the chart
+        st.bar_chart(
+            kpi_counts, 
+            x='KPI',
+            y='Count',
+            color="#1F6C6D"
+        )
+        
+        # Calculate percentages for the total pool
+        total_kpis = len(kpi_results)
+        
+        st.markdown("#### KPI Impact Analysis")
+        st.markdown("""
+        <div class="warning-card">
+            <h4>KPI Distribution Summary:</h4>
+        """, unsafe_allow_html=True)
+        
+        for idx, row in kpi_counts.iterrows():
+            kpi = row['KPI']
+            count = row['Count']
+            percentage = round((count / total_kpis) * 100, 1)
+            rationale = get_kpi_rationale(kpi)
+            st.markdown(f"""
+            <p><strong>{kpi}</strong> ({percentage}% of KPIs) - {rationale}</p>
+            """, unsafe_allow_html=True)
+        
+        st.markdown("</div>", unsafe_allow_html=True)
+        
+        # Download button
+        st.markdown("#### Download KPI Analysis")
+        show_download(kpi_results, result_version, "kpi_recommendations", "KPI analysis", key_prefix)
+        
+    else:
+        st.warning("No recommendations available with current parameters. Please adjust your filters.")
+
+# Function to show shared vs per-session memory and how many sessions fit
+def show_memory_report(report):
+    st.markdown("#### Memory")
+    st.caption(f"Shared datasets: {format_size(report['shared_bytes'])} | "
+               f"This session: {format_size(report['session_bytes'])}")
+    if report['sessions_per_host'] is not None:
+        st.caption(f"Host memory {format_size(report['host_bytes'])} fits about "
+                   f"{report['sessions_per_host']:,} sessions like this one")
+    datasets = pd.DataFrame(ingest_cache.stats(), columns=['key', 'rows', 'bytes', 'sessions', 'idle_seconds'])
+    if not datasets.empty:
+        datasets['bytes'] = datasets['bytes'].map(format_size)
+        st.dataframe(datasets.rename(columns={
+            'key': 'Dataset', 'rows': 'Rows', 'bytes': 'Size', 'sessions': 'Sessions', 'idle_seconds': 'Idle (s)',
+        }), hide_index=True)
+
+# Function to fill the sidebar performance panel with this run's measurements
+def show_performance_panel(profiler):
+    memory = memory_report(ingest_cache.frames() + cached_indexes(), dict(st.session_state))
+    show_memory_report(memory)
     
-    .st-eb {
-        background-color: #1F6C6D;
-    }
+    st.markdown("#### Stages")
+    if profiler.memory_busy:
+        st.caption("Another session is tracking peak memory, so peaks are left out of this run.")
+    profile = profiler.frame()
+    if profile.empty:
+        st.caption("No stages ran on this rerun.")
+    else:
+        st.caption(f"{len(profile)} stages measured, {profiler.total_seconds:.2f}s in total")
+        profile['peak_bytes'] = profile['peak_bytes'] / 1024 ** 2
+        st.dataframe(
+            profile.rename(columns={
+                'stage': 'Stage', 'cache_hit': 'Cached', 'seconds': 'Seconds',
+                'peak_bytes': 'Peak MB', 'rows_in': 'Rows in', 'rows_out': 'Rows out',
+            }),
+            hide_index=True,
+        )
+        for name, timings in profiler.details.items():
+            st.caption(f"{name}: " + ", ".join(f"{part} {seconds:.2f}s" for part, seconds in timings.items()))
+        st.download_button(
+            "Download profile (JSON)",
+            data=profiler.to_json(memory=memory),
+            file_name="ag_selection_profile.json",
+            mime="application/json",
+            on_click="ignore",
+        )
     
-    .stDownloadButton button {
-        background-color: #1A314B;
-        color: white;
+    report = st.session_state.get('capture_report')
+    if report is not None:
+        with st.expander(f"{report[0]} profile of the last analysis run"):
+            st.code(report[1], language=None)
+
+# Function to list the seasonal columns a run loads. Grouped mode also loads
+# the group column, to join per group when the seasonal data has it.
+def seasonal_usecols(group_column=None):
+    return SEASONAL_COLUMNS if group_column is None else SEASONAL_COLUMNS + [group_column]
+
+# Function to hash an upload's bytes once. The digest is kept in session
+# state by file id, so reruns neither copy nor hash the file again.
+def upload_digest(uploaded_file):
+    digests = st.session_state.setdefault('upload_digests', {})
+    if uploaded_file.file_id not in digests:
+        digests[uploaded_file.file_id] = data_digest(uploaded_file.getvalue())
+    return digests[uploaded_file.file_id]
+
+# Function to show which values had to be coerced to 0 during cleaning
+def show_cleaning_report(cleaning_report):
+    coerced = cleaning_report[['missing', 'sentinel', 'unparseable']].sum(axis=1)
+    if coerced.any():
+        with st.expander(f"Data cleaning report ({int(coerced.sum())} values coerced to 0)"):
+            st.dataframe(cleaning_report[coerced > 0])
+
+# Function to load a heatmap cell's thresholds into the parameter widgets
+def load_sweep_cell(x_param, y_param):
+    values = {
+        x_param: st.session_state.sweep_x_value,
+        y_param: st.session_state.sweep_y_value,
     }
-    
-    .success-card {
-        background-color: #f0f7f7;
-        padding: 20px;
-        border-radius: 5px;
-        border-left: 5px solid #1F6C6D;
-        margin-bottom: 15px;
+    low, high = st.session_state.availability_range
+    low = int(values.pop('min_availability', low))
+    high = int(values.pop('max_availability', high))
+    st.session_state.availability_range = (min(low, high), max(low, high))
+    for param, value in values.items():
+        st.session_state[param] = int(value)
+
+# Function to prepare the results section: the top five cards, the column
+# order and the KPI counts. Ranked results are already best first.
+def render_results(filtered_df, kpi_results, ranked=False, version=None):
+    lead = ['AG', 'Score', 'KPI Recommendations'] if ranked else ['AG', 'KPI Recommendations']
+    cols = [col for col in filtered_df.columns if col not in lead]
+    kpi_counts = kpi_results['KPI Focus'].value_counts().reset_index()
+    kpi_counts.columns = ['KPI', 'Count']
+    if ranked:
+        top = np.arange(min(5, len(filtered_df)))
+    else:
+        top = top_k_positions(filtered_df['SUM sales'].to_numpy(dtype=np.float64), 5)
+    return {
+        'top_recommendations': filtered_df.iloc[top],
+        'ordered_cols': lead + cols,
+        'kpi_counts': kpi_counts,
+        'version': uuid.uuid4().hex if version is None else version,
     }
+
+# Function to describe the analysis as memoized stages. Each stage lists the
+# stages it reads and every parameter it uses, so a parameter change only
+# reruns the stages downstream of it.
+def build_analysis_stages(df, perf_key, uploaded_file, season_file, params, extra_seasonal_columns,
+                          usecols, stream_options, ranking=None, group_column=None, sql_sources=None):
+    if sql_sources is not None:
+        return sql_analysis_stages(sql_sources['perf'], sql_sources['season'], params, extra_seasonal_columns,
+                                   usecols)
+    row_params = {param: params[param] for param in params if param != 'max_salethrough'}
+    if stream_options is None:
+        stages = [
+            Stage('performance_data', lambda: df, (), {'data': perf_key}),
+            Stage('sales_band', lambda data: sales_band_masks(data, params), ('performance_data',),
+                  {param: params[param] for param in ('top_sales_percentile', 'bottom_sales_percentile')}),
+            Stage('row_filters',
+                  lambda data, band: (data, *row_filter_positions(data, band, params), len(data), None),
+                  ('performance_data', 'sales_band'), row_params),
+        ]
+    else:
+        # Chunked mode streams the file, so every row filter runs in one stage
+        def run_stream():
+            stream = stream_select(uploaded_file, params, fmt=detect_format(uploaded_file.name),
+                                   usecols=usecols, **stream_options)
+            return stream.df, np.arange(len(stream.df)), stream.funnel, stream.total_rows, stream.report
+        stages = [
+            Stage('row_filters', run_stream, (),
+                  dict(row_params, data=upload_key(uploaded_file, usecols, digest=upload_digest(uploaded_file)),
+                       **stream_options)),
+        ]
     
-    .warning-card {
-        background-color: #fff7f0;
-        padding: 20px;
-        border-radius: 5px;
-        border-left: 5px solid #FD604A;
-    }
+    season_usecols = seasonal_usecols(group_column)
     
-    .metric-card {
-        background-color: white;
-        padding: 15px;
-        border-radius: 5px;
-        box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-        text-align: center;
-    }
+    def load_seasonal():
+        return ingest_upload(season_file, usecols=season_usecols, session_id=session_id, slot='seasonal',
+                             digest=upload_digest(season_file))
     
-    .metric-value {
-        font-size: 24px;
-        font-weight: bold;
-        color: #1F6C6D;
-    }
+    def index_seasonal(season_ingest):
+        if 'Global STR (%)' not in season_ingest.df.columns:
+            raise ValueError("Required column 'Global STR (%)' not found in seasonal data.")
+        key_columns = ('AG',)
+        if group_column is not None and group_column in season_ingest.df.columns:
+            key_columns = (group_column, 'AG')
+        return seasonal_index_for(season_ingest.key, season_ingest.df, key_columns)[0]
     
-    .metric-label {
-        font-size: 14px;
-        color: #1A314B;
-    }
-    </style>
+    def render(kpi_output):
+        return render_results(*kpi_output, ranked=ranking is not None)
+    
+    season_key = None if season_file is None else upload_key(season_file, usecols=season_usecols,
+                                                                 digest=upload_digest(season_file))
+    seasonal_stages = [
+        Stage('seasonal_data', load_seasonal, (), {'data': season_key}),
+        Stage('seasonal_index', index_seasonal, ('seasonal_data',), {'group_column': group_column}),
+    ]
+    if group_column is not None:
+        # Grouped mode runs the whole selection for every group in one stage
+        return stages[:1] + seasonal_stages + [
+            Stage('grouped_selection',
+                  lambda data, index: select_grouped(data, index, group_column, params, extra_seasonal_columns),
+                  ('performance_data', 'seasonal_index'),
+                  dict(params, group_column=group_column, extra_columns=tuple(extra_seasonal_columns))),
+            Stage('render', lambda selection: {'version': uuid.uuid4().hex}, ('grouped_selection',), {}),
+        ]
+    if ranking is not None:
+        # Ranked mode scores every AG instead of applying the hard cut-offs
+        weights = {f'weight_{component}': weight for component, weight in ranking['weights'].items()}
+        return stages[:1] + seasonal_stages + [
+            Stage('scores', lambda data, index: score_ags(data, index, params, ranking['weights']),
+                  ('performance_data', 'seasonal_index'), dict(params, **weights)),
+            Stage('ranking',
+                  lambda data, scored, index: rank_ags(data, scored[0], scored[1], index, ranking['k'],
+                                                       extra_seasonal_columns),
+                  ('performance_data', 'scores', 'seasonal_index'),
+                  {'k': ranking['k'], 'extra_columns': tuple(extra_seasonal_columns)}),
+            Stage('kpi', add_kpis, ('ranking',), {}),
+            Stage('render', render, ('kpi',), {}),
+        ]
+    return stages + seasonal_stages + [
+        Stage('seasonal_match', lambda rows, index: match_seasonal(rows[0].iloc[rows[1]], rows[2], index),
+              ('row_filters', 'seasonal_index'), {}),
+        Stage('salethrough_filter',
+              lambda match, index: salethrough_mask(match[0], match[1], index, params['max_salethrough']),
+              ('seasonal_match', 'seasonal_index'), {'max_salethrough': params['max_salethrough']}),
+        # Earlier stages keep row positions and masks; only the results are materialized
+        Stage('kpi',
+              lambda rows, match, selected, index: add_kpis(join_seasonal(
+                  rows[0].iloc[rows[1]], match[0], selected[0], index, extra_seasonal_columns
+              )),
+              ('row_filters', 'seasonal_match', 'salethrough_filter', 'seasonal_index'),
+              {'extra_columns': tuple(extra_seasonal_columns)}),
+        Stage('render', render, ('kpi',), {}),
+    ]
+
+# Function to describe the DuckDB analysis as stages: the whole selection runs
+# as SQL over the files (server files, or uploads written to disk), so only
+# the selected rows are ever loaded into pandas
+def sql_analysis_stages(perf_source, season_source, params, extra_seasonal_columns, usecols):
+    def source_key(source):
+        if source is None:
+            return None
+        return files_key(source) if isinstance(source, list) else upload_key(source, digest=upload_digest(source))
+    
+    def source_files(source):
+        return source if isinstance(source, list) else spill_upload(source.getvalue(), source.name)
+    
+    def run_sql():
+        return select_pilot_ags_sql(source_files(perf_source), source_files(season_source), params,
+                                    extra_seasonal_columns, usecols)
+    
+    return [
+        Stage('sql_selection', run_sql, (),
+              dict(params, data=source_key(perf_source), season_data=source_key(season_source),
+                   extra_columns=tuple(extra_seasonal_columns),
+                   usecols=None if usecols is None else tuple(usecols))),
+        Stage('render', lambda selection: render_results(selection.results, selection.kpi_results),
+              ('sql_selection',), {}),
+    ]
+
+# Function to list past runs in the sidebar, to reopen one or compare two
+# without the files
+def show_run_history():
+    try:
+        past_runs = run_store.list_runs()
+    except sqlite3.Error as e:
+        past_runs = []
+        st.caption(f"Run history unavailable: {e}")
+    if not past_runs:
+        st.caption("Each analysis is stored here once it has run.")
+    else:
+        run_labels = {
+            run.id: f"#{run.id} {time.strftime('%d %b %H:%M', time.localtime(run.created))} · "
+                    f"{RUN_MODES.get(run.mode, run.mode)} · {run.selected:,} AGs"
+            for run in past_runs
+        }
+        if st.session_state.get('open_run') not in run_labels:
+            st.session_state.open_run = None
+        st.selectbox("Open a past run", [None] + list(run_labels), key="open_run",
+                     format_func=lambda run_id: "None" if run_id is None else run_labels[run_id])
+        if st.session_state.open_run is not None:
+            compare_ids = [run_id for run_id in run_labels if run_id != st.session_state.open_run]
+            if st.session_state.get('compare_run') not in compare_ids:
+                st.session_state.compare_run = None
+            st.selectbox("Compare with", [None] + compare_ids, key="compare_run",
+                         format_func=lambda run_id: "None" if run_id is None else run_labels[run_id])
+
+# Function to store a freshly computed run in the run history, keyed on the
+# same hash the stage graph uses for the whole analysis
+def save_run(graph, run_info, ags, tables, total_rows):
+    if 'render' not in graph.recomputed:
+        return
+    if 'sql_selection' in graph.stages:
+        perf_key = graph.stages['sql_selection'].params['data']
+        season_key = graph.stages['sql_selection'].params['season_data']
+    else:
+        perf_key = (graph.stages.get('performance_data') or graph.stages['row_filters']).params['data']
+        season_key = graph.stages['seasonal_data'].params['data']
+    try:
+        run_store.record(graph.keys['render'], run_info['mode'], run_info['params'], ags, tables, total_rows,
+                         label=run_info['label'], perf_key=perf_key, season_key=season_key)
+    except (sqlite3.Error, OSError) as e:
+        st.caption(f"This run could not be added to the run history: {e}")
+
+# Function to list the AGs one stored run added and removed compared with another
+def show_run_diff(run, compare_id):
+    diff = run_store.diff(compare_id, run.id)
+    st.markdown(f"#### Compared with Run #{compare_id}")
+    st.caption(f"{len(diff.added):,} AGs added, {len(diff.removed):,} removed, {len(diff.kept):,} in both")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.dataframe(pd.DataFrame({'Added': diff.added}), hide_index=True)
+    with col2:
+        st.dataframe(pd.DataFrame({'Removed': diff.removed}), hide_index=True)
+
+# Function to show a run from the run history without recomputing anything
+def show_stored_run(run, key_prefix='', compare_id=None):
+    tables = run.tables
+    version = f"run-{run.id}"
+    created = time.strftime('%Y-%m-%d %H:%M', time.localtime(run.created))
+    st.markdown(f"""
+    <div class="success-card">
+        <h3>Summary</h3>
+        <p>Run #{run.id}: {RUN_MODES.get(run.mode, run.mode)} on {run.label}, recorded {created}</p>
+        <p>Total {'rows' if run.mode == 'grouped' else 'AGs'}: {run.total_rows}</p>
+        <p>AGs selected: {run.selected}</p>
+    </div>
     """, unsafe_allow_html=True)
+    with st.expander("Parameters"):
+        st.json(run.params)
+    if 'funnel' in tables:
+        with st.expander("Filter funnel"):
+            st.dataframe(tables['funnel'], hide_index=True)
+    if compare_id is not None:
+        show_run_diff(run, compare_id)
+    
+    if run.mode != 'grouped':
+        show_recommendations(tables['results'], tables['kpi_results'],
+                             render_results(tables['results'], tables['kpi_results'], run.mode == 'ranked', version),
+                             key_prefix)
+        return
+    st.markdown("### AGs that Qualify Consistently")
+    st.dataframe(tables['consistency'].head(500).style.format({
+        'Qualified share': '{:.0%}', 'Mean sales when qualified': '${:,.2f}',
+    }), hide_index=True)
+    group_column = run.params['group_column']
+    lead = [group_column, 'AG', 'KPI Recommendations']
+    columns = lead + [col for col in tables['results'].columns if col not in lead]
+    st.markdown(f"### Qualifying Rows by {group_column}")
+    show_results_table(tables['results'], version, columns, name=f"{key_prefix}results")
+    show_download(tables['results'], version, "grouped_results", "results", key_prefix)
 
-add_custom_css()
+# Function to load the seasonal file and its index, noting a fresh parse
+# and any duplicate AGs
+def show_seasonal_status(graph):
+    season_ingest = graph.get('seasonal_data')
+    if 'seasonal_data' in graph.recomputed:
+        st.caption(describe_ingest(season_ingest, "Seasonal data", ingest_cache.refcount(season_ingest.key)))
+    season_index = graph.get('seasonal_index')
+    if season_index.duplicates:
+        st.warning(f"{season_index.duplicates} duplicate AG rows in the seasonal data "
+                   "were ignored; the first row per AG is used.")
+    return season_index
 
-# Function to download dataframe as CSV
-def get_csv_download_link(df, filename="filtered_results.csv"):
-    csv = df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
-    href = f'<a href="data:file/csv;base64,{b64}" download="{filename}" class="download-button">Download CSV</a>'
-    return href
-
-# Function to determine top 2 KPI focuses for an AG
-def determine_kpi_focuses(row):
-    # Initialize an empty list to store KPIs
-    kpis = []
-    
-    # Ensure all required fields are numeric
-    dormant_days = float(row['Dormant days'])
-    surplus_cost = float(row['Surplus cost'])
-    lost_sales = float(row['Lost sales'])
-    availability = float(row['AVG availability (%)'])
-    
-    # Add KPIs based on specific conditions with proper numeric comparisons
-    if dormant_days > 80:
-        kpis.append("Dormant Inventory (Age)")
-    if surplus_cost > 2 * lost_sales:
-        kpis.append("Inventory Reduction")
-    if availability < 75:
-        kpis.append("Availability Improvement")
-    
-    # If we have fewer than 2 KPIs, add Sales Through
-    if len(kpis) < 2:
-        kpis.append("Sales Through")
-    
-    # If we still have fewer than 2 KPIs, add another one that's not already in the list
-    if len(kpis) < 2:
-        if "Inventory Reduction" not in kpis:
-            kpis.append("Inventory Reduction")
-        elif "Availability Improvement" not in kpis:
-            kpis.append("Availability Improvement")
-    
-    # Ensure we return exactly 2 KPIs
-    return kpis[:2]
-
-# Legacy function for backward compatibility
-def determine_kpi_focus(row):
-    return determine_kpi_focuses(row)[0]
-        
-# Function to get rationale for KPI focus
-def get_kpi_rationale(kpi):
-    rationales = {
-        "Dormant Inventory (Age)": "Indicates stagnant stock nearing obsolescence",
-        "Inventory Reduction": "Surplus is the dominant problem to solve",
-        "Availability Improvement": "Chronic stockouts risk lost sales and customer experience",
-        "Sales Through": "Healthy balance → optimize sell-through further"
-    }
-    return rationales.get(kpi, "")
-
-# Function to clean numeric columns
-def clean_numeric_values(df):
-    # Ensure all common numeric columns are properly converted to numeric types
-    numeric_columns = [
-        'SUM sales', 'Surplus cost', 'Lost sales', 'SKU Qty', 'Product Qty', 
-        'AVG availability (%)', 'Dormant days', 'Total sales (£)', 'Total sales (units)', 
-        'Global STR (%)', 'Global Discount STR (%)', 'Global Full price STR (%)', 
-        'Local STR (%)', 'Local Discount STR (%)', 'Local Full Price STR (%)'
-    ]
+# Function to show a ranked run: every AG scored, the best k as the results
+def show_ranked_analysis(graph, season_file, total_ags, run_info):
+    if total_ags == 0:
+        st.error("No data available for analysis.")
+        return
+    if season_file is None:
+        st.error("Seasonal analysis data (second CSV) is required. Please upload both CSV files.")
+        st.stop()
     
-    for col in numeric_columns:
-        if col in df.columns:
-            # First convert any non-numeric characters or special characters
-            df[col] = df[col].astype(str)  # Ensure it's a string first
-            df[col] = df[col].replace({',': ''}, regex=True)  # Remove commas
-            df[col] = df[col].replace({'—': '0', '-': '0', 'N/A': '0', 'n/a': '0'}, regex=True)  # Replace dash with zero
-            
-            # Then convert to numeric, handling any errors
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    try:
+        show_seasonal_status(graph)
+        scores, codes = graph.get('scores')
+        filtered_df, kpi_results = graph.get('kpi')
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    except Exception as e:
+        st.error(f"Error processing seasonal data: {e}")
+        st.stop()
+    rendered = graph.get('render')
+    save_run(graph, run_info, filtered_df['AG'], {'results': filtered_df, 'kpi_results': kpi_results}, total_ags)
+    
+    st.markdown("### Analysis Results")
+    perfect = int(np.count_nonzero(scores == 1.0))
+    st.markdown(f"""
+    <div class="success-card">
+        <h3>Summary</h3>
+        <p>Total AGs: {total_ags}</p>
+        <p>AGs found in the seasonal data: {int((codes >= 0).sum())}</p>
+        <p>AGs with a perfect score: {perfect}</p>
+        <p>Showing the top {len(filtered_df)} by score</p>
+    </div>
+    """, unsafe_allow_html=True)
     
-    return df
+    with st.expander("Score distribution"):
+        counts, edges = np.histogram(scores, bins=20, range=(0.0, 1.0))
+        st.bar_chart(pd.DataFrame({'Score': edges[:-1].round(2), 'AGs': counts}), x='Score', y='AGs',
+                     color="#1F6C6D")
+    show_stage_status(graph)
+    show_recommendations(filtered_df, kpi_results, rendered)
 
-# Main app header
-st.markdown('<h1 class="main-header">AG Selection Tool</h1>', unsafe_allow_html=True)
-st.markdown('<p class="subheader">Find optimal assortment groups for your pilot program</p>', 
-            unsafe_allow_html=True)
+# Function to show a grouped run: the AGs that qualify in the most periods or
+# stores, then every qualifying (group, AG) row
+def show_grouped_analysis(graph, season_file, group_column, run_info):
+    if season_file is None:
+        st.error("Seasonal analysis data (second CSV) is required. Please upload both CSV files.")
+        st.stop()
+    
+    try:
+        show_seasonal_status(graph)
+        selection = graph.get('grouped_selection')
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    except Exception as e:
+        st.error(f"Error processing seasonal data: {e}")
+        st.stop()
+    version = graph.get('render')['version']
+    consistency = selection.consistency
+    save_run(graph, run_info, consistency['AG'], {
+        'results': selection.results, 'kpi_results': selection.kpi_results, 'consistency': consistency,
+        'groups': selection.groups, 'funnel': selection.funnel,
+    }, selection.total_rows)
+    
+    st.markdown("### Analysis Results")
+    st.markdown(f"""
+    <div class="success-card">
+        <h3>Summary</h3>
+        <p>Rows: {selection.total_rows} across {len(selection.groups)} groups of {group_column}</p>
+        <p>Qualifying rows: {len(selection.results)}</p>
+        <p>AGs qualifying at least once: {len(consistency)}</p>
+        <p>AGs qualifying wherever they appear: {int((consistency['Qualified share'] == 1).sum())}</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    with st.expander("Filter funnel"):
+        st.dataframe(selection.funnel, hide_index=True)
+    with st.expander(f"Qualifying AGs per {group_column}"):
+        st.dataframe(selection.groups, hide_index=True)
+    show_stage_status(graph)
+    
+    if selection.results.empty:
+        st.warning("No AGs match the current criteria in any group. Try adjusting your parameters.")
+        return
+    
+    st.markdown("### AGs that Qualify Consistently")
+    min_share = st.slider("Minimum share of groups qualified (%)", min_value=0, max_value=100, value=80,
+                          step=5, key="min_qualified_share",
+                          help="Share of the groups an AG appears in where it meets every criterion")
+    consistent = consistency[consistency['Qualified share'] * 100 >= min_share]
+    st.caption(f"{len(consistent):,} of {len(consistency):,} qualifying AGs")
+    st.dataframe(consistent.head(500).style.format({
+        'Qualified share': '{:.0%}', 'Mean sales when qualified': '${:,.2f}',
+    }), hide_index=True)
+    show_download(consistent, (version, min_share), "consistent_ags", "consistent AGs")
+    
+    st.markdown(f"### Qualifying Rows by {group_column}")
+    lead = [group_column, 'AG', 'KPI Recommendations']
+    columns = lead + [col for col in selection.results.columns if col not in lead]
+    show_results_table(selection.results, version, columns)
+    show_download(selection.results, version, "grouped_results", "results")
+    show_download(selection.kpi_results, version, "grouped_kpi_recommendations", "KPI analysis")
 
-# File uploader sections
-st.markdown("### Upload Data Files")
-col1, col2 = st.columns(2)
+# Function to show a DuckDB run: the hard-filter selection computed in SQL
+def show_sql_analysis(graph, season_source, run_info):
+    if season_source is None:
+        st.error("Seasonal analysis data is required. Please upload it or give its files on the server.")
+        st.stop()
+    
+    try:
+        selection = graph.get('sql_selection')
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    except Exception as e:
+        st.error(f"Error running the SQL selection: {e}")
+        st.stop()
+    rendered = graph.get('render')
+    filtered_df, kpi_results, total_ags = selection.results, selection.kpi_results, selection.total_ags
+    save_run(graph, run_info, filtered_df['AG'],
+             {'results': filtered_df, 'kpi_results': kpi_results, 'funnel': selection.funnel}, total_ags)
+    
+    st.markdown("### Analysis Results")
+    st.markdown(f"""
+    <div class="success-card">
+        <h3>Summary</h3>
+        <p>Total AGs: {total_ags}</p>
+        <p>AGs meeting all criteria: {len(filtered_df)}</p>
+        <p>Percentage selected: {round(len(filtered_df) / total_ags * 100, 2)}%</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    with st.expander("Filter funnel"):
+        st.dataframe(selection.funnel, hide_index=True)
+    with st.expander("DuckDB timings"):
+        st.dataframe(pd.DataFrame(list(selection.timings.items()), columns=['Step', 'Seconds']),
+                     hide_index=True)
+    show_stage_status(graph)
+    
+    if filtered_df.empty:
+        st.warning("No AGs match the current criteria. Try adjusting your parameters.")
+    show_recommendations(filtered_df, kpi_results, rendered)
 
-with col1:
-    uploaded_file = st.file_uploader("Upload Performance Data CSV", type=["csv"], key="perf_data")
+# Function to show which analysis stages were recomputed on this run
+def show_stage_status(graph):
+    recomputed = graph.recomputed
+    with st.expander(f"Pipeline stages ({len(recomputed)} of {len(graph.log)} recomputed)"):
+        st.dataframe(
+            pd.DataFrame([
+                (status.stage, 'recomputed' if status.recomputed else 'reused', status.seconds)
+                for status in graph.log
+            ], columns=['Stage', 'Status', 'Seconds']),
+            hide_index=True,
+        )
 
-with col2:
-    season_file = st.file_uploader("Upload Seasonal Analysis CSV (required)", type=["csv"], key="season_data")
+# Function to show the sensitivity heatmap of selected-AG counts
+def show_sensitivity_analysis(df, perf_key, params, season_file):
+    if df is None or season_file is None:
+        st.info("Upload both files (with chunked and DuckDB mode off) to run the sensitivity analysis.")
+        return
+    
+    points = st.slider("Grid points per parameter", min_value=3, max_value=12, value=6,
+                       help="Every combination of the six thresholds is evaluated at once")
+    season_ingest = ingest_upload(season_file, usecols=SEASONAL_COLUMNS, session_id=session_id,
+                                  slot='seasonal', digest=upload_digest(season_file))
+    sweep_key = (
+        perf_key, season_ingest.key, points,
+        params['top_sales_percentile'], params['bottom_sales_percentile'],
+        params['min_products'], params['min_lost_sales'],
+    )
+    
+    if st.button("Run sensitivity sweep", key="run_sweep"):
+        if 'Global STR (%)' not in season_ingest.df.columns:
+            st.error("Required column 'Global STR (%)' not found in seasonal data.")
+            return
+        season_index, _ = seasonal_index_for(season_ingest.key, season_ingest.df)
+        grid = default_grid(df, params, points)
+        with profiler.stage('sensitivity_sweep', rows_in=len(df)):
+            st.session_state.sweep = (sweep_key, sweep_selection(df, params, grid, season_index))
+    
+    sweep = st.session_state.get('sweep')
+    if sweep is None or sweep[0] != sweep_key:
+        st.caption("Sales band, minimum products and minimum lost sales stay fixed at their current values.")
+        return
+    result = sweep[1]
+    st.caption(f"{result.counts.size:,} parameter combinations evaluated over {result.base_rows:,} AGs.")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        x_param = st.selectbox("Heatmap columns", result.params, index=2,
+                               format_func=SWEEP_LABELS.get, key="sweep_x")
+    with col2:
+        y_param = st.selectbox("Heatmap rows", [p for p in result.params if p != x_param],
+                               format_func=SWEEP_LABELS.get, key="sweep_y")
+    
+    # Altair is only needed for the heatmap, so it is imported here
+    import altair as alt
+    
+    cells = grid_slice(result, x_param, y_param, params)
+    heatmap = alt.Chart(cells).encode(
+        x=alt.X(f'{x_param}:O', title=SWEEP_LABELS[x_param]),
+        y=alt.Y(f'{y_param}:O', title=SWEEP_LABELS[y_param], sort='descending'),
+    )
+    st.altair_chart(
+        heatmap.mark_rect().encode(
+            color=alt.Color('Selected AGs:Q', scale=alt.Scale(scheme='tealblues')),
+            tooltip=[x_param, y_param, 'Selected AGs'],
+        ) + heatmap.mark_text(fontSize=11).encode(text='Selected AGs:Q'),
+        use_container_width=True,
+    )
+    st.caption("Other parameters are fixed at their current values.")
+    
+    # Pick a cell and load its thresholds into the parameters above
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        st.selectbox(SWEEP_LABELS[x_param], [int(v) for v in result.values[result.params.index(x_param)]],
+                     key="sweep_x_value")
+    with col2:
+        st.selectbox(SWEEP_LABELS[y_param], [int(v) for v in result.values[result.params.index(y_param)]],
+                     key="sweep_y_value")
+    with col3:
+        st.button("Load", key="load_sweep_cell", on_click=load_sweep_cell, args=(x_param, y_param))
 
-if uploaded_file is not None:
-    # Read the CSV file
-    try:
-        df = pd.read_csv(uploaded_file)
-        # Clean the data
-        df = clean_numeric_values(df)
-        
-        # Parameters section in columns
-        st.markdown("### Configure Parameters")
-        
-        # Sales filtering
+# Profile calls only for a run started by the Run Analysis button. The profiler
+# is closed however the run ends (st.stop, a rerun or an error), so its claim on
+# memory tracking never outlives the run.
+capturing = capture_tool not in (None, 'Off') and st.session_state.get('analyze_button', False)
+profiler = Profiler(track_memory=bool(track_memory), capture_tool=capture_tool if capturing else None)
+try:
+    # Main app header
+    st.markdown('<h1 class="main-header">AG Selection Tool</h1>', unsafe_allow_html=True)
+    st.markdown('<p class="subheader">Find optimal assortment groups for your pilot program</p>', 
+                unsafe_allow_html=True)
+
+    # A past run opened from the run history in the sidebar; it is filled in
+    # once the analysis modules are imported
+    stored_run_panel = st.container()
+
+    # File uploader sections
+    st.markdown("### Upload Data Files")
+    col1, col2 = st.columns(2)
+
+    with col1:
+        uploaded_file = st.file_uploader("Upload Performance Data (CSV, Parquet or Feather)",
+                                         type=UPLOAD_TYPES, key="perf_data")
+
+    with col2:
+        season_file = st.file_uploader("Upload Seasonal Analysis (required)",
+                                       type=UPLOAD_TYPES, key="season_data")
+
+    # Load only the columns the analysis uses, skipping everything else in the file
+    required_columns_only = st.checkbox(
+        "Load only the columns the analysis needs",
+        value=False,
+        help="Faster for wide exports; other columns are left out of the results table"
+    )
+
+    # Run the whole selection as SQL in DuckDB (when installed), so the data is
+    # never loaded into pandas; files on the server can be queried in place
+    sql_mode = find_spec('duckdb') is not None and st.checkbox(
+        "Run the selection in DuckDB",
+        value=False,
+        help="Compiles the filters, the seasonal join and the KPI rules into SQL that DuckDB runs on "
+             "every core, spilling to disk when needed; only the selected AGs are loaded"
+    )
+    sql_perf_files = sql_season_files = None
+    perf_name = None if uploaded_file is None else uploaded_file.name
+    season_name = None if season_file is None else season_file.name
+
+    # Stream very large performance files chunk by chunk instead of loading them whole
+    chunked_mode = not sql_mode and st.checkbox(
+        "Chunked mode for files larger than memory",
+        value=False,
+        help="Cleans and filters the performance file one chunk at a time, keeping only matching AGs"
+    )
+
+    # Import the analysis stack the first time there is something to analyse or
+    # show; until then the upload page runs on Streamlit alone
+    if (uploaded_file is not None or season_file is not None or sql_mode or chunked_mode or show_performance
+            or st.session_state.get('open_run') is not None):
+        import pandas as pd
+        import numpy as np
+    
+        from compact import memory_report
+        from downloads import DOWNLOAD_FORMATS, download_cache, format_size
+        from formats import EXPORT_FORMATS, detect_format, to_columnar_bytes
+        from grouped import select_grouped
+        from ingest import data_digest, describe_ingest, ingest_cache, ingest_upload, prefetch_upload, upload_key
+        from kpi import get_kpi_rationale
+        from paging import (
+            DEFAULT_PAGE_SIZE, PAGE_SIZES, filter_positions, format_page, get_page, is_numeric_column,
+            sort_positions
+        )
+        from pipeline import (
+            DEFAULT_PARAMS, add_kpis, join_seasonal, match_seasonal, rank_ags, row_filter_positions,
+            sales_band_masks, salethrough_mask, score_ags
+        )
+        from scoring import DEFAULT_TOP_K, DEFAULT_WEIGHTS, SCORE_COMPONENTS, top_k_positions
+        from seasonal import STR_COLUMNS, cached_indexes, seasonal_index_for
+        from sqlengine import SQL_DATA_DIR, files_key, select_pilot_ags_sql, server_files, spill_upload
+        from streaming import DEFAULT_CHUNKSIZE, stream_select
+        from sweep import SWEEP_LABELS, default_grid, grid_slice, sweep_selection
+    
+        # Forget the digests of files that are no longer uploaded
+        current_uploads = {upload.file_id for upload in (uploaded_file, season_file) if upload is not None}
+        st.session_state.upload_digests = {
+            file_id: digest for file_id, digest in st.session_state.get('upload_digests', {}).items()
+            if file_id in current_uploads
+        }
+    
+        if st.session_state.get('open_run') is not None:
+            stored_run = run_store.load(st.session_state.open_run)
+            if stored_run is not None:
+                with stored_run_panel:
+                    col1, col2 = st.columns([4, 1])
+                    with col1:
+                        st.markdown(f"### Stored Run #{stored_run.id}")
+                    with col2:
+                        st.button("Close", key="close_run", on_click=lambda: st.session_state.update(open_run=None))
+                    show_stored_run(stored_run, 'stored_', st.session_state.get('compare_run'))
+                    st.markdown("---")
+
+    # Files on the server, which DuckDB queries in place of the uploads
+    if sql_mode and SQL_DATA_DIR:
         col1, col2 = st.columns(2)
         with col1:
-            top_sales_percentile = st.slider(
-                "Exclude Top Sales (%)", 
-                min_value=0, 
-                max_value=50, 
-                value=20,
-                help="Filter out top performers by total sales"
+            perf_pattern = st.text_input(
+                "Performance files on the server",
+                key="sql_perf_pattern",
+                help=f"Parquet, CSV or Feather path or glob inside {SQL_DATA_DIR}, e.g. extracts/*.parquet; "
+                     "used instead of the upload"
             )
-        
         with col2:
-            bottom_sales_percentile = st.slider(
-                "Exclude Bottom Sales (%)", 
-                min_value=0, 
-                max_value=50, 
-                value=30,
-                help="Filter out bottom performers by total sales"
+            season_pattern = st.text_input(
+                "Seasonal files on the server",
+                key="sql_season_pattern",
+                help=f"Path or glob inside {SQL_DATA_DIR}; used instead of the upload"
             )
-        
-        # Availability filtering
-        min_availability, max_availability = st.slider(
-            "Target Availability Range (%)", 
-            min_value=0, 
-            max_value=100, 
-            value=(50, 95),
-            help="Select AGs with average availability in this range"
-        )
-        
-        # SKU and Product thresholds
+        try:
+            if perf_pattern:
+                sql_perf_files, perf_name = server_files(perf_pattern), perf_pattern
+            if season_pattern:
+                sql_season_files, season_name = server_files(season_pattern), season_pattern
+        except ValueError as e:
+            st.error(str(e))
+
+    if chunked_mode:
         col1, col2 = st.columns(2)
         with col1:
-            min_skus = st.number_input(
-                "Minimum SKUs", 
-                min_value=0, 
-                value=10,
-                help="Minimum number of SKUs required"
+            chunk_rows = st.number_input(
+                "Rows per chunk",
+                min_value=10_000,
+                value=DEFAULT_CHUNKSIZE,
+                step=50_000,
+                help="Peak memory grows with the chunk size, not with the file size"
             )
-        
         with col2:
-            min_products = st.number_input(
-                "Minimum Products", 
-                min_value=0, 
-                value=10,
-                help="Minimum number of products required"
+            exact_quantiles = st.checkbox(
+                "Exact sales percentiles",
+                value=False,
+                help="Keep every SUM sales value (8 bytes per row) instead of a quantile "
+                     "sketch accurate to about 0.5% of rank"
             )
+
+    # Start parsing both uploads in the background, so the seasonal file is
+    # cleaned while the performance file is, and is ready when the analysis runs.
+    # The seasonal columns follow the mode picked on the previous rerun; a group
+    # column picked for the first time is prefetched once it is chosen below.
+    grouped_mode = st.session_state.get('selection_mode') == "Compare periods or stores"
+    season_group_column = st.session_state.get('group_column') if grouped_mode else None
+    if season_file is not None and not sql_mode and (season_group_column is not None or not grouped_mode):
+        prefetch_upload(season_file, usecols=seasonal_usecols(season_group_column), digest=upload_digest(season_file))
+    if uploaded_file is not None and not chunked_mode and not sql_mode:
+        prefetch_upload(uploaded_file, usecols=PERFORMANCE_COLUMNS if required_columns_only else None,
+                        digest=upload_digest(uploaded_file))
+
+    if uploaded_file is not None or sql_perf_files is not None:
+        # Read the CSV file
+        try:
+            # Set once the loaded performance file turns out to have no rows; no
+            # mode can run then. Chunked and DuckDB mode count rows as they run.
+            no_data = False
+            if chunked_mode:
+                # The file is streamed when the analysis runs
+                df = None
+                ingest_cache.release(session_id, 'performance')
+                st.caption("Chunked mode: the performance file is streamed when you run the analysis.")
+            elif sql_mode:
+                # DuckDB queries the files when the analysis runs
+                df = None
+                ingest_cache.release(session_id, 'performance')
+                st.caption("DuckDB mode: the performance data is queried when you run the analysis; "
+                           "only the selected AGs are loaded.")
+            else:
+                # Read and clean the data, reusing the cleaned frame from earlier reruns
+                perf_ingest = profiler.measure_ingest('ingest_performance', lambda: ingest_upload(
+                    uploaded_file, usecols=PERFORMANCE_COLUMNS if required_columns_only else None,
+                    session_id=session_id, slot='performance', digest=upload_digest(uploaded_file)
+                ))
+                df, cleaning_report = perf_ingest.df, perf_ingest.report
+                st.caption(describe_ingest(perf_ingest, "Performance data", ingest_cache.refcount(perf_ingest.key)))
         
-        # Dynamics criteria
-        col1, col2 = st.columns(2)
-        with col1:
-            min_surplus = st.number_input(
-                "Minimum Surplus Cost", 
-                min_value=0, 
-                value=100,
-                help="Minimum surplus cost value required"
-            )
+                # Export the cleaned data in a columnar format so it reloads without parsing
+                with st.expander("Save cleaned dataset"):
+                    export_label = st.selectbox("Format", list(EXPORT_FORMATS), key="export_format")
+                    export_fmt, export_ext, export_mime = EXPORT_FORMATS[export_label]
+                    export_key = (perf_ingest.key, export_fmt)
+                    if st.session_state.get('cleaned_export', (None,))[0] != export_key:
+                        if st.button("Prepare cleaned dataset", key="prepare_export"):
+                            st.session_state.cleaned_export = (export_key, to_columnar_bytes(df, export_fmt))
+                    if st.session_state.get('cleaned_export', (None,))[0] == export_key:
+                        st.download_button(
+                            "Download cleaned dataset",
+                            data=st.session_state.cleaned_export[1],
+                            file_name=f"cleaned_{os.path.splitext(uploaded_file.name)[0]}.{export_ext}",
+                            mime=export_mime,
+                        )
         
-        with col2:
-            min_lost_sales = st.number_input(
-                "Minimum Lost Sales", 
+                # Show which values had to be coerced to 0 during cleaning
+                show_cleaning_report(cleaning_report)
+            
+                no_data = len(df) == 0
+                if no_data:
+                    st.error("No data available for analysis.")
+        
+            # The sensitivity sweep can load values into these widgets, so they
+            # take their defaults from session state rather than from `value`
+            st.session_state.setdefault('availability_range',
+                                        (DEFAULT_PARAMS['min_availability'], DEFAULT_PARAMS['max_availability']))
+            for param in ('min_skus', 'min_surplus', 'min_age', 'max_salethrough'):
+                st.session_state.setdefault(param, DEFAULT_PARAMS[param])
+        
+            # Parameters section in columns
+            st.markdown("### Configure Parameters")
+        
+            # Sales filtering
+            col1, col2 = st.columns(2)
+            with col1:
+                top_sales_percentile = st.slider(
+                    "Exclude Top Sales (%)", 
+                    min_value=0, 
+                    max_value=50, 
+                    value=DEFAULT_PARAMS['top_sales_percentile'],
+                    help="Filter out top performers by total sales"
+                )
+        
+            with col2:
+                bottom_sales_percentile = st.slider(
+                    "Exclude Bottom Sales (%)", 
+                    min_value=0, 
+                    max_value=50, 
+                    value=DEFAULT_PARAMS['bottom_sales_percentile'],
+                    help="Filter out bottom performers by total sales"
+                )
+        
+            # Availability filtering
+            min_availability, max_availability = st.slider(
+                "Target Availability Range (%)", 
                 min_value=0, 
-                value=100,
-                help="Minimum lost sales value required"
+                max_value=100, 
+                help="Select AGs with average availability in this range",
+                key="availability_range"
             )
+        
+            # SKU and Product thresholds
+            col1, col2 = st.columns(2)
+            with col1:
+                min_skus = st.number_input(
+                    "Minimum SKUs", 
+                    min_value=0, 
+                    help="Minimum number of SKUs required",
+                    key="min_skus"
+                )
+        
+            with col2:
+                min_products = st.number_input(
+                    "Minimum Products", 
+                    min_value=0, 
+                    value=DEFAULT_PARAMS['min_products'],
+                    help="Minimum number of products required"
+                )
+        
+            # Dynamics criteria
+            col1, col2 = st.columns(2)
+            with col1:
+                min_surplus = st.number_input(
+                    "Minimum Surplus Cost", 
+                    min_value=0, 
+                    help="Minimum surplus cost value required",
+                    key="min_surplus"
+                )
+        
+            with col2:
+                min_lost_sales = st.number_input(
+                    "Minimum Lost Sales", 
+                    min_value=0, 
+                    value=DEFAULT_PARAMS['min_lost_sales'],
+                    help="Minimum lost sales value required"
+                )
             
-        # New parameters for dormant and salethrough
-        col1, col2 = st.columns(2)
-        with col1:
-            min_age = st.number_input(
-                "Minimum Average Age (days)", 
-                min_value=0, 
-                value=30,
-                help="Minimum average age in days (dormant inventory filter)"
+            # New parameters for dormant and salethrough
+            col1, col2 = st.columns(2)
+            with col1:
+                min_age = st.number_input(
+                    "Minimum Average Age (days)", 
+                    min_value=0, 
+                    help="Minimum average age in days (dormant inventory filter)",
+                    key="min_age"
+                )
+        
+            with col2:
+                max_salethrough = st.number_input(
+                    "Maximum Salethrough Rate (%)", 
+                    min_value=0, 
+                    max_value=100,
+                    help="Maximum salethrough percentage required",
+                    key="max_salethrough"
+                )
+        
+            # Extra seasonal metrics to carry into the results
+            extra_seasonal_columns = st.multiselect(
+                "Additional seasonal metrics",
+                [col for col in STR_COLUMNS if col != 'Global STR (%)'],
+                help="Added to the results table when present in the seasonal data"
             )
         
-        with col2:
-            max_salethrough = st.number_input(
-                "Maximum Salethrough Rate (%)", 
-                min_value=0, 
-                max_value=100,
-                value=80,
-                help="Maximum salethrough percentage required"
+            # Rank every AG by a weighted score instead of applying the hard cut-offs,
+            # or run the selection per period or store of a long-format file
+            ranking = group_column = None
+            if df is not None:
+                selection_mode = st.radio(
+                    "Selection mode",
+                    ["Hard filters", "Ranked score", "Compare periods or stores"],
+                    horizontal=True,
+                    key="selection_mode",
+                    help="Ranked score gives every AG a weighted score across the criteria above and "
+                         "shows the best ones, so strict settings never return zero AGs. Compare runs "
+                         "the selection within every period or store of a file with one row per AG and "
+                         "period (or store)"
+                )
+                if selection_mode == "Ranked score":
+                    top_k = st.number_input("AGs to recommend", min_value=1, value=DEFAULT_TOP_K, key="top_k")
+                    with st.expander("Score weights"):
+                        st.caption("Each part scores 1 when its criterion is met and less the further "
+                                   "an AG falls short; weights set how much each part counts.")
+                        weights = {
+                            component: st.slider(label, min_value=0.0, max_value=5.0,
+                                                 value=DEFAULT_WEIGHTS[component], step=0.5,
+                                                 key=f"weight_{component}")
+                            for component, label in SCORE_COMPONENTS.items()
+                        }
+                    ranking = {'k': int(top_k), 'weights': weights}
+                elif selection_mode == "Compare periods or stores":
+                    group_columns = [col for col in df.columns if col not in PERFORMANCE_COLUMNS]
+                    if group_columns:
+                        group_column = st.selectbox(
+                            "Period or store column", group_columns, key="group_column",
+                            help="Sales percentiles are taken within each group; the seasonal data is "
+                                 "joined per group too when it has this column"
+                        )
+                        if season_file is not None:
+                            prefetch_upload(season_file, usecols=seasonal_usecols(group_column),
+                                            digest=upload_digest(season_file))
+                    else:
+                        st.info("No period or store column found in the performance data"
+                                + (" (turn off 'Load only the columns the analysis needs' to keep it)"
+                                   if required_columns_only else "")
+                                + ". Showing the hard-filter selection.")
+        
+            # Build one criteria spec from the parameters
+            params = {
+                'top_sales_percentile': top_sales_percentile,
+                'bottom_sales_percentile': bottom_sales_percentile,
+                'min_availability': min_availability,
+                'max_availability': max_availability,
+                'min_skus': min_skus,
+                'min_products': min_products,
+                'min_surplus': min_surplus,
+                'min_lost_sales': min_lost_sales,
+                'min_age': min_age,
+                'max_salethrough': max_salethrough,
+            }
+        
+            # Sensitivity analysis over a grid of threshold combinations
+            with st.expander("Sensitivity analysis"):
+                if no_data:
+                    st.caption("No data available for analysis.")
+                else:
+                    show_sensitivity_analysis(df, None if df is None else perf_ingest.key, params, season_file)
+        
+            # Run Analysis button
+            analyze_button = st.button("Run Analysis", type="primary", key="analyze_button", disabled=no_data)
+        
+            # Pipeline stages, each memoized on its inputs and the parameters it reads
+            graph = StageGraph(
+                build_analysis_stages(
+                    df, None if df is None else perf_ingest.key, uploaded_file, season_file, params,
+                    extra_seasonal_columns, PERFORMANCE_COLUMNS if required_columns_only else None,
+                    {'chunksize': int(chunk_rows), 'exact_quantiles': exact_quantiles} if chunked_mode else None,
+                    ranking,
+                    group_column,
+                    {'perf': sql_perf_files or uploaded_file,
+                     'season': sql_season_files or season_file} if sql_mode else None,
+                ),
+                st.session_state.setdefault('stage_cache', {}),
+                profiler=profiler,
             )
         
-        # Run Analysis button
-        analyze_button = st.button("Run Analysis", type="primary", key="analyze_button")
+            # Results stay on screen across reruns until a parameter or file changes
+            results_current = st.session_state.get('analysis_key') == graph.keys['render']
+            run_requested = (analyze_button or results_current) and not no_data
         
-        # Main content area
-        if analyze_button:
-            # Apply filters
-            # Calculate percentile thresholds for sales
-            if len(df) > 0:
-                top_threshold = np.percentile(df['SUM sales'], 100 - top_sales_percentile)
-                bottom_threshold = np.percentile(df['SUM sales'], bottom_sales_percentile)
-                
-                # Initial filtering based on sales percentiles
-                filtered_df = df[(df['SUM sales'] < top_threshold) & (df['SUM sales'] > bottom_threshold)]
-                
-                # Apply availability filter
-                filtered_df = filtered_df[(filtered_df['AVG availability (%)'] >= min_availability) & 
-                                        (filtered_df['AVG availability (%)'] <= max_availability)]
-                
-                # Apply assortment richness filter
-                filtered_df = filtered_df[(filtered_df['SKU Qty'] >= min_skus) & 
-                                        (filtered_df['Product Qty'] >= min_products)]
-                
-                # Apply dynamics criteria for surplus and lost sales
-                filtered_df = filtered_df[filtered_df['Surplus cost'] > min_surplus]
-                filtered_df = filtered_df[filtered_df['Lost sales'] > min_lost_sales]
-                
-                # Apply new filters for dormant (age) - now MINIMUM age
-                filtered_df = filtered_df[filtered_df['Dormant days'] >= min_age]
+            # What the run history records about this analysis
+            run_info = {
+                'mode': 'ranked' if ranking is not None else 'grouped' if group_column is not None else 'filters',
+                'params': dict(params, extra_seasonal_columns=list(extra_seasonal_columns),
+                               **({'top_k': ranking['k'], 'weights': ranking['weights']} if ranking else {}),
+                               **({'group_column': group_column} if group_column else {}),
+                               **({'backend': 'duckdb'} if sql_mode else {})),
+                'label': perf_name + (f" + {season_name}" if season_name is not None else ""),
+            }
+        
+            # The same files and parameters as a stored run are served from the run
+            # history, unless this session already holds the results
+            stored_id = None
+            if run_requested and not graph.is_current('render') \
+                    and st.session_state.get('recompute_key') != graph.keys['render']:
+                try:
+                    stored_id = run_store.find(graph.keys['render'])
+                except sqlite3.Error:
+                    stored_id = None
+        
+            # Main content area
+            if stored_id is not None:
+                st.session_state.analysis_key = graph.keys['render']
+                col1, col2 = st.columns([4, 1])
+                with col1:
+                    st.info(f"These files and parameters match run #{stored_id}, so its stored results "
+                            "are shown without recomputing.")
+                with col2:
+                    st.button("Recompute", key="recompute_run",
+                              on_click=lambda key: st.session_state.update(recompute_key=key),
+                              args=(graph.keys['render'],))
+                show_stored_run(run_store.load(stored_id))
+            elif run_requested and sql_mode:
+                st.session_state.analysis_key = graph.keys['render']
+                show_sql_analysis(graph, sql_season_files or season_file, run_info)
+            elif run_requested and ranking is not None:
+                st.session_state.analysis_key = graph.keys['render']
+                show_ranked_analysis(graph, season_file, len(df), run_info)
+            elif run_requested and group_column is not None:
+                st.session_state.analysis_key = graph.keys['render']
+                show_grouped_analysis(graph, season_file, group_column, run_info)
+            elif run_requested:
+                st.session_state.analysis_key = graph.keys['render']
+                _, _, funnel, total_ags, stream_report = graph.get('row_filters')
+                if stream_report is not None:
+                    show_cleaning_report(stream_report)
+            
+                # Apply filters
+                if total_ags > 0:
+                    # For salethrough, both files are required
+                    if season_file is None:
+                        st.error("Seasonal analysis data (second CSV) is required. Please upload both CSV files.")
+                        st.stop()  # Using st.stop() instead of return
                 
-                # For salethrough, both files are required
-                if season_file is None:
-                    st.error("Seasonal analysis data (second CSV) is required. Please upload both CSV files.")
-                    st.stop()  # Using st.stop() instead of return
+                    try:
+                        # Look up AGs in the seasonal index (built once per seasonal upload)
+                        show_seasonal_status(graph)
+                    
+                        # Inner join on AG, then apply the salethrough filter - now MAXIMUM salethrough
+                        selected, funnel = graph.get('salethrough_filter')
+                    except ValueError as e:
+                        st.error(str(e))
+                        st.stop()  # Stop execution if seasonal data is invalid
+                    except Exception as e:
+                        st.error(f"Error processing seasonal data: {e}")
+                        st.stop()
                 
-                seasonal_data_valid = True
+                    # Display summary results
+                    st.markdown("### Analysis Results")
                 
-                try:
-                    season_df = pd.read_csv(season_file)
-                    season_df = clean_numeric_values(season_df)
-                    
-                    # Merge the dataframes on AG to get the salethrough data
-                    # We're using Global STR as the salethrough metric
-                    if 'Global STR (%)' in season_df.columns:
-                        merged_df = pd.merge(filtered_df, 
-                                          season_df[['AG', 'Global STR (%)']], 
-                                          on='AG', how='inner')  # Using inner join to require matches
-                        
-                        # Apply the salethrough filter - now MAXIMUM salethrough
-                        if 'Global STR (%)' in merged_df.columns:
-                            filtered_df = merged_df[merged_df['Global STR (%)'] <= max_salethrough]
-                        else:
-                            st.error("Required column 'Global STR (%)' not found in seasonal data.")
-                            seasonal_data_valid = False
-                    else:
-                        st.error("Required column 'Global STR (%)' not found in seasonal data.")
-                        seasonal_data_valid = False
-                except Exception as e:
-                    st.error(f"Error processing seasonal data: {e}")
-                    seasonal_data_valid = False
-                    
-                if not seasonal_data_valid:
-                    st.stop()  # Stop execution if seasonal data is invalid
+                    # Show the number of AGs before and after filtering
+                    filtered_ags = int(selected.sum())
                 
-                # Display summary results
-                st.markdown("### Analysis Results")
+                    st.markdown(f"""
+                    <div class="success-card">
+                        <h3>Summary</h3>
+                        <p>Total AGs: {total_ags}</p>
+                        <p>AGs meeting all criteria: {filtered_ags}</p>
+                        <p>Percentage selected: {round((filtered_ags/total_ags)*100 if total_ags > 0 else 0, 2)}%</p>
+                    </div>
+                    """, unsafe_allow_html=True)
                 
-                # Show the number of AGs before and after filtering
-                total_ags = len(df)
-                filtered_ags = len(filtered_df)
+                    # Show how many AGs each criterion removed
+                    with st.expander("Filter funnel"):
+                        st.dataframe(funnel, hide_index=True)
                 
-                st.markdown(f"""
-                <div class="success-card">
-                    <h3>Summary</h3>
-                    <p>Total AGs: {total_ags}</p>
-                    <p>AGs meeting all criteria: {filtered_ags}</p>
-                    <p>Percentage selected: {round((filtered_ags/total_ags)*100 if total_ags > 0 else 0, 2)}%</p>
-                </div>
-                """, unsafe_allow_html=True)
+                    # Pull the KPI and render stages, then show what had to be recomputed
+                    filtered_df, kpi_results = graph.get('kpi')
+                    rendered = graph.get('render')
+                    save_run(graph, run_info, filtered_df['AG'],
+                             {'results': filtered_df, 'kpi_results': kpi_results, 'funnel': funnel}, total_ags)
+                    show_stage_status(graph)
                 
-                if filtered_ags == 0:
-                    st.warning("No AGs match the current criteria. Try adjusting your parameters.")
+                    if filtered_ags == 0:
+                        st.warning("No AGs match the current criteria. Try adjusting your parameters.")
                 
-                # Final recommendations section
-                if not filtered_df.empty:
-                    st.markdown("### Recommended AGs for Pilot")
-                    
-                    # Sort by sales to get top recommendations
-                    top_recommendations = filtered_df.sort_values('SUM sales', ascending=False).head(5)
-                    
-                    for i, (idx, row) in enumerate(top_recommendations.iterrows(), 1):
-                        st.markdown(f"""
-                        <div class="success-card">
-                            <h4>{i}. {row['AG']}</h4>
-                            <p><strong>Sales:</strong> ${row['SUM sales']:,.2f} | 
-                            <strong>Availability:</strong> {row['AVG availability (%)']:.2f}%</p>
-                            <p><strong>SKUs:</strong> {row['SKU Qty']} | 
-                            <strong>Products:</strong> {row['Product Qty']}</p>
-                            <p><strong>Dynamics:</strong> Surplus Cost: ${row['Surplus cost']:,.2f} | 
-                            Lost Sales: ${row['Lost sales']:,.2f}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    # Calculate KPIs for each AG first
-                    kpi_df = filtered_df.copy()
-                    
-                    # Get two KPIs for each AG
-                    kpi_list = []
-                    kpi_by_ag = {}
-                    
-                    for idx, row in kpi_df.iterrows():
-                        ag_name = row['AG']
-                        kpis = determine_kpi_focuses(row)
-                        
-                        # Store the KPIs joined by comma for this AG
-                        kpi_by_ag[ag_name] = ', '.join(kpis)
-                        
-                        for kpi in kpis:
-                            kpi_list.append({
-                                'AG': ag_name,
-                                'KPI Focus': kpi,
-                                'Rationale': get_kpi_rationale(kpi)
-                            })
-                    
-                    # Convert to dataframe for KPI analysis
-                    kpi_results = pd.DataFrame(kpi_list)
-                    
-                    # Store results in session state
-                    st.session_state.kpi_df = kpi_results
-                    
-                    # Add KPI columns to the filtered results dataframe
-                    filtered_df['KPI Recommendations'] = filtered_df['AG'].map(kpi_by_ag)
-                    
-                    # Store the updated filtered dataframe in session state
-                    st.session_state.filtered_results = filtered_df.copy()
-                    
-                    # Complete results in a table with KPIs integrated
-                    st.markdown("### Complete Results with KPI Recommendations")
-                    
-                    # Reorder columns to put KPI Recommendations right after AG
-                    cols = list(filtered_df.columns)
-                    cols.remove('AG')
-                    cols.remove('KPI Recommendations')
-                    ordered_cols = ['AG', 'KPI Recommendations'] + cols
-                    
-                    # Show the reordered dataframe
-                    st.dataframe(
-                        filtered_df[ordered_cols].style.format({
-                            'SUM sales': '${:,.2f}',
-                            'AVG availability (%)': '{:.2f}%',
-                            'Surplus cost': '${:,.2f}',
-                            'Lost sales': '{:,.2f}'
-                        }),
-                        height=300
-                    )
-                    
-                    # Download button
-                    st.markdown(get_csv_download_link(filtered_df), unsafe_allow_html=True)
-                    
-                    # Add KPI analysis section
-                    st.markdown("### KPI Analysis")
-                    
-                    # Calculate KPI counts for the bar chart
-                    kpi_counts = kpi_results['KPI Focus'].value_counts().reset_index()
-                    kpi_counts.columns = ['KPI', 'Count']
-                    
-                    # Display bar chart of KPI distribution
-                    st.markdown("#### KPI Distribution Across All AGs")
-                    
-                    # Setup the chart
-                    st.bar_chart(
-                        kpi_counts, 
-                        x='KPI',
-                        y='Count',
-                        color="#1F6C6D"
-                    )
-                    
-                    # Calculate percentages for the total pool
-                    total_kpis = len(kpi_list)
-                    
-                    st.markdown("#### KPI Impact Analysis")
-                    st.markdown("""
-                    <div class="warning-card">
-                        <h4>KPI Distribution Summary:</h4>
-                    """, unsafe_allow_html=True)
-                    
-                    for idx, row in kpi_counts.iterrows():
-                        kpi = row['KPI']
-                        count = row['Count']
-                        percentage = round((count / total_kpis) * 100, 1)
-                        rationale = get_kpi_rationale(kpi)
-                        st.markdown(f"""
-                        <p><strong>{kpi}</strong> ({percentage}% of KPIs) - {rationale}</p>
-                        """, unsafe_allow_html=True)
-                        
-                    st.markdown("</div>", unsafe_allow_html=True)
-                    
-                    # Download button
-                    st.markdown("#### Download KPI Analysis")
-                    st.markdown(get_csv_download_link(kpi_results, "kpi_recommendations.csv"), 
-                                unsafe_allow_html=True)
-                    
+                    # Final recommendations section
+                    show_recommendations(filtered_df, kpi_results, rendered)
                 else:
-                    st.warning("No recommendations available with current parameters. Please adjust your filters.")
+                    st.error("No data available for analysis.")
+            elif no_data:
+                st.caption("Upload a performance file with at least one row to run the analysis.")
+            elif st.session_state.get('analysis_key') is not None:
+                st.info("Parameters or files changed. Click 'Run Analysis' to update the results; "
+                        "only the affected steps are recomputed.")
             else:
-                st.error("No data available for analysis.")
-        else:
-            st.info("Configure your parameters and click 'Run Analysis' to see results.")
-    except Exception as e:
-        st.error(f"Error processing file: {e}")
-        df = None
-else:
-    # Display a welcome page if no file is uploaded
-    st.markdown("""
-    <div class="warning-card">
-        <h2>Welcome to the AG Selection Tool!</h2>
-        <p>This tool helps you identify optimal assortment groups (AGs) for piloting based on performance criteria.</p>
-        <h3>To get started:</h3>
-        <ol>
-            <li>Upload <strong>both</strong> your AG performance CSV file and seasonal analysis CSV file (both are required)</li>
-            <li>Configure the filtering parameters to match your business needs</li>
-            <li>Click the "Run Analysis" button</li>
-            <li>Review the recommended AGs and download results if needed</li>
-        </ol>
-        <p>The tool automatically applies best practices for AG selection including:</p>
-        <ul>
-            <li>Focusing on mid-performing AGs (filtering out extremes)</li>
-            <li>Targeting balanced availability</li>
-            <li>Ensuring active dynamics (both surplus and lost sales)</li>
-            <li>Verifying sufficient assortment richness</li>
-        </ul>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Show example of expected CSV format
-    with st.expander("Expected CSV Format"):
+                st.info("Configure your parameters and click 'Run Analysis' to see results.")
+        except Exception as e:
+            st.error(f"Error processing file: {e}")
+            df = None
+    else:
+        # Display a welcome page if no file is uploaded
         st.markdown("""
-        ### Performance Data CSV
-        Your main performance data CSV file should have these columns:
-        - `AG`: Assortment Group name/identifier
-        - `SUM sales`: Total sales amount
-        - `SKU Qty`: Number of SKUs in the assortment group
-        - `Product Qty`: Number of distinct products
-        - `AVG availability (%)`: Average product availability percentage
-        - `Dormant days`: Average age of dormant inventory in days
-        - `Surplus cost`: Cost of surplus inventory
-        - `Lost sales`: Value of lost sales opportunities
-        
-        ### Seasonal Analysis CSV (Required)
-        The seasonal analysis CSV is required and should have these columns:
-        - `AG`: Assortment Group name/identifier (must match the AG values in the performance data)
-        - `Global STR (%)`: Global sales-through rate percentage (required)
-        - `Local STR (%)`: Local sales-through rate percentage
-        - Additional metrics like discount rates, unit sales, etc.
-        """)
+        <div class="warning-card">
+            <h2>Welcome to the AG Selection Tool!</h2>
+            <p>This tool helps you identify optimal assortment groups (AGs) for piloting based on performance criteria.</p>
+            <h3>To get started:</h3>
+            <ol>
+                <li>Upload <strong>both</strong> your AG performance CSV file and seasonal analysis CSV file (both are required)</li>
+                <li>Configure the filtering parameters to match your business needs</li>
+                <li>Click the "Run Analysis" button</li>
+                <li>Review the recommended AGs and download results if needed</li>
+            </ol>
+            <p>The tool automatically applies best practices for AG selection including:</p>
+            <ul>
+                <li>Focusing on mid-performing AGs (filtering out extremes)</li>
+                <li>Targeting balanced availability</li>
+                <li>Ensuring active dynamics (both surplus and lost sales)</li>
+                <li>Verifying sufficient assortment richness</li>
+            </ul>
+        </div>
+        """, unsafe_allow_html=True)
+    
+        # Show example of expected CSV format
+        with st.expander("Expected CSV Format"):
+            st.markdown("""
+            ### Performance Data CSV
+            Your main performance data CSV file should have these columns:
+            - `AG`: Assortment Group name/identifier
+            - `SUM sales`: Total sales amount
+            - `SKU Qty`: Number of SKUs in the assortment group
+            - `Product Qty`: Number of distinct products
+            - `AVG availability (%)`: Average product availability percentage
+            - `Dormant days`: Average age of dormant inventory in days
+            - `Surplus cost`: Cost of surplus inventory
+            - `Lost sales`: Value of lost sales opportunities
+        
+            ### Seasonal Analysis CSV (Required)
+            The seasonal analysis CSV is required and should have these columns:
+            - `AG`: Assortment Group name/identifier (must match the AG values in the performance data)
+            - `Global STR (%)`: Global sales-through rate percentage (required)
+            - `Local STR (%)`: Local sales-through rate percentage
+            - Additional metrics like discount rates, unit sales, etc.
+            """)
+finally:
+    profiler.close()
+    if profiler.capture_report is not None:
+        st.session_state.capture_report = (profiler.capture_tool, profiler.capture_report)
+
+# Fill the performance panel with this run's measurements
+if show_performance:
+    with performance_panel:
+        show_performance_panel(profiler)
+with run_history_panel:
+    show_run_history()
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,352 @@
+"""Benchmarks for the AG selection pipeline on seeded synthetic data.
+
+Examples:
+    python benchmark.py --sizes 1k,100k,1M
+    python benchmark.py --sizes 1k,100k --save-baseline baseline.json
+    python benchmark.py --sizes 1k,100k --baseline baseline.json --tolerance 0.3
+    python benchmark.py --sizes 1k,10k --periods 52
+
+The generated performance and seasonal CSVs include thousands separators,
+currency and percent signs, missing-value placeholders, unparseable cells
+and AGs missing from the seasonal file. They are cached in --data-dir.
+
+Each stage and the end-to-end selection are timed (best of --repeat), and
+the selected AGs and KPIs, and the ranked top k, are hashed. With --periods,
+the grouped selection is also timed on a long-format file with that many
+weeks of every AG. With duckdb installed, the SQL backend is timed end to
+end too and must select the same AGs. Against a baseline, a changed hash or
+a stage slower than the tolerance exits with status 1.
+
+With --startup, the app's upload page is run in a fresh interpreter: its
+first run (the cold start), a rerun, and the slowest imports of the first
+run are reported. A first run or rerun over its budget, or an analysis
+module imported before any data is uploaded, exits with status 1:
+    python benchmark.py --sizes "" --startup
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from formats import SEASONAL_COLUMNS
+from grouped import select_grouped_ags
+from pipeline import (
+    DEFAULT_PARAMS, add_kpis, apply_row_filters, build_season_index, filter_salethrough, load_input,
+    match_seasonal, rank_ags, sales_band_masks, score_ags, select_pilot_ags
+)
+from sqlengine import DUCKDB, select_pilot_ags_sql
+from synthetic import write_synthetic_pair, write_synthetic_periods
+
+logger = logging.getLogger('ag_benchmark')
+
+SIZE_SUFFIXES = {'k': 1_000, 'm': 1_000_000}
+
+# Stages faster than this are too noisy to flag as regressions
+MIN_FLAGGED_SECONDS = 0.05
+
+# Seconds the upload page may take on its first run in a fresh process, and on a rerun
+STARTUP_BUDGET = float(os.environ.get('AG_STARTUP_BUDGET', '1.0'))
+RERUN_BUDGET = float(os.environ.get('AG_RERUN_BUDGET', '0.25'))
+
+# Modules the upload page should only import once data is uploaded
+ANALYSIS_MODULES = ['pandas', 'numpy', 'pyarrow', 'altair', 'duckdb']
+
+# Runs app.py headlessly in a fresh interpreter and prints its timings as
+# JSON. The marker splits the -X importtime log at the start of the first run.
+_STARTUP_SCRIPT = """
+import json, os, sys, time
+app_path, repeat, modules = sys.argv[1], int(sys.argv[2]), sys.argv[3].split(',')
+sys.path.insert(0, os.path.dirname(app_path))
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+harness = time.perf_counter() - start
+app = AppTest.from_file(app_path, default_timeout=60)
+print('ag-first-run', file=sys.stderr, flush=True)
+start = time.perf_counter()
+app.run()
+first_run = time.perf_counter() - start
+reruns = []
+for _ in range(repeat):
+    start = time.perf_counter()
+    app.run()
+    reruns.append(time.perf_counter() - start)
+print(json.dumps({
+    'streamlit_import': harness, 'first_run': first_run, 'rerun': min(reruns),
+    'errors': [str(e.value) for e in app.exception],
+    'loaded': [name for name in modules if name in sys.modules],
+}))
+"""
+
+
+# Function to parse sizes like "1k" or "10M"
+def parse_size(text):
+    text = text.strip().lower()
+    if text[-1:] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+# Function to hash the selection so baselines catch changed results
+def result_digest(results, kpi_results, funnel):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(results['AG'].astype(str).str.cat(sep='\n').encode())
+    digest.update(kpi_results['KPI Focus'].astype(str).str.cat(sep='\n').encode())
+    digest.update(funnel[['Criterion', 'Remaining']].to_csv(index=False).encode())
+    return digest.hexdigest()
+
+
+# Function to hash the ranked top k, AGs and scores in order
+def ranked_digest(ranked):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(ranked[['AG', 'Score']].to_csv(index=False).encode())
+    return digest.hexdigest()
+
+
+# Function to run each pipeline stage once, timing them separately
+def run_stages(perf_path, season_path, params):
+    timings = {}
+    df = load_input(perf_path, timings=timings, name='performance')
+
+    start = time.perf_counter()
+    band_masks = sales_band_masks(df, params)
+    timings['sales_band'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    filtered_df, funnel = apply_row_filters(df, band_masks, params)
+    timings['row_filters'] = time.perf_counter() - start
+
+    season_df = load_input(season_path, usecols=SEASONAL_COLUMNS, timings=timings, name='seasonal')
+
+    start = time.perf_counter()
+    season_index = build_season_index(season_df)
+    timings['seasonal_index'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    codes, funnel = match_seasonal(filtered_df, funnel, season_index)
+    filtered_df, funnel = filter_salethrough(filtered_df, codes, funnel, season_index,
+                                             params['max_salethrough'])
+    timings['seasonal_join'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results, kpi_results = add_kpis(filtered_df)
+    timings['kpi'] = time.perf_counter() - start
+
+    # Ranked mode over every AG, for the default top k
+    start = time.perf_counter()
+    scores, all_codes = score_ags(df, season_index, params)
+    timings['score'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ranked = rank_ags(df, scores, all_codes, season_index)
+    timings['top_k'] = time.perf_counter() - start
+
+    return timings, len(df), results, kpi_results, funnel, ranked
+
+
+# Function to benchmark one size, keeping the best time per stage
+def benchmark_size(rows, data_dir, params, repeat=3, seed=0):
+    start = time.perf_counter()
+    perf_path, season_path = write_synthetic_pair(data_dir, rows, seed=seed)
+    logger.info("%s rows: data ready in %.2fs", f"{rows:,}", time.perf_counter() - start)
+
+    best = {}
+    sql = None
+    for _ in range(repeat):
+        timings, total_ags, results, kpi_results, funnel, ranked = run_stages(perf_path, season_path, params)
+        start = time.perf_counter()
+        select_pilot_ags(perf_path, season_path, params)
+        timings['end_to_end'] = time.perf_counter() - start
+        if DUCKDB:
+            start = time.perf_counter()
+            sql = select_pilot_ags_sql(perf_path, season_path, params)
+            timings['duckdb_end_to_end'] = time.perf_counter() - start
+        for stage, seconds in timings.items():
+            best[stage] = min(seconds, best.get(stage, seconds))
+
+    report = {
+        'rows': total_ags,
+        'selected': len(results),
+        'digest': result_digest(results, kpi_results, funnel),
+        'ranked_digest': ranked_digest(ranked),
+        'timings': best,
+        'rows_per_second': total_ags / best['end_to_end'] if best['end_to_end'] else 0,
+    }
+    if sql is not None:
+        report['duckdb_digest'] = result_digest(sql.results, sql.kpi_results, sql.funnel)
+    return report
+
+
+# Function to time the grouped selection over `periods` weeks of `rows` AGs
+def benchmark_periods(rows, periods, data_dir, params, repeat=3, seed=0):
+    _, season_path = write_synthetic_pair(data_dir, rows, seed=seed)
+    perf_path = write_synthetic_periods(data_dir, rows, periods, seed=seed)
+
+    best = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        selection = select_grouped_ags(perf_path, season_path, 'Week', params)
+        timings = dict(selection.timings, end_to_end=time.perf_counter() - start)
+        for stage, seconds in timings.items():
+            best[stage] = min(seconds, best.get(stage, seconds))
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(selection.consistency[['AG', 'Groups qualified']].to_csv(index=False).encode())
+    return {
+        'rows': selection.total_rows,
+        'periods': periods,
+        'selected': len(selection.results),
+        'digest': digest.hexdigest(),
+        'timings': best,
+        'rows_per_second': selection.total_rows / best['end_to_end'] if best['end_to_end'] else 0,
+    }
+
+
+# Function to list the slowest top-level imports of an -X importtime log
+def slowest_imports(log, limit=10):
+    imports = []
+    for line in log.splitlines():
+        parts = line.split('|')
+        if not line.startswith('import time:') or len(parts) != 3 or parts[2].startswith('  '):
+            continue
+        try:
+            imports.append((parts[2].strip(), int(parts[1]) / 1e6))
+        except ValueError:
+            continue
+    return dict(sorted(imports, key=lambda item: -item[1])[:limit])
+
+
+# Function to time the app's upload page in a fresh interpreter, as a new
+# server process would run it, with a throwaway run history
+def benchmark_startup(repeat=3):
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, AG_RUN_STORE=os.path.join(tmp, 'runs.sqlite3'))
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', _STARTUP_SCRIPT, app_path, str(repeat),
+             ','.join(ANALYSIS_MODULES)],
+            capture_output=True, text=True, env=env, cwd=tmp, check=True,
+        )
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+    report['slowest_imports'] = slowest_imports(completed.stderr.partition('ag-first-run')[2])
+    return report
+
+
+# Function to list where the upload page misses its budgets
+def startup_problems(startup):
+    problems = [f"startup: app raised {error}" for error in startup['errors']]
+    if startup['first_run'] > STARTUP_BUDGET:
+        problems.append(f"startup: first run took {startup['first_run']:.3f}s, over the {STARTUP_BUDGET:.2f}s budget")
+    if startup['rerun'] > RERUN_BUDGET:
+        problems.append(f"startup: rerun took {startup['rerun']:.3f}s, over the {RERUN_BUDGET:.2f}s budget")
+    if startup['loaded']:
+        problems.append(f"startup: {', '.join(startup['loaded'])} imported before any data was uploaded")
+    return problems
+
+
+# Function to list the differences from a stored baseline
+def compare_to_baseline(report, baseline, tolerance):
+    problems = []
+    current_sizes = [(size, current, baseline.get('sizes', {}).get(size))
+                     for size, current in report['sizes'].items()]
+    current_sizes += [(f"{size} grouped", current, baseline.get('grouped', {}).get(size))
+                      for size, current in report.get('grouped', {}).items()]
+    for size, current, previous in current_sizes:
+        if current.get('duckdb_digest', current['digest']) != current['digest']:
+            problems.append(f"{size}: DuckDB selected different AGs than pandas")
+        if previous is None or previous.get('periods') != current.get('periods'):
+            continue
+        if current['digest'] != previous['digest']:
+            problems.append(f"{size}: results changed ({previous['selected']} -> {current['selected']} AGs)")
+        if 'ranked_digest' in previous and previous['ranked_digest'] != current.get('ranked_digest'):
+            problems.append(f"{size}: ranked top k changed")
+        for stage, seconds in current['timings'].items():
+            before = previous['timings'].get(stage)
+            if before is None or seconds < MIN_FLAGGED_SECONDS:
+                continue
+            if seconds > before * (1 + tolerance):
+                problems.append(f"{size}: {stage} slowed from {before:.3f}s to {seconds:.3f}s "
+                                f"({seconds / before - 1:+.0%})")
+    if 'startup' in report and 'startup' in baseline:
+        for stage in ('first_run', 'rerun'):
+            seconds, before = report['startup'][stage], baseline['startup'][stage]
+            if seconds >= MIN_FLAGGED_SECONDS and seconds > before * (1 + tolerance):
+                problems.append(f"startup: {stage} slowed from {before:.3f}s to {seconds:.3f}s "
+                                f"({seconds / before - 1:+.0%})")
+    return problems
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the AG selection pipeline on synthetic data.")
+    parser.add_argument('--sizes', default='1k,100k,1M',
+                        help="Comma-separated row counts, e.g. 1k,100k,1M,10M, or empty to skip "
+                             "(default: 1k,100k,1M)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per size; the best time is kept")
+    parser.add_argument('--periods', type=int, default=0,
+                        help="Also time the grouped selection over this many weeks per size (default: off)")
+    parser.add_argument('--seed', type=int, default=0, help="Generator seed")
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'ag_benchmark_data'),
+                        help="Where generated CSVs are cached")
+    parser.add_argument('--startup', action='store_true',
+                        help="Also time the app's cold start and rerun against their budgets")
+    parser.add_argument('--output', help="Write the report as JSON")
+    parser.add_argument('--baseline', help="Compare against a stored report")
+    parser.add_argument('--save-baseline', help="Store this report as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed slowdown per stage before it is flagged (default: 0.25)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    params = dict(DEFAULT_PARAMS)
+    report = {'seed': args.seed, 'params': params, 'sizes': {}}
+    for size in filter(None, args.sizes.split(',')):
+        result = benchmark_size(parse_size(size), args.data_dir, params, args.repeat, args.seed)
+        report['sizes'][size.strip()] = result
+        stages = ' '.join(f"{stage}={seconds:.3f}s" for stage, seconds in result['timings'].items())
+        logger.info("%s: %d/%d AGs selected, %.0f rows/s | %s",
+                    size.strip(), result['selected'], result['rows'], result['rows_per_second'], stages)
+        if args.periods:
+            grouped = benchmark_periods(parse_size(size), args.periods, args.data_dir, params, args.repeat,
+                                        args.seed)
+            report.setdefault('grouped', {})[size.strip()] = grouped
+            stages = ' '.join(f"{stage}={seconds:.3f}s" for stage, seconds in grouped['timings'].items())
+            logger.info("%s x %d weeks: %d qualifying rows of %d, %.0f rows/s | %s", size.strip(), args.periods,
+                        grouped['selected'], grouped['rows'], grouped['rows_per_second'], stages)
+
+    problems = []
+    if args.startup:
+        startup = report['startup'] = benchmark_startup(args.repeat)
+        logger.info("startup: streamlit import %.3fs, first run %.3fs (budget %.2fs), rerun %.3fs (budget %.2fs)",
+                    startup['streamlit_import'], startup['first_run'], STARTUP_BUDGET, startup['rerun'],
+                    RERUN_BUDGET)
+        logger.info("startup: slowest imports on the first run | %s",
+                    ' '.join(f"{name}={seconds:.3f}s" for name, seconds in startup['slowest_imports'].items()))
+        problems += startup_problems(startup)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems += compare_to_baseline(report, json.load(f), args.tolerance)
+    for problem in problems:
+        logger.error(problem)
+    if problems:
+        return 1
+    if args.baseline:
+        logger.info("No regressions against %s", args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
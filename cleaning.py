@@ -0,0 +1,113 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+
+import numpy as np
+import pandas as pd
+
+# Columns the tool treats as numeric in both the performance and seasonal files
+NUMERIC_COLUMNS = [
+    'SUM sales', 'Surplus cost', 'Lost sales', 'SKU Qty', 'Product Qty',
+    'AVG availability (%)', 'Dormant days', 'Total sales (£)', 'Total sales (units)',
+    'Global STR (%)', 'Global Discount STR (%)', 'Global Full price STR (%)',
+    'Local STR (%)', 'Local Discount STR (%)', 'Local Full Price STR (%)'
+]
+
+# Whole-cell values that exports use for "no value"; these become 0
+SENTINELS = frozenset(['', '-', '—', '–', 'N/A', 'n/a', 'NA', 'na', 'nan', 'NaN', 'None', 'null'])
+
+# Thousands separators, currency signs, percent signs and stray whitespace
+_STRIP_PATTERN = r'[,\s$£€%]'
+
+REPORT_COLUMNS = ['missing', 'sentinel', 'unparseable', 'examples']
+
+# Columns are cleaned on this many threads. With pyarrow installed the string
+# work runs in Arrow kernels, which release the GIL.
+CLEAN_WORKERS = int(os.environ.get('AG_CLEAN_WORKERS', os.cpu_count() or 1))
+_ARROW_STRINGS = find_spec('pyarrow') is not None
+
+
+# Function to parse a single column into a float array in one pass
+def clean_column(values, dtype=np.float64, max_examples=5):
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    counts = {'missing': 0, 'sentinel': 0, 'unparseable': 0, 'examples': []}
+
+    # Already numeric: only missing values need attention
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        out = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        missing = np.isnan(out)
+        counts['missing'] = int(missing.sum())
+        infinite = np.isinf(out)
+        counts['unparseable'] = int(infinite.sum())
+        counts['examples'] = [str(value) for value in np.unique(out[infinite])[:max_examples]]
+        out[missing | infinite] = 0
+        return out.astype(dtype, copy=False), counts
+
+    # Fast path: let the C parser handle every well-formed value. It also reads
+    # 'inf' and 'Infinity', which are not usable numbers here.
+    out = pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    failed = ~np.isfinite(out)
+    if not failed.any():
+        return out.astype(dtype, copy=False), counts
+
+    # Slow path only for the cells the fast parser rejected
+    original = series.to_numpy(dtype=object)
+    missing = failed & pd.isna(original)
+    counts['missing'] = int(missing.sum())
+
+    messy_idx = np.flatnonzero(failed & ~missing)
+    if len(messy_idx):
+        raw = pd.Series(original[messy_idx]).astype(str)
+        if _ARROW_STRINGS:
+            raw = raw.astype(pd.StringDtype('pyarrow'))
+        raw = raw.str.strip()
+
+        sentinel = raw.isin(SENTINELS).to_numpy()
+        counts['sentinel'] = int(sentinel.sum())
+
+        # Normalize unicode minus and accounting negatives like "(1,234)"
+        text = raw[~sentinel].str.replace('−', '-', regex=False)
+        negative = (text.str.startswith('(') & text.str.endswith(')')).to_numpy(dtype=bool)
+        text = text.str.strip('()').str.replace(_STRIP_PATTERN, '', regex=True)
+        parsed = pd.to_numeric(text, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        parsed = np.where(negative, -parsed, parsed)
+
+        unparseable = ~np.isfinite(parsed)
+        counts['unparseable'] = int(unparseable.sum())
+        counts['examples'] = raw[~sentinel][unparseable].unique()[:max_examples].tolist()
+
+        out[messy_idx[~sentinel]] = parsed
+
+    # Missing, sentinel, unparseable and infinite cells all become 0
+    out[~np.isfinite(out)] = 0
+    return out.astype(dtype, copy=False), counts
+
+
+# Function to clean numeric columns and report what was coerced per column.
+# Columns are independent, so they are cleaned in parallel.
+def clean_frame(df, columns=None, dtype=np.float64, workers=CLEAN_WORKERS):
+    columns = NUMERIC_COLUMNS if columns is None else columns
+    present = [col for col in columns if col in df.columns]
+
+    def clean(col):
+        return clean_column(df[col], dtype=dtype)
+
+    if workers > 1 and len(present) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(present))) as pool:
+            cleaned = list(pool.map(clean, present))
+    else:
+        cleaned = [clean(col) for col in present]
+
+    rows = {}
+    for col, (values, counts) in zip(present, cleaned):
+        df[col], rows[col] = values, counts
+
+    report = pd.DataFrame.from_dict(rows, orient='index', columns=REPORT_COLUMNS)
+    report.index.name = 'Column'
+    return df, report
+
+
+# Function to clean numeric columns
+def clean_numeric_values(df, columns=None, dtype=np.float64):
+    df, _ = clean_frame(df, columns=columns, dtype=dtype)
+    return df
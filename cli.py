@@ -0,0 +1,189 @@
+"""Headless AG pilot selection for scheduled jobs.
+
+Examples:
+    python cli.py --pair perf_north.csv season_north.csv --pair perf_south.csv season_south.csv
+    python cli.py --manifest regions.csv --out results/ --format parquet --workers 4
+    python cli.py --pair weekly_perf.csv season.csv --group-column Week
+    python cli.py --pair 'extracts/perf_*.parquet' season.parquet --backend duckdb
+
+A manifest is a CSV with `performance` and `seasonal` columns (file paths)
+and an optional `name` column used to prefix the output files.
+
+With --group-column, each performance file is long-format (one row per AG
+and period or store) and the selection runs within every group; an extra
+`_consistency.csv` lists how many groups each AG qualifies in.
+
+With --backend duckdb (requires the duckdb package), the selection runs as
+SQL in DuckDB straight from the files, which may be globs, so performance
+data larger than memory is never loaded into pandas.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import closing
+
+import pandas as pd
+
+from grouped import select_grouped_ags
+from pipeline import DEFAULT_PARAMS, select_pilot_ags
+from sqlengine import DUCKDB, connect, select_pilot_ags_sql
+
+logger = logging.getLogger('ag_selection')
+
+
+# Function to write one pair's results and KPI table
+def write_outputs(result, out_dir, name, fmt):
+    results_path = os.path.join(out_dir, f"{name}_results.{fmt}")
+    kpi_path = os.path.join(out_dir, f"{name}_kpi_recommendations.csv")
+    if fmt == 'parquet':
+        result.results.to_parquet(results_path, index=False)
+    else:
+        result.results.to_csv(results_path, index=False)
+    result.kpi_results.to_csv(kpi_path, index=False)
+    if hasattr(result, 'consistency'):
+        consistency_path = os.path.join(out_dir, f"{name}_consistency.csv")
+        result.consistency.to_csv(consistency_path, index=False)
+        return results_path, kpi_path, consistency_path
+    return results_path, kpi_path
+
+
+# Function to process one performance/seasonal pair (runs in a worker process)
+def run_pair(name, perf_path, season_path, params, out_dir, fmt, group_column=None, sql_threads=None):
+    start = time.perf_counter()
+    if sql_threads is not None:
+        with closing(connect(threads=sql_threads)) as con:
+            result = select_pilot_ags_sql(perf_path, season_path, params, funnel=False, con=con)
+        total_rows = result.total_ags
+    elif group_column is None:
+        result = select_pilot_ags(perf_path, season_path, params)
+        total_rows = result.total_ags
+    else:
+        result = select_grouped_ags(perf_path, season_path, group_column, params)
+        total_rows = result.total_rows
+    write_start = time.perf_counter()
+    paths = write_outputs(result, out_dir, name, fmt)
+    timings = dict(result.timings, write=time.perf_counter() - write_start)
+    return {
+        'name': name,
+        'total_ags': total_rows,
+        'selected_ags': len(result.results),
+        'seconds': time.perf_counter() - start,
+        'timings': timings,
+        'outputs': paths,
+    }
+
+
+# Function to name a pair's outputs after its performance path, without the
+# glob wildcards a DuckDB path may hold; a bare wildcard falls back to the
+# directory name
+def output_name(perf_path):
+    for part in (os.path.splitext(os.path.basename(perf_path))[0], os.path.basename(os.path.dirname(perf_path))):
+        name = re.sub(r'_+', '_', re.sub(r'\[[^\]]*\]|[*?]', '_', part)).strip('_-. ')
+        if name:
+            return name
+    return 'results'
+
+
+# Function to collect the (name, performance, seasonal) pairs to process
+def collect_pairs(args):
+    pairs = []
+    for perf_path, season_path in args.pair or []:
+        pairs.append((output_name(perf_path), perf_path, season_path))
+    if args.manifest:
+        manifest = pd.read_csv(args.manifest)
+        base = os.path.dirname(os.path.abspath(args.manifest))
+        for _, row in manifest.iterrows():
+            perf_path = os.path.join(base, row['performance'])
+            season_path = os.path.join(base, row['seasonal'])
+            if 'name' in manifest.columns:
+                name = str(row['name'])
+            else:
+                name = output_name(perf_path)
+            pairs.append((name, perf_path, season_path))
+
+    names = [name for name, _, _ in pairs]
+    if len(set(names)) != len(names):
+        raise SystemExit("Output names must be unique; add a `name` column to the manifest.")
+    return pairs
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Select pilot AGs from performance and seasonal exports.")
+    parser.add_argument('--pair', nargs=2, action='append', metavar=('PERFORMANCE', 'SEASONAL'),
+                        help="A performance file and its seasonal file (repeatable)")
+    parser.add_argument('--manifest', help="CSV listing performance/seasonal file pairs")
+    parser.add_argument('--out', default='.', help="Output directory (default: current directory)")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help="Results file format")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument('--params', help="JSON file with parameter overrides")
+    parser.add_argument('--group-column',
+                        help="Period or store column of long-format performance files; selects within each group")
+    parser.add_argument('--backend', choices=['pandas', 'duckdb'], default='pandas',
+                        help="Run the selection in pandas or as SQL in DuckDB (default: pandas)")
+    for param, default in DEFAULT_PARAMS.items():
+        parser.add_argument(f"--{param.replace('_', '-')}", dest=param, type=float,
+                            help=f"(default: {default})")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    params = dict(DEFAULT_PARAMS)
+    if args.params:
+        with open(args.params) as f:
+            params.update(json.load(f))
+    params.update({param: getattr(args, param) for param in DEFAULT_PARAMS
+                   if getattr(args, param) is not None})
+
+    pairs = collect_pairs(args)
+    if not pairs:
+        build_parser().error("Give at least one --pair or a --manifest")
+    sql_threads = None
+    if args.backend == 'duckdb':
+        if not DUCKDB:
+            build_parser().error("--backend duckdb needs the duckdb package")
+        if args.group_column:
+            build_parser().error("--group-column is not supported with --backend duckdb")
+        # DuckDB is multi-threaded, so the cores are split between the worker processes
+        sql_threads = max(1, (os.cpu_count() or 1) // max(1, min(args.workers, len(pairs))))
+    os.makedirs(args.out, exist_ok=True)
+    logger.info("Processing %d pair(s) with %d worker(s); params=%s", len(pairs), args.workers, params)
+
+    start = time.perf_counter()
+    failures = 0
+    total_rows = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(pairs)))) as pool:
+        futures = {
+            pool.submit(run_pair, name, perf_path, season_path, params, args.out, args.format,
+                        args.group_column, sql_threads): name
+            for name, perf_path, season_path in pairs
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                failures += 1
+                logger.error("%s: failed: %s", name, e)
+                continue
+            total_rows += summary['total_ags']
+            stages = ' '.join(f"{stage}={seconds:.3f}s" for stage, seconds in summary['timings'].items())
+            logger.info("%s: %d/%d AGs selected in %.2fs (%.0f rows/s) | %s",
+                        name, summary['selected_ags'], summary['total_ags'], summary['seconds'],
+                        summary['total_ags'] / summary['seconds'] if summary['seconds'] else 0, stages)
+
+    elapsed = time.perf_counter() - start
+    logger.info("Done: %d pair(s), %d failed, %d rows in %.2fs (%.0f rows/s)",
+                len(pairs), failures, total_rows, elapsed, total_rows / elapsed if elapsed else 0)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import os
+from importlib.util import find_spec
+
+import numpy as np
+import pandas as pd
+
+# Key columns are stored as categoricals when values repeat this much,
+# otherwise as Arrow strings (when pyarrow is installed)
+CATEGORY_MAX_RATIO = 0.5
+
+KEY_COLUMNS = ('AG',)
+
+_INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+# Function to pick the smallest integer type that holds every value
+def _smallest_int(values):
+    if len(values) == 0:
+        return values
+    low, high = values.min(), values.max()
+    for int_type in _INT_TYPES:
+        info = np.iinfo(int_type)
+        if info.min <= low and high <= info.max:
+            return values.astype(int_type, copy=False)
+    return values
+
+
+# Function to downcast one numeric array without changing any value.
+# Whole-number floats become the smallest integer type; other floats become
+# float32 only if every value survives the round trip.
+def downcast_values(values):
+    if values.dtype.kind in 'iu':
+        return _smallest_int(values)
+    if values.dtype.kind != 'f' or len(values) == 0:
+        return values
+    if np.isfinite(values).all() and np.array_equal(values, np.trunc(values)):
+        if np.abs(values).max() < 2 ** 62:
+            return _smallest_int(values.astype(np.int64))
+        return values
+    if values.dtype.itemsize > 4:
+        as_float32 = values.astype(np.float32)
+        if np.array_equal(as_float32.astype(values.dtype), values, equal_nan=True):
+            return as_float32
+    return values
+
+
+# Function to store a text key column compactly: categorical codes when
+# values repeat, Arrow strings when they are mostly unique
+def compact_keys(series):
+    if isinstance(series.dtype, pd.CategoricalDtype) or len(series) == 0:
+        return series
+    if series.nunique(dropna=False) <= CATEGORY_MAX_RATIO * len(series):
+        return series.astype('category')
+    if isinstance(series.dtype, pd.StringDtype) and series.dtype.storage == 'pyarrow':
+        return series
+    if find_spec('pyarrow') is not None:
+        return series.astype(pd.StringDtype('pyarrow'))
+    return series
+
+
+# Function to shrink a cleaned frame: lossless numeric downcasts and compact
+# key columns. Untouched columns are shared with the input, not copied.
+def compact_frame(df, key_columns=KEY_COLUMNS):
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if col in key_columns and (series.dtype == object or isinstance(series.dtype, pd.StringDtype)):
+            columns[col] = compact_keys(series)
+        elif pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            values = series.to_numpy()
+            compacted = downcast_values(values)
+            columns[col] = series if compacted is values else pd.Series(compacted, index=df.index, name=col)
+        else:
+            columns[col] = series
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+# Function to make a frame's numpy-backed columns read-only, so a frame
+# shared between sessions cannot be changed in place through any view
+def freeze_frame(df):
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, np.dtype):
+            values = series.to_numpy().view()
+            values.flags.writeable = False
+            series = pd.Series(values, index=df.index, name=col, copy=False)
+        columns[col] = series
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+# Function to drop categories a result slice no longer uses, so exports of
+# a few rows do not carry the full key dictionary
+def trim_categories(df):
+    categorical = [col for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)]
+    if not categorical:
+        return df
+    return df.assign(**{col: df[col].cat.remove_unused_categories() for col in categorical})
+
+
+# Function to count the bytes held by frames, arrays and containers of them.
+# Objects listed in `seen` (by id) are skipped, so shared data counts once.
+def nbytes(value, seen=None):
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        # Views of one frame share column buffers, so count each buffer once
+        total = int(value.index.memory_usage(deep=True))
+        for col in value.columns:
+            series = value[col]
+            if isinstance(series.dtype, np.dtype):
+                buffer = ('buffer', series.to_numpy().__array_interface__['data'][0])
+            else:
+                buffer = ('array', id(series.array))
+            if buffer not in seen:
+                seen.add(buffer)
+                total += int(series.memory_usage(index=False, deep=True))
+        return total
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(nbytes(item, seen) for item in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(item, seen) for item in value)
+    if hasattr(value, 'memory_bytes'):
+        return value.memory_bytes()
+    return 0
+
+
+# Function to read the host's physical memory (None where unavailable)
+def host_memory_bytes():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+# Function to summarize memory for capacity planning: what every session
+# shares, what this session holds on its own, and how many such sessions
+# would fit in the host's memory
+def memory_report(shared, session, host_bytes=None):
+    host_bytes = host_memory_bytes() if host_bytes is None else host_bytes
+    seen = set()
+    shared_bytes = nbytes(shared, seen)
+    session_bytes = nbytes(session, seen)
+    sessions = None
+    if host_bytes and session_bytes:
+        sessions = max(int((host_bytes - shared_bytes) // session_bytes), 0)
+    return {
+        'shared_bytes': shared_bytes,
+        'session_bytes': session_bytes,
+        'host_bytes': host_bytes,
+        'sessions_per_host': sessions,
+    }
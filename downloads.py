@@ -0,0 +1,107 @@
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from io import BytesIO
+
+from compact import trim_categories
+
+# Download formats: label -> (format, file extension, mime type)
+DOWNLOAD_FORMATS = {
+    'CSV': ('csv', 'csv', 'text/csv'),
+    'CSV (gzip)': ('csv.gz', 'csv.gz', 'application/gzip'),
+    'Parquet': ('parquet', 'parquet', 'application/vnd.apache.parquet'),
+}
+
+DEFAULT_CHUNK_ROWS = 50_000
+DEFAULT_DOWNLOAD_CACHE_MB = int(os.environ.get('AG_DOWNLOAD_CACHE_MB', '256'))
+
+
+# Function to serialize a frame piece by piece, yielding encoded bytes.
+# Only one chunk of rows is rendered to text at a time.
+def iter_serialized(df, fmt='csv', chunk_rows=DEFAULT_CHUNK_ROWS):
+    df = trim_categories(df)
+    if fmt in ('csv', 'csv.gz'):
+        compressor = zlib.compressobj(wbits=31) if fmt == 'csv.gz' else None
+        for start in range(0, max(len(df), 1), chunk_rows):
+            text = df.iloc[start:start + chunk_rows].to_csv(index=False, header=start == 0)
+            data = text.encode()
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+        if compressor is not None:
+            yield compressor.flush()
+        return
+
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        buffer = BytesIO()
+        # Infer types over all rows so every chunk shares one schema
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        with pq.ParquetWriter(buffer, schema) as writer:
+            for start in range(0, len(df), chunk_rows):
+                batch = pa.Table.from_pandas(df.iloc[start:start + chunk_rows],
+                                             schema=schema, preserve_index=False)
+                writer.write_table(batch)
+                # Hand over whatever the writer has flushed so far
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+        return
+
+    raise ValueError(f"Unsupported download format: {fmt}")
+
+
+class DownloadCache:
+    # Serialized downloads per (result version, name, format), kept in a
+    # byte-bounded LRU so repeated downloads of the same result reuse the bytes
+
+    def __init__(self, max_bytes=DEFAULT_DOWNLOAD_CACHE_MB * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    # Function to serialize on first request and cache the bytes
+    def serialize(self, key, df, fmt):
+        data = self.get(key)
+        if data is not None:
+            return data
+
+        buffer = BytesIO()
+        for chunk in iter_serialized(df, fmt):
+            buffer.write(chunk)
+        data = buffer.getvalue()
+
+        if len(data) <= self.max_bytes:
+            with self._lock:
+                self._entries[key] = data
+                total = sum(len(value) for value in self._entries.values())
+                while total > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    total -= len(evicted)
+        return data
+
+
+# Shared by every session in this server process
+download_cache = DownloadCache()
+
+
+# Function to format a byte count for button labels
+def format_size(nbytes):
+    if nbytes < 1024:
+        return f"{nbytes} B"
+    for unit in ('KB', 'MB', 'GB'):
+        nbytes /= 1024
+        if nbytes < 1024 or unit == 'GB':
+            return f"{nbytes:.1f} {unit}"
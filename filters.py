@@ -0,0 +1,108 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# One predicate of the selection: rows pass when `column <op> value`
+Criterion = namedtuple('Criterion', ['label', 'column', 'op', 'value'])
+
+OPERATORS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+}
+
+FUNNEL_COLUMNS = ['Criterion', 'Rejected', 'Remaining', 'Rejected alone']
+
+
+# Function to get the sales percentile thresholds used by the sales band filter
+def sales_band_thresholds(sales, top_sales_percentile, bottom_sales_percentile):
+    sales = np.asarray(sales, dtype=np.float64)
+    top_threshold = np.percentile(sales, 100 - top_sales_percentile)
+    bottom_threshold = np.percentile(sales, bottom_sales_percentile)
+    return top_threshold, bottom_threshold
+
+
+# Function to build the sales band criteria from precomputed thresholds
+def sales_band_criteria(top_threshold, bottom_threshold):
+    return [
+        Criterion('Sales percentile band', 'SUM sales', '<', top_threshold),
+        Criterion('Sales percentile band', 'SUM sales', '>', bottom_threshold),
+    ]
+
+
+# Function to build the criteria that only look at a single row
+def row_criteria(params):
+    return [
+        Criterion('Availability range', 'AVG availability (%)', '>=', params['min_availability']),
+        Criterion('Availability range', 'AVG availability (%)', '<=', params['max_availability']),
+        Criterion('Assortment richness', 'SKU Qty', '>=', params['min_skus']),
+        Criterion('Assortment richness', 'Product Qty', '>=', params['min_products']),
+        Criterion('Surplus cost', 'Surplus cost', '>', params['min_surplus']),
+        Criterion('Lost sales', 'Lost sales', '>', params['min_lost_sales']),
+        Criterion('Dormant days', 'Dormant days', '>=', params['min_age']),
+    ]
+
+
+# Function to build the criteria spec from the parameter widgets
+def build_criteria(df, params):
+    top_threshold, bottom_threshold = sales_band_thresholds(
+        df['SUM sales'], params['top_sales_percentile'], params['bottom_sales_percentile']
+    )
+    return sales_band_criteria(top_threshold, bottom_threshold) + row_criteria(params)
+
+
+class FilterPipeline:
+    # Evaluates every criterion as a NumPy mask over the original columns and
+    # materializes the surviving rows once, at the end
+
+    def __init__(self, criteria):
+        self.criteria = list(criteria)
+
+    @classmethod
+    def from_params(cls, df, params):
+        return cls(build_criteria(df, params))
+
+    # Function to evaluate one boolean mask per criterion label
+    def masks(self, df):
+        masks = {}
+        for criterion in self.criteria:
+            values = df[criterion.column].to_numpy()
+            # A float64 threshold keeps downcast columns comparing exactly as float64
+            mask = OPERATORS[criterion.op](values, np.float64(criterion.value))
+            if criterion.label in masks:
+                np.logical_and(masks[criterion.label], mask, out=masks[criterion.label])
+            else:
+                masks[criterion.label] = mask
+        return masks
+
+    # Function to apply all criteria and return the survivors with the funnel
+    def run(self, df):
+        combined, funnel = combine_masks(self.masks(df), len(df))
+        return df[combined], funnel
+
+
+# Function to AND label masks together in order, counting each step's rejections
+def combine_masks(masks, n_rows):
+    combined = np.ones(n_rows, dtype=bool)
+    rows = []
+
+    for label, mask in masks.items():
+        remaining_before = int(combined.sum())
+        np.logical_and(combined, mask, out=combined)
+        remaining = int(combined.sum())
+        rows.append([label, remaining_before - remaining, remaining, int(len(mask) - mask.sum())])
+
+    return combined, pd.DataFrame(rows, columns=FUNNEL_COLUMNS)
+
+
+# Function to add a funnel row for a step applied outside the pipeline
+def append_funnel_step(funnel, label, remaining_after, rejected_alone=None):
+    remaining_before = int(funnel['Remaining'].iloc[-1]) if len(funnel) else remaining_after
+    rejected = remaining_before - remaining_after
+    row = pd.DataFrame(
+        [[label, rejected, remaining_after, rejected if rejected_alone is None else rejected_alone]],
+        columns=FUNNEL_COLUMNS,
+    )
+    return pd.concat([funnel, row], ignore_index=True)
@@ -0,0 +1,233 @@
+import csv
+import os
+from importlib.util import find_spec
+from io import BytesIO, StringIO
+
+# Columns each stage of the analysis reads from the uploads
+PERFORMANCE_COLUMNS = [
+    'AG', 'SUM sales', 'SKU Qty', 'Product Qty', 'AVG availability (%)',
+    'Dormant days', 'Surplus cost', 'Lost sales'
+]
+SEASONAL_COLUMNS = [
+    'AG', 'Global STR (%)', 'Global Discount STR (%)', 'Global Full price STR (%)',
+    'Local STR (%)', 'Local Discount STR (%)', 'Local Full Price STR (%)'
+]
+
+# Upload extensions accepted by the file uploaders, by format
+FORMAT_EXTENSIONS = {
+    'csv': ['csv', 'txt'],
+    'parquet': ['parquet', 'pq'],
+    'arrow': ['feather', 'arrow', 'ipc'],
+}
+UPLOAD_TYPES = [ext for exts in FORMAT_EXTENSIONS.values() for ext in exts]
+
+# Export formats for the cleaned dataset: label -> (format, extension, mime type)
+EXPORT_FORMATS = {
+    'Parquet': ('parquet', 'parquet', 'application/vnd.apache.parquet'),
+    'Feather (Arrow IPC)': ('arrow', 'feather', 'application/vnd.apache.arrow.file'),
+}
+
+
+# Cell values pandas reads as missing; the Arrow CSV reader is given the same list
+CSV_NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+]
+
+# Parse CSVs with Arrow's multithreaded reader when pyarrow is installed
+ARROW_CSV = find_spec('pyarrow') is not None
+
+
+# Function to work out the file format from a file name
+def detect_format(name):
+    ext = os.path.splitext(str(name))[1].lstrip('.').lower()
+    for fmt, exts in FORMAT_EXTENSIONS.items():
+        if ext in exts:
+            return fmt
+    return 'csv'
+
+
+# Leading bytes of the binary formats; anything else is read as CSV
+FORMAT_MAGIC = {
+    b'PAR1': 'parquet',
+    b'ARROW1': 'arrow',
+    # Arrow IPC streams open with a continuation marker
+    b'\xff\xff\xff\xff': 'arrow',
+}
+
+
+# Function to work out the file format from the first bytes of the data
+def sniff_format(data):
+    head = bytes(data[:8])
+    for magic, fmt in FORMAT_MAGIC.items():
+        if head.startswith(magic):
+            return fmt
+    return 'csv'
+
+
+# Function to get a pandas-readable handle for bytes, a path or a file object
+def _csv_handle(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return BytesIO(source)
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+
+# Function to wrap bytes, an in-memory upload or a path as an Arrow input
+# without copying. Paths are memory-mapped so multi-GB files are not read
+# into RAM up front.
+def _arrow_source(source):
+    import pyarrow as pa
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return pa.BufferReader(pa.py_buffer(source))
+    if hasattr(source, 'getbuffer'):
+        return pa.BufferReader(pa.py_buffer(source.getbuffer()))
+    if hasattr(source, 'read'):
+        return pa.PythonFile(source, mode='r')
+    return pa.memory_map(os.fspath(source), 'r')
+
+
+# Function to read the column names from the first line of a CSV
+def _csv_header(source, limit=1 << 16):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        head = bytes(source[:limit])
+    elif hasattr(source, 'getbuffer'):
+        head = bytes(source.getbuffer()[:limit])
+    elif hasattr(source, 'read'):
+        source.seek(0)
+        head = source.read(limit)
+        source.seek(0)
+    else:
+        with open(source, 'rb') as f:
+            head = f.read(limit)
+    return next(csv.reader(StringIO(head.decode('utf-8-sig', errors='replace'))), [])
+
+
+# Function to parse a CSV on all cores with Arrow, producing the same columns
+# and dtypes as pd.read_csv. Returns None when pandas should read it instead.
+def _read_csv_arrow(source, usecols):
+    import pyarrow as pa
+    from pyarrow import csv as arrow_csv
+
+    names = _csv_header(source)
+    if not names or len(set(names)) != len(names):
+        # pandas renames duplicate columns; leave those files to it
+        return None
+
+    convert = arrow_csv.ConvertOptions(
+        include_columns=None if usecols is None else [name for name in names if name in usecols],
+        null_values=CSV_NA_VALUES,
+        strings_can_be_null=True,
+    )
+    try:
+        table = arrow_csv.read_csv(_arrow_source(source), convert_options=convert)
+    except pa.ArrowInvalid:
+        # A value later in the file did not fit the type inferred from the
+        # first block; read everything as text and let cleaning parse it
+        convert.column_types = {name: pa.string() for name in names}
+        return arrow_csv.read_csv(_arrow_source(source), convert_options=convert).to_pandas()
+
+    # pandas leaves dates as text, so re-read any column Arrow parsed as one
+    temporal = [field.name for field in table.schema if pa.types.is_temporal(field.type)]
+    if temporal:
+        convert.column_types = {name: pa.string() for name in temporal}
+        table = arrow_csv.read_csv(_arrow_source(source), convert_options=convert)
+    return table.to_pandas()
+
+
+# Function to open an Arrow IPC file, falling back to the streaming format
+def _read_arrow(source, usecols):
+    import pyarrow as pa
+
+    try:
+        reader = pa.ipc.open_file(_arrow_source(source))
+        schema = reader.schema
+        table = reader.read_all()
+    except pa.ArrowInvalid:
+        reader = pa.ipc.open_stream(_arrow_source(source))
+        schema = reader.schema
+        table = reader.read_all()
+    if usecols is not None:
+        table = table.select([name for name in schema.names if name in usecols])
+    return table
+
+
+# Function to read a table from bytes or a path, keeping only `usecols` if given
+def read_table(source, fmt='csv', usecols=None):
+    usecols = None if usecols is None else set(usecols)
+
+    if fmt == 'csv':
+        df = _read_csv_arrow(source, usecols) if ARROW_CSV else None
+        if df is not None:
+            return df
+        import pandas as pd
+
+        return pd.read_csv(_csv_handle(source),
+                           usecols=None if usecols is None else (lambda col: col in usecols))
+
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(_arrow_source(source))
+        names = parquet_file.schema_arrow.names
+        columns = None if usecols is None else [name for name in names if name in usecols]
+        return parquet_file.read(columns=columns).to_pandas()
+
+    if fmt == 'arrow':
+        return _read_arrow(source, usecols).to_pandas()
+
+    raise ValueError(f"Unsupported file format: {fmt}")
+
+
+# Function to serialize a cleaned frame to a columnar format
+def to_columnar_bytes(df, fmt='parquet'):
+    buffer = BytesIO()
+    if fmt == 'parquet':
+        df.to_parquet(buffer, index=False)
+    elif fmt == 'arrow':
+        df.reset_index(drop=True).to_feather(buffer)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    return buffer.getvalue()
+
+
+# Function to read a table in chunks of roughly `chunksize` rows
+def iter_table_chunks(source, fmt='csv', chunksize=250_000, usecols=None):
+    usecols = None if usecols is None else set(usecols)
+
+    if fmt == 'csv':
+        import pandas as pd
+
+        reader = pd.read_csv(_csv_handle(source), chunksize=chunksize,
+                             usecols=None if usecols is None else (lambda col: col in usecols))
+        with reader:
+            yield from reader
+        return
+
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(_arrow_source(source))
+        names = parquet_file.schema_arrow.names
+        columns = None if usecols is None else [name for name in names if name in usecols]
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    if fmt == 'arrow':
+        import pyarrow as pa
+
+        try:
+            reader = pa.ipc.open_file(_arrow_source(source))
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        except pa.ArrowInvalid:
+            batches = pa.ipc.open_stream(_arrow_source(source))
+        for batch in batches:
+            if usecols is not None:
+                batch = batch.select([name for name in batch.schema.names if name in usecols])
+            yield batch.to_pandas()
+        return
+
+    raise ValueError(f"Unsupported file format: {fmt}")
@@ -0,0 +1,175 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from filters import FilterPipeline, append_funnel_step, combine_masks, row_criteria
+from formats import SEASONAL_COLUMNS
+from kpi import KPI_NAMES, kpi_codes
+from pipeline import DEFAULT_PARAMS, _timed, add_kpis, load_input
+from seasonal import SeasonalIndex
+
+# Outcome of a grouped run. `results` has one row per qualifying (group, AG);
+# `consistency` one row per AG across groups; `groups` one row per group.
+GroupedSelection = namedtuple('GroupedSelection', [
+    'results', 'kpi_results', 'consistency', 'groups', 'funnel', 'total_rows', 'timings'
+])
+
+CONSISTENCY_COLUMNS = ['AG', 'Groups present', 'Groups qualified', 'Qualified share', 'Most frequent KPI',
+                       'Mean sales when qualified']
+
+
+# Function to encode the group column as codes 0..n-1 in sorted order.
+# Rows with no group get code -1.
+def group_codes(df, group_column):
+    codes, labels = pd.factorize(df[group_column], sort=True)
+    return codes, pd.Index(labels, name=group_column)
+
+
+# Function to compute the q-th percentile of `values` within every group in
+# one pass: a single sort by (group, value), then index arithmetic per group.
+# Matches np.percentile (linear interpolation) run on each group alone.
+def group_percentiles(values, codes, n_groups, q):
+    values = np.asarray(values, dtype=np.float64)
+    valid = codes >= 0
+    codes, values = codes[valid], values[valid]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    ordered = values[np.lexsort((values, codes))]
+
+    result = np.full(n_groups, np.nan)
+    present = counts > 0
+    position = (q / 100) * (counts[present] - 1)
+    low = np.floor(position).astype(np.intp)
+    high = np.minimum(low + 1, counts[present] - 1)
+    fraction = position - low
+    below = ordered[starts[present] + low]
+    above = ordered[starts[present] + high]
+    # Same interpolation as NumPy, so a group's thresholds equal a run on that group alone
+    step = above - below
+    result[present] = np.where(fraction >= 0.5, above - step * (1 - fraction), below + step * fraction)
+    return result
+
+
+# Function to find the rows inside their own group's sales percentile band
+def grouped_sales_band(df, codes, n_groups, params):
+    sales = df['SUM sales'].to_numpy(dtype=np.float64)
+    top = group_percentiles(sales, codes, n_groups, 100 - params['top_sales_percentile'])
+    bottom = group_percentiles(sales, codes, n_groups, params['bottom_sales_percentile'])
+    safe = np.maximum(codes, 0)
+    band = (codes >= 0) & (sales < top[safe]) & (sales > bottom[safe])
+    return band, top, bottom
+
+
+# Function to run the whole selection for every group at once: sales bands
+# per group, the row filters, the seasonal join on the index's key columns,
+# the maximum salethrough and the KPIs. Each step is one vectorized pass
+# over all rows, so the run time grows with the total row count.
+def select_grouped(df, season_index, group_column, params, extra_columns=()):
+    codes, labels = group_codes(df, group_column)
+    n_groups = len(labels)
+
+    band, top, bottom = grouped_sales_band(df, codes, n_groups, params)
+    masks = {'Sales percentile band': band}
+    masks.update(FilterPipeline(row_criteria(params)).masks(df))
+    combined, funnel = combine_masks(masks, len(df))
+
+    # Seasonal lookup for the survivors only
+    positions = np.flatnonzero(combined)
+    survivors = df.iloc[positions]
+    seasonal = season_index.codes_for_rows(survivors)
+    funnel = append_funnel_step(funnel, 'Seasonal match', int((seasonal >= 0).sum()))
+    keep = (seasonal >= 0) & (season_index.gather('Global STR (%)', seasonal) <= params['max_salethrough'])
+    funnel = append_funnel_step(funnel, 'Maximum salethrough', int(keep.sum()))
+
+    joined = season_index.join(survivors, seasonal, keep, columns=['Global STR (%)'] + list(extra_columns))
+    results, kpi_results = add_kpis(joined)
+    kpi_results.insert(0, group_column, np.repeat(results[group_column].to_numpy(), 2))
+    selected_codes = codes[positions[keep]]
+
+    groups = pd.DataFrame({
+        'Rows': np.bincount(codes[codes >= 0], minlength=n_groups),
+        'Qualified': np.bincount(selected_codes, minlength=n_groups),
+        'Top sales threshold': top,
+        'Bottom sales threshold': bottom,
+    }, index=labels).reset_index()
+    consistency = consistency_table(df, codes, n_groups, results, selected_codes)
+    return GroupedSelection(results, kpi_results, consistency, groups, funnel, len(df), {})
+
+
+# Function to count the distinct groups each AG has rows in, so an AG listed
+# twice in one period counts once. Rows with a code of -1 are skipped.
+def _distinct_group_counts(ag_codes, group_codes, n_groups, n_ags):
+    valid = (ag_codes >= 0) & (group_codes >= 0)
+    pairs = np.unique(ag_codes[valid].astype(np.int64) * n_groups + group_codes[valid])
+    return np.bincount(pairs // max(n_groups, 1), minlength=n_ags)
+
+
+# Function to count, per AG, the groups it appears in and the groups where it
+# qualifies, with its most frequent primary KPI and its mean sales when
+# qualified. `result_codes` holds the group code of each results row. Rows
+# with no AG or no group are left out. AGs that qualify in the most groups
+# come first.
+def consistency_table(df, codes, n_groups, results, result_codes):
+    ag_codes, ags = pd.factorize(df['AG'].to_numpy())
+    ags = pd.Index(ags)
+    present = _distinct_group_counts(ag_codes, codes, n_groups, len(ags))
+
+    qualified_codes = ags.get_indexer(results['AG'].to_numpy())
+    qualified = _distinct_group_counts(qualified_codes, result_codes, n_groups, len(ags))
+    known = qualified_codes >= 0
+    qualified_codes = qualified_codes[known]
+    qualified_rows = np.bincount(qualified_codes, minlength=len(ags))
+    sales = np.bincount(qualified_codes, weights=results['SUM sales'].to_numpy(dtype=np.float64)[known],
+                        minlength=len(ags))
+
+    # Primary KPI per qualifying row, tallied per AG
+    first, _ = kpi_codes(results)
+    tally = np.bincount(qualified_codes * len(KPI_NAMES) + first[known],
+                        minlength=len(ags) * len(KPI_NAMES)).reshape(len(ags), len(KPI_NAMES))
+
+    rows = np.flatnonzero(qualified)
+    table = pd.DataFrame({
+        'AG': ags[rows],
+        'Groups present': present[rows],
+        'Groups qualified': qualified[rows],
+        'Qualified share': qualified[rows] / present[rows],
+        'Most frequent KPI': KPI_NAMES[tally[rows].argmax(axis=1)],
+        'Mean sales when qualified': sales[rows] / qualified_rows[rows],
+    }, columns=CONSISTENCY_COLUMNS)
+    order = np.lexsort((np.arange(len(table)), -table['Mean sales when qualified'].to_numpy(),
+                        -table['Groups qualified'].to_numpy()))
+    return table.iloc[order].reset_index(drop=True)
+
+
+# Function to build the seasonal index for a grouped run: keyed on the group
+# and the AG when the seasonal data has the group column, else on the AG
+def grouped_season_index(season_df, group_column):
+    if 'Global STR (%)' not in season_df.columns:
+        raise ValueError("Required column 'Global STR (%)' not found in seasonal data.")
+    key_columns = (group_column, 'AG') if group_column in season_df.columns else ('AG',)
+    return SeasonalIndex(season_df, key_columns=key_columns)
+
+
+# Function to run the grouped selection headlessly on a long-format
+# performance file with one row per AG and period (or store)
+def select_grouped_ags(perf, season, group_column, params=None, extra_seasonal_columns=()):
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    timings = {}
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='seasonal') as pool:
+        season_future = pool.submit(load_input, season, usecols=SEASONAL_COLUMNS + [group_column],
+                                    timings=timings, name='seasonal')
+        df = load_input(perf, timings=timings, name='performance')
+        season_df = season_future.result()
+    if group_column not in df.columns:
+        raise ValueError(f"Group column '{group_column}' not found in performance data.")
+    if len(df) == 0:
+        raise ValueError("No data available for analysis.")
+
+    with _timed(timings, 'seasonal_index'):
+        season_index = grouped_season_index(season_df, group_column)
+    with _timed(timings, 'grouped_selection'):
+        selection = select_grouped(df, season_index, group_column, params, extra_seasonal_columns)
+    return selection._replace(timings=timings)
@@ -0,0 +1,279 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from cleaning import NUMERIC_COLUMNS, clean_frame
+from compact import compact_frame, freeze_frame
+from formats import detect_format, read_table
+
+# Outcome of loading an upload: a read-only view of the cleaned frame plus
+# cache bookkeeping. `timings` splits the original load into its steps.
+IngestResult = namedtuple('IngestResult', ['df', 'report', 'key', 'hit', 'seconds', 'saved_seconds', 'timings'])
+
+_CacheEntry = namedtuple('_CacheEntry', ['df', 'report', 'nbytes', 'load_seconds', 'timings'])
+
+DEFAULT_CACHE_MB = int(os.environ.get('AG_INGEST_CACHE_MB', '1024'))
+DEFAULT_CACHE_ENTRIES = int(os.environ.get('AG_INGEST_CACHE_ENTRIES', '16'))
+DEFAULT_IDLE_SECONDS = int(os.environ.get('AG_DATASET_IDLE_SECONDS', '1800'))
+PREFETCH_WORKERS = int(os.environ.get('AG_INGEST_WORKERS', '2'))
+
+
+# Function to hash uploaded bytes together with the cleaning config
+def content_key(data, config=()):
+    digest = hashlib.blake2b(data, digest_size=16)
+    digest.update(repr(config).encode())
+    return digest.hexdigest()
+
+
+# Function to hash the bytes of a file on their own
+def data_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+# Function to build the cache key for a file and its cleaning config. With a
+# precomputed `digest` of the bytes, `data` is not read.
+def ingest_key(data, fmt='csv', usecols=None, columns=None, dtype=np.float64, digest=None):
+    columns = NUMERIC_COLUMNS if columns is None else columns
+    selected = None if usecols is None else tuple(sorted(usecols))
+    digest = data_digest(data) if digest is None else digest
+    return content_key(digest.encode(), (fmt, selected, tuple(columns), np.dtype(dtype).str))
+
+
+# Function to get the bytes of a file passed as bytes or as a function
+# returning them, so a cache hit never copies an upload
+def _read(data):
+    return data() if callable(data) else data
+
+
+# Function to read, clean and compact one uploaded file (CSV, Parquet or Arrow IPC)
+def load_table(data, fmt='csv', usecols=None, columns=None, dtype=np.float64, timings=None):
+    start = time.perf_counter()
+    df = read_table(data, fmt=fmt, usecols=usecols)
+    read_done = time.perf_counter()
+    df, report = clean_frame(df, columns=columns, dtype=dtype)
+    clean_done = time.perf_counter()
+    df = compact_frame(df)
+    if timings is not None:
+        timings['read'] = read_done - start
+        timings['clean'] = clean_done - read_done
+        timings['compact'] = time.perf_counter() - clean_done
+    return df, report
+
+
+class IngestCache:
+    # Process-wide store of cleaned frames keyed by content hash, so sessions
+    # that upload the same file share one parse and one copy. Frames are
+    # frozen (read-only arrays) and handed out as shallow views.
+    #
+    # Sessions hold datasets per slot ('performance', 'seasonal'); a hold
+    # lapses once its session has been idle for `idle_seconds`. Held datasets
+    # are never evicted. Unheld ones go once idle for `idle_seconds`, or
+    # least recently used first when the byte or entry bounds are exceeded.
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_MB * 1024 ** 2, max_entries=DEFAULT_CACHE_ENTRIES,
+                 idle_seconds=DEFAULT_IDLE_SECONDS):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        self._entries = OrderedDict()
+        self._last_used = {}
+        self._holders = {}
+        self._pending = {}
+        self._pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='ingest')
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def nbytes(self):
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._last_used[key] = time.monotonic()
+            return entry
+
+    def put(self, key, df, report, load_seconds, timings=None):
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return df
+        df = freeze_frame(df)
+        with self._lock:
+            self._entries[key] = _CacheEntry(df, report, nbytes, load_seconds, timings or {})
+            self._entries.move_to_end(key)
+            self._last_used[key] = time.monotonic()
+            self._evict()
+        return df
+
+    # Function to record that a session uses a dataset in one of its slots,
+    # releasing whatever that slot held before
+    def acquire(self, key, session_id, slot):
+        with self._lock:
+            self._holders[(session_id, slot)] = (key, time.monotonic())
+
+    # Function to drop a session's hold on one slot, or on all of its slots
+    def release(self, session_id, slot=None):
+        with self._lock:
+            for holder in list(self._holders):
+                if holder[0] == session_id and slot in (None, holder[1]):
+                    del self._holders[holder]
+            self._evict()
+
+    # Function to count the sessions currently holding a dataset
+    def refcount(self, key):
+        with self._lock:
+            return sum(1 for held, _ in self._holders.values() if held == key)
+
+    # Function to list the cached frames, e.g. for memory reports
+    def frames(self):
+        with self._lock:
+            return [entry.df for entry in self._entries.values()]
+
+    # Function to describe every cached dataset for the memory report
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                'key': key[:12],
+                'rows': len(entry.df),
+                'bytes': entry.nbytes,
+                'sessions': sum(1 for held, _ in self._holders.values() if held == key),
+                'idle_seconds': now - self._last_used.get(key, now),
+            } for key, entry in self._entries.items()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._last_used.clear()
+
+    # Function to evict idle and over-budget datasets (lock must be held)
+    def _evict(self):
+        now = time.monotonic()
+        for holder, (_, seen) in list(self._holders.items()):
+            if now - seen > self.idle_seconds:
+                del self._holders[holder]
+        held = {key for key, _ in self._holders.values()}
+
+        for key in list(self._entries):
+            if key not in held and now - self._last_used.get(key, now) > self.idle_seconds:
+                self._drop(key)
+
+        total = sum(entry.nbytes for entry in self._entries.values())
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_entries and total <= self.max_bytes:
+                break
+            if key not in held:
+                total -= self._entries[key].nbytes
+                self._drop(key)
+
+    def _drop(self, key):
+        del self._entries[key]
+        self._last_used.pop(key, None)
+
+    # Function to parse and store one file (runs inline or on the prefetch pool)
+    def _parse(self, key, data, fmt, usecols, columns, dtype):
+        start = time.perf_counter()
+        timings = {}
+        df, report = load_table(_read(data), fmt=fmt, usecols=usecols, columns=columns, dtype=dtype,
+                                timings=timings)
+        seconds = time.perf_counter() - start
+        return self.put(key, df, report, seconds, timings), report, seconds, timings
+
+    # Function to start parsing a file in the background so it is ready when
+    # first needed. Returns the cache key.
+    def prefetch(self, data, fmt='csv', usecols=None, columns=None, dtype=np.float64, digest=None):
+        if digest is None:
+            data = _read(data)
+        key = ingest_key(data, fmt, usecols, columns, dtype, digest)
+        with self._lock:
+            if key in self._entries or key in self._pending:
+                return key
+            future = self._pool.submit(self._parse, key, data, fmt, usecols, columns, dtype)
+            self._pending[key] = future
+        future.add_done_callback(lambda _: self._forget_pending(key))
+        return key
+
+    def _forget_pending(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    # Function to return a cleaned frame for the given bytes, parsing only on
+    # a miss. With a session id, the session's slot holds the dataset.
+    def load(self, data, fmt='csv', usecols=None, columns=None, dtype=np.float64, session_id=None, slot=None,
+             digest=None):
+        if digest is None:
+            data = _read(data)
+        key = ingest_key(data, fmt, usecols, columns, dtype, digest)
+        if session_id is not None:
+            self.acquire(key, session_id, slot)
+
+        start = time.perf_counter()
+        entry = self.get(key)
+        if entry is not None:
+            self.hits += 1
+            seconds = time.perf_counter() - start
+            return IngestResult(entry.df.copy(deep=False), entry.report, key, True, seconds,
+                                max(entry.load_seconds - seconds, 0.0), entry.timings)
+
+        with self._lock:
+            future = self._pending.get(key)
+            entry = self._entries.get(key)
+        if future is not None or entry is not None:
+            # Parsed in the background; only the remaining wait is spent here
+            self.hits += 1
+            if future is not None:
+                df, report, load_seconds, timings = future.result()
+            else:
+                df, report, load_seconds, timings = entry.df, entry.report, entry.load_seconds, entry.timings
+            seconds = time.perf_counter() - start
+            return IngestResult(df.copy(deep=False), report, key, True, seconds,
+                                max(load_seconds - seconds, 0.0), timings)
+
+        self.misses += 1
+        df, report, _, timings = self._parse(key, data, fmt, usecols, columns, dtype)
+        seconds = time.perf_counter() - start
+        return IngestResult(df.copy(deep=False), report, key, False, seconds, 0.0, timings)
+
+
+# Shared by every session in this server process
+ingest_cache = IngestCache()
+
+
+# Function to load an uploaded file through the shared cache. Pass the
+# upload's `digest` (see data_digest) to skip hashing it on every rerun.
+def ingest_upload(uploaded_file, usecols=None, columns=None, dtype=np.float64, session_id=None, slot=None,
+                  digest=None):
+    return ingest_cache.load(uploaded_file.getvalue, fmt=detect_format(uploaded_file.name),
+                             usecols=usecols, columns=columns, dtype=dtype,
+                             session_id=session_id, slot=slot, digest=digest)
+
+
+# Function to start cleaning an upload in the background as soon as it arrives
+def prefetch_upload(uploaded_file, usecols=None, columns=None, dtype=np.float64, digest=None):
+    return ingest_cache.prefetch(uploaded_file.getvalue, fmt=detect_format(uploaded_file.name),
+                                 usecols=usecols, columns=columns, dtype=dtype, digest=digest)
+
+
+# Function to get the cache key of an upload without loading it
+def upload_key(uploaded_file, usecols=None, columns=None, dtype=np.float64, digest=None):
+    return ingest_key(uploaded_file.getvalue() if digest is None else None, detect_format(uploaded_file.name),
+                      usecols, columns, dtype, digest)
+
+
+# Function to describe a cache lookup for the UI
+def describe_ingest(result, label, sessions=1):
+    shared = f", shared with {sessions - 1} other session(s)" if sessions > 1 else ""
+    if result.hit:
+        return f"{label}: cache hit, saved {result.saved_seconds:.2f}s of parsing{shared}"
+    return f"{label}: cache miss, parsed and cleaned in {result.seconds:.2f}s{shared}"
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+KPI_RATIONALES = {
+    "Dormant Inventory (Age)": "Indicates stagnant stock nearing obsolescence",
+    "Inventory Reduction": "Surplus is the dominant problem to solve",
+    "Availability Improvement": "Chronic stockouts risk lost sales and customer experience",
+    "Sales Through": "Healthy balance → optimize sell-through further"
+}
+
+# KPI codes used by the columnar engine, in rule order
+DORMANT, INVENTORY, AVAILABILITY, SALES_THROUGH = range(4)
+KPI_NAMES = np.array([
+    "Dormant Inventory (Age)",
+    "Inventory Reduction",
+    "Availability Improvement",
+    "Sales Through",
+], dtype=object)
+
+
+# Function to determine top 2 KPI focuses for an AG
+def determine_kpi_focuses(row):
+    # Initialize an empty list to store KPIs
+    kpis = []
+
+    # Ensure all required fields are numeric
+    dormant_days = float(row['Dormant days'])
+    surplus_cost = float(row['Surplus cost'])
+    lost_sales = float(row['Lost sales'])
+    availability = float(row['AVG availability (%)'])
+
+    # Add KPIs based on specific conditions with proper numeric comparisons
+    if dormant_days > 80:
+        kpis.append("Dormant Inventory (Age)")
+    if surplus_cost > 2 * lost_sales:
+        kpis.append("Inventory Reduction")
+    if availability < 75:
+        kpis.append("Availability Improvement")
+
+    # If we have fewer than 2 KPIs, add Sales Through
+    if len(kpis) < 2:
+        kpis.append("Sales Through")
+
+    # If we still have fewer than 2 KPIs, add another one that's not already in the list
+    if len(kpis) < 2:
+        if "Inventory Reduction" not in kpis:
+            kpis.append("Inventory Reduction")
+        elif "Availability Improvement" not in kpis:
+            kpis.append("Availability Improvement")
+
+    # Ensure we return exactly 2 KPIs
+    return kpis[:2]
+
+
+# Legacy function for backward compatibility
+def determine_kpi_focus(row):
+    return determine_kpi_focuses(row)[0]
+
+
+# Function to get rationale for KPI focus
+def get_kpi_rationale(kpi):
+    return KPI_RATIONALES.get(kpi, "")
+
+
+# Function to compute the two KPI codes for every row at once.
+# Mirrors determine_kpi_focuses: the first two triggered rules in order
+# (dormant, inventory, availability), padded with Sales Through and then
+# Inventory Reduction when fewer than two rules fire.
+def kpi_codes(df):
+    dormant = df['Dormant days'].to_numpy(dtype=np.float64) > 80
+    inventory = (df['Surplus cost'].to_numpy(dtype=np.float64)
+                 > 2 * df['Lost sales'].to_numpy(dtype=np.float64))
+    availability = df['AVG availability (%)'].to_numpy(dtype=np.float64) < 75
+
+    after_inventory = np.where(availability, AVAILABILITY, SALES_THROUGH)
+    after_dormant = np.where(inventory, INVENTORY, after_inventory)
+
+    first = np.where(dormant, DORMANT, after_dormant)
+    second = np.select(
+        [dormant, inventory, availability],
+        [after_dormant, after_inventory, SALES_THROUGH],
+        default=INVENTORY,
+    )
+    return first.astype(np.int8), second.astype(np.int8)
+
+
+# Function to assign KPIs to every AG in one vectorized step.
+# Returns the per-row "KPI Recommendations" series (aligned to df) and the
+# long-format table with one row per AG and KPI.
+def assign_kpis(df):
+    return kpis_from_codes(df, *kpi_codes(df))
+
+
+# Function to build the KPI outputs from precomputed KPI codes, e.g. ones
+# computed by a SQL backend
+def kpis_from_codes(df, first, second):
+    first = np.asarray(first, dtype=np.int8)
+    second = np.asarray(second, dtype=np.int8)
+    joined = np.array([[f"{a}, {b}" for b in KPI_NAMES] for a in KPI_NAMES], dtype=object)
+    recommendations = pd.Series(joined[first, second], index=df.index, dtype=object,
+                                name='KPI Recommendations')
+
+    codes = np.column_stack([first, second]).ravel()
+    rationales = np.array([get_kpi_rationale(kpi) for kpi in KPI_NAMES], dtype=object)
+    kpi_results = pd.DataFrame({
+        'AG': np.repeat(df['AG'].to_numpy(), 2),
+        'KPI Focus': KPI_NAMES[codes],
+        'Rationale': rationales[codes],
+    })
+    return recommendations, kpi_results
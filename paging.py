@@ -0,0 +1,72 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Display formats for the results table, applied to the visible page only
+RESULT_FORMATS = {
+    'SUM sales': '${:,.2f}',
+    'AVG availability (%)': '{:.2f}%',
+    'Surplus cost': '${:,.2f}',
+    'Lost sales': '{:,.2f}',
+}
+
+PAGE_SIZES = [25, 50, 100, 250, 500]
+DEFAULT_PAGE_SIZE = 100
+
+# One page of rows, with the page count and how many rows matched the filter
+Page = namedtuple('Page', ['rows', 'page', 'pages', 'matched'])
+
+
+# Function to check whether a column is filtered by range or by text
+def is_numeric_column(df, column):
+    return pd.api.types.is_numeric_dtype(df[column])
+
+
+# Function to find the positions of rows matching a filter on one column.
+# Numeric columns are filtered on [low, high]; text columns on a substring.
+def filter_positions(df, column=None, query=None, low=None, high=None):
+    if column is None:
+        return np.arange(len(df))
+
+    if is_numeric_column(df, column):
+        values = df[column].to_numpy(dtype=np.float64)
+        mask = np.ones(len(df), dtype=bool)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+    elif query:
+        mask = df[column].astype(str).str.contains(query, case=False, regex=False).to_numpy()
+    else:
+        return np.arange(len(df))
+    return np.flatnonzero(mask)
+
+
+# Function to order row positions by one column, keeping missing values last
+def sort_positions(df, positions, column=None, ascending=True):
+    if column is None:
+        return positions
+
+    if is_numeric_column(df, column):
+        values = df[column].to_numpy(dtype=np.float64)[positions]
+        # Negating keeps NaN at the end for descending order too
+        order = np.argsort(values if ascending else -values, kind='stable')
+    else:
+        # Sorted codes let descending order keep equal values in row order
+        codes, _ = pd.factorize(df[column].astype(str).to_numpy()[positions], sort=True)
+        order = np.argsort(codes if ascending else -codes, kind='stable')
+    return positions[order]
+
+
+# Function to slice one page of rows out of the ordered positions
+def get_page(df, positions, page=1, page_size=DEFAULT_PAGE_SIZE):
+    pages = max(1, -(-len(positions) // page_size))
+    page = min(max(int(page), 1), pages)
+    start = (page - 1) * page_size
+    return Page(df.iloc[positions[start:start + page_size]], page, pages, len(positions))
+
+
+# Function to apply the $ and % formats to a page of rows
+def format_page(rows):
+    return rows.style.format({col: fmt for col, fmt in RESULT_FORMATS.items() if col in rows.columns})
@@ -0,0 +1,209 @@
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from cleaning import clean_frame
+from compact import compact_frame
+from filters import (
+    FilterPipeline, append_funnel_step, combine_masks, row_criteria, sales_band_criteria,
+    sales_band_thresholds
+)
+from formats import SEASONAL_COLUMNS, detect_format, read_table, sniff_format
+from kpi import assign_kpis
+from scoring import DEFAULT_TOP_K, composite_score, top_k_positions
+from seasonal import SeasonalIndex
+
+# Parameter defaults, matching the widgets in app.py
+DEFAULT_PARAMS = {
+    'top_sales_percentile': 20,
+    'bottom_sales_percentile': 30,
+    'min_availability': 50,
+    'max_availability': 95,
+    'min_skus': 10,
+    'min_products': 10,
+    'min_surplus': 100,
+    'min_lost_sales': 100,
+    'min_age': 30,
+    'max_salethrough': 80,
+}
+
+# Outcome of a full selection run
+SelectionResult = namedtuple('SelectionResult', ['results', 'kpi_results', 'funnel', 'total_ags', 'timings'])
+
+# Outcome of a ranked run: the top-k AGs by score, and every AG's score
+RankingResult = namedtuple('RankingResult', ['results', 'kpi_results', 'scores', 'total_ags', 'timings'])
+
+
+@contextmanager
+def _timed(timings, stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+# Function to read and clean an input given as a DataFrame, bytes or a file path.
+# Paths are read by extension; bytes may hold CSV, Parquet or Arrow IPC data.
+def load_input(source, usecols=None, timings=None, name='input'):
+    timings = {} if timings is None else timings
+    with _timed(timings, f'read_{name}'):
+        if isinstance(source, pd.DataFrame):
+            columns = [col for col in source.columns if usecols is None or col in usecols]
+            df = source[columns].copy()
+        else:
+            fmt = detect_format(source) if isinstance(source, (str, os.PathLike)) else sniff_format(source)
+            df = read_table(source, fmt=fmt, usecols=usecols)
+    with _timed(timings, f'clean_{name}'):
+        df, _ = clean_frame(df)
+    with _timed(timings, f'compact_{name}'):
+        df = compact_frame(df)
+    return df
+
+
+# Function to build the seasonal index, checking the salethrough column exists
+def build_season_index(season_df):
+    if 'Global STR (%)' not in season_df.columns:
+        raise ValueError("Required column 'Global STR (%)' not found in seasonal data.")
+    return SeasonalIndex(season_df)
+
+
+# Function to compute the sales percentile band masks over all rows
+def sales_band_masks(df, params):
+    thresholds = sales_band_thresholds(
+        df['SUM sales'], params['top_sales_percentile'], params['bottom_sales_percentile']
+    )
+    return FilterPipeline(sales_band_criteria(*thresholds)).masks(df)
+
+
+# Function to find the rows passing the sales band and the row filters,
+# returning their positions instead of a copy of the rows
+def row_filter_positions(df, band_masks, params):
+    masks = dict(band_masks)
+    masks.update(FilterPipeline(row_criteria(params)).masks(df))
+    combined, funnel = combine_masks(masks, len(df))
+    return np.flatnonzero(combined), funnel
+
+
+# Function to apply the row filters on top of the sales band, slicing once
+def apply_row_filters(df, band_masks, params):
+    positions, funnel = row_filter_positions(df, band_masks, params)
+    return df.iloc[positions], funnel
+
+
+# Function to apply every performance-file criterion in a single pass
+def filter_performance(df, params):
+    return apply_row_filters(df, sales_band_masks(df, params), params)
+
+
+# Function to find each filtered AG in the seasonal index (inner join on AG)
+def match_seasonal(filtered_df, funnel, season_index):
+    codes = season_index.codes_for(filtered_df['AG'])
+    funnel = append_funnel_step(funnel, 'Seasonal match', int((codes >= 0).sum()))
+    return codes, funnel
+
+
+# Function to find the matched rows within the maximum salethrough
+def salethrough_mask(codes, funnel, season_index, max_salethrough):
+    keep = (codes >= 0) & (season_index.gather('Global STR (%)', codes) <= max_salethrough)
+    return keep, append_funnel_step(funnel, 'Maximum salethrough', int(keep.sum()))
+
+
+# Function to attach the seasonal metrics to the rows that passed every filter
+def join_seasonal(filtered_df, codes, keep, season_index, extra_columns=()):
+    return season_index.join(filtered_df, codes, keep, columns=['Global STR (%)'] + list(extra_columns))
+
+
+# Function to apply the maximum salethrough filter and attach the seasonal metrics
+def filter_salethrough(filtered_df, codes, funnel, season_index, max_salethrough, extra_columns=()):
+    keep, funnel = salethrough_mask(codes, funnel, season_index, max_salethrough)
+    return join_seasonal(filtered_df, codes, keep, season_index, extra_columns), funnel
+
+
+# Function to inner-join the seasonal STR onto the filtered rows and apply
+# the maximum salethrough filter
+def apply_seasonal(filtered_df, funnel, season_index, max_salethrough, extra_columns=()):
+    codes, funnel = match_seasonal(filtered_df, funnel, season_index)
+    return filter_salethrough(filtered_df, codes, funnel, season_index, max_salethrough, extra_columns)
+
+
+# Function to score every AG in the performance file, looking up its Global
+# STR in the seasonal index. Returns the scores and each row's seasonal code.
+def score_ags(df, season_index, params, weights=None):
+    codes = season_index.codes_for(df['AG'])
+    return composite_score(df, season_index.gather('Global STR (%)', codes), params, weights), codes
+
+
+# Function to take the k best-scoring AGs, best first (higher sales first
+# among equal scores), with their score and seasonal metrics (NaN for AGs
+# missing from the seasonal file)
+def rank_ags(df, scores, codes, season_index, k=DEFAULT_TOP_K, extra_columns=()):
+    top = top_k_positions(scores, k, tiebreak=df['SUM sales'].to_numpy(dtype=np.float64))
+    ranked = season_index.join(df.iloc[top], codes[top], np.ones(len(top), dtype=bool),
+                               columns=['Global STR (%)'] + list(extra_columns))
+    ranked.insert(1, 'Score', scores[top])
+    return ranked
+
+
+# Function to add the KPI Recommendations column and build the KPI table
+def add_kpis(filtered_df):
+    recommendations, kpi_results = assign_kpis(filtered_df)
+    return filtered_df.assign(**{'KPI Recommendations': recommendations}), kpi_results
+
+
+# Function to run the whole selection headlessly, as the Run Analysis button does.
+# `perf` and `season` may be DataFrames, raw bytes or file paths; `params`
+# overrides DEFAULT_PARAMS.
+def select_pilot_ags(perf, season, params=None, extra_seasonal_columns=()):
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    timings = {}
+
+    # The seasonal file is read and cleaned while the performance file is
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='seasonal') as pool:
+        season_future = pool.submit(load_input, season, usecols=SEASONAL_COLUMNS, timings=timings,
+                                    name='seasonal')
+        df = load_input(perf, timings=timings, name='performance')
+        if len(df) == 0:
+            raise ValueError("No data available for analysis.")
+        with _timed(timings, 'filter'):
+            filtered_df, funnel = filter_performance(df, params)
+        season_df = season_future.result()
+    with _timed(timings, 'seasonal_join'):
+        season_index = build_season_index(season_df)
+        filtered_df, funnel = apply_seasonal(filtered_df, funnel, season_index,
+                                             params['max_salethrough'], extra_seasonal_columns)
+
+    with _timed(timings, 'kpi'):
+        results, kpi_results = add_kpis(filtered_df)
+
+    return SelectionResult(results, kpi_results, funnel, len(df), timings)
+
+
+# Function to rank every AG by composite score headlessly, instead of
+# applying the hard cut-offs. `weights` overrides scoring.DEFAULT_WEIGHTS.
+def rank_pilot_ags(perf, season, params=None, weights=None, k=DEFAULT_TOP_K, extra_seasonal_columns=()):
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    timings = {}
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='seasonal') as pool:
+        season_future = pool.submit(load_input, season, usecols=SEASONAL_COLUMNS, timings=timings,
+                                    name='seasonal')
+        df = load_input(perf, timings=timings, name='performance')
+        season_df = season_future.result()
+    if len(df) == 0:
+        raise ValueError("No data available for analysis.")
+
+    with _timed(timings, 'score'):
+        season_index = build_season_index(season_df)
+        scores, codes = score_ags(df, season_index, params, weights)
+    with _timed(timings, 'top_k'):
+        ranked = rank_ags(df, scores, codes, season_index, k, extra_seasonal_columns)
+    with _timed(timings, 'kpi'):
+        results, kpi_results = add_kpis(ranked)
+
+    return RankingResult(results, kpi_results, scores, len(df), timings)
@@ -0,0 +1,190 @@
+import io
+import json
+import platform
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import namedtuple
+from contextlib import contextmanager
+from importlib.util import find_spec
+
+# Measurements for one stage of a run. `peak_bytes` is only filled in when
+# memory tracking is on; row counts are None when a stage has no table.
+StageProfile = namedtuple('StageProfile', ['stage', 'cache_hit', 'seconds', 'peak_bytes', 'rows_in', 'rows_out'])
+
+# Code profilers that can capture a single run
+PROFILE_TOOLS = ['cProfile'] + (['pyinstrument'] if find_spec('pyinstrument') else [])
+
+# tracemalloc is process-wide, so one profiler (one session) at a time tracks
+# memory; the claim lapses when that profiler closes or is freed
+_tracing_lock = threading.Lock()
+_tracing_owner = None
+
+
+# Function to claim memory tracking for a profiler; False while another holds it
+def _claim_tracing(profiler):
+    global _tracing_owner
+    with _tracing_lock:
+        if _tracing_owner is not None and _tracing_owner() is not None:
+            return False
+        _tracing_owner = weakref.ref(profiler)
+        return True
+
+
+def _release_tracing(profiler):
+    global _tracing_owner
+    with _tracing_lock:
+        if _tracing_owner is not None and _tracing_owner() is profiler:
+            _tracing_owner = None
+
+
+# Function to count the rows of a stage input or output
+def count_rows(value):
+    import pandas as pd
+
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, tuple) and hasattr(value, 'df'):
+        return count_rows(value.df)
+    if isinstance(value, (tuple, list)):
+        for item in value:
+            rows = count_rows(item)
+            if rows is not None:
+                return rows
+    return None
+
+
+class CodeCapture:
+    # Call-level profile of one run with cProfile, or pyinstrument when installed
+
+    def __init__(self, tool='cProfile'):
+        self.tool = tool
+        if tool == 'pyinstrument':
+            from pyinstrument import Profiler as InstrumentProfiler
+
+            self._profiler = InstrumentProfiler()
+        else:
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+        self._running = False
+
+    def start(self):
+        if self.tool == 'pyinstrument':
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+        self._running = True
+
+    # Function to stop capturing and return the report as text
+    def stop(self, limit=40):
+        if self._running:
+            if self.tool == 'pyinstrument':
+                self._profiler.stop()
+            else:
+                self._profiler.disable()
+            self._running = False
+
+        if self.tool == 'pyinstrument':
+            return self._profiler.output_text()
+        import pstats
+
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+
+
+class Profiler:
+    # Collects one StageProfile per measured stage of a run. Memory tracking
+    # uses tracemalloc, which slows allocation-heavy code, so it is opt-in.
+    # While another session tracks memory, `memory_busy` is set and peaks
+    # are left out.
+
+    def __init__(self, track_memory=False, capture_tool=None):
+        self.capture_tool = capture_tool
+        self.records = []
+        self.details = {}
+        self.capture_report = None
+        self.track_memory = track_memory and _claim_tracing(self)
+        self.memory_busy = track_memory and not self.track_memory
+        self._stop_tracing = None
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            # Stops tracing even if this profiler is freed without closing
+            self._stop_tracing = weakref.finalize(self, tracemalloc.stop)
+        self._capture = None
+        if capture_tool is not None:
+            self._capture = CodeCapture(capture_tool)
+            self._capture.start()
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        info = {'rows_in': rows_in, 'rows_out': None, 'cache_hit': False}
+        tracking = self.track_memory
+        if tracking:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - baseline if tracking else None
+            self.records.append(StageProfile(name, info['cache_hit'], seconds, peak,
+                                             info['rows_in'], info['rows_out']))
+
+    # Function to run one stage function and record it
+    def measure(self, name, fn, *args):
+        rows_in = [count_rows(arg) for arg in args]
+        rows_in = [rows for rows in rows_in if rows is not None]
+        with self.stage(name, rows_in=max(rows_in) if rows_in else None) as info:
+            value = fn(*args)
+            info['rows_out'] = count_rows(value)
+        return value
+
+    # Function to load an input through the ingest cache and record it, keeping
+    # the read/clean split of the original parse
+    def measure_ingest(self, name, load):
+        with self.stage(name) as info:
+            result = load()
+            info.update(rows_out=len(result.df), cache_hit=result.hit)
+        self.details[name] = dict(result.timings)
+        return result
+
+    # Function to record a stage whose output came from a cache
+    def record_hit(self, name, value=None, seconds=0.0):
+        self.records.append(StageProfile(name, True, seconds, None, None, count_rows(value)))
+
+    # Function to stop memory tracking and the code capture, keeping the report
+    def close(self):
+        if self._stop_tracing is not None:
+            self._stop_tracing()
+            self._stop_tracing = None
+        if self.track_memory:
+            _release_tracing(self)
+        if self._capture is not None:
+            self.capture_report = self._capture.stop()
+            self._capture = None
+        return self.capture_report
+
+    @property
+    def total_seconds(self):
+        return sum(record.seconds for record in self.records)
+
+    def frame(self):
+        import pandas as pd
+
+        return pd.DataFrame(self.records, columns=StageProfile._fields)
+
+    # Function to export the run's measurements, with host details for capacity planning
+    def to_json(self, **meta):
+        return json.dumps({
+            'meta': dict(meta, generated_at=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                         python=platform.python_version(), machine=platform.machine(),
+                         track_memory=self.track_memory),
+            'total_seconds': self.total_seconds,
+            'stages': [record._asdict() for record in self.records],
+            'details': self.details,
+            'capture': self.capture_report,
+        }, indent=2, default=str)
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import closing
+from importlib.util import find_spec
+from io import BytesIO
+
+DEFAULT_RUN_STORE = os.environ.get('AG_RUN_STORE', 'ag_runs.sqlite3')
+
+# Only the most recent runs are kept; older ones and their tables are deleted
+MAX_STORED_RUNS = int(os.environ.get('AG_RUN_STORE_LIMIT', '200'))
+
+# Bump when the layout of stored runs changes
+STORE_VERSION = 1
+
+# Modules whose rules decide a run's results (cleaning, filters, KPIs)
+RULE_MODULES = ['cleaning', 'compact', 'filters', 'grouped', 'kpi', 'pipeline', 'scoring', 'seasonal',
+                'sqlengine', 'streaming']
+
+# Result tables are stored as Parquet when pyarrow is installed, else gzip CSV
+TABLE_FORMAT = 'parquet' if find_spec('pyarrow') is not None else 'csv.gz'
+
+RUN_COLUMNS = ['id', 'created', 'mode', 'label', 'perf_key', 'season_key', 'total_rows', 'selected']
+
+# One row of the run list
+RunSummary = namedtuple('RunSummary', RUN_COLUMNS)
+
+# One stored run: its row in `runs`, its parameters and its result tables by name
+StoredRun = namedtuple('StoredRun', ['id', 'run_key', 'created', 'mode', 'label', 'perf_key', 'season_key',
+                                     'params', 'total_rows', 'selected', 'tables'])
+
+# AGs selected by one run but not the other
+RunDiff = namedtuple('RunDiff', ['added', 'removed', 'kept'])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_key TEXT NOT NULL UNIQUE,
+    created REAL NOT NULL,
+    mode TEXT NOT NULL,
+    label TEXT,
+    perf_key TEXT,
+    season_key TEXT,
+    params TEXT NOT NULL,
+    total_rows INTEGER,
+    selected INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_inputs ON runs (perf_key, season_key);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created);
+CREATE TABLE IF NOT EXISTS run_ags (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    ag TEXT NOT NULL,
+    PRIMARY KEY (run_id, ag)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS run_tables (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    format TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (run_id, name)
+) WITHOUT ROWID;
+"""
+
+
+# Function to hash the store layout and the source of the rule modules, so
+# runs stored under older cleaning or KPI rules are never served again
+def rules_version():
+    digest = hashlib.blake2b(str(STORE_VERSION).encode(), digest_size=8)
+    for name in RULE_MODULES:
+        spec = find_spec(name)
+        if spec is not None and spec.origin and os.path.exists(spec.origin):
+            with open(spec.origin, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+# Function to serialize one result table for the store
+def _table_bytes(df):
+    from compact import trim_categories
+
+    df = trim_categories(df.reset_index(drop=True))
+    buffer = BytesIO()
+    if TABLE_FORMAT == 'parquet':
+        df.to_parquet(buffer, index=False)
+    else:
+        df.to_csv(buffer, index=False, compression='gzip')
+    return buffer.getvalue()
+
+
+def _read_table_bytes(data, fmt):
+    import pandas as pd
+
+    if fmt == 'parquet':
+        return pd.read_parquet(BytesIO(data))
+    return pd.read_csv(BytesIO(data), compression='gzip')
+
+
+class RunStore:
+    # Local SQLite history of analysis runs. Each run is keyed on a hash of
+    # its inputs and parameters, salted with the rules version, so
+    # resubmitting them finds the stored run; selected AGs are indexed per
+    # run so two runs diff in SQL. Only the last `max_runs` runs are kept.
+
+    def __init__(self, path=DEFAULT_RUN_STORE, max_runs=MAX_STORED_RUNS):
+        self.path = path
+        self.max_runs = max_runs
+        self.version = rules_version()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _salted(self, run_key):
+        return f"{self.version}:{run_key}"
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA foreign_keys = ON')
+        if not self._ready:
+            with self._lock:
+                connection.execute('PRAGMA journal_mode = WAL')
+                connection.executescript(_SCHEMA)
+                self._ready = True
+        return connection
+
+    # Function to store a run's parameters, selected AGs and result tables.
+    # Storing the same run key again replaces the earlier run, and runs
+    # beyond `max_runs` are deleted oldest first (their pages are reused).
+    def record(self, run_key, mode, params, ags, tables, total_rows, label=None, perf_key=None,
+               season_key=None):
+        blobs = [(name, TABLE_FORMAT, _table_bytes(df)) for name, df in tables.items() if df is not None]
+        ags = sorted({str(ag) for ag in ags})
+        run_key = self._salted(run_key)
+        with closing(self._connect()) as connection, connection:
+            connection.execute('DELETE FROM runs WHERE run_key = ?', (run_key,))
+            run_id = connection.execute(
+                'INSERT INTO runs (run_key, created, mode, label, perf_key, season_key, params, total_rows, selected) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (run_key, time.time(), mode, label, perf_key, season_key,
+                 json.dumps(params, sort_keys=True, default=str), int(total_rows), len(ags)),
+            ).lastrowid
+            connection.executemany('INSERT INTO run_ags (run_id, ag) VALUES (?, ?)',
+                                   ((run_id, ag) for ag in ags))
+            connection.executemany('INSERT INTO run_tables (run_id, name, format, data) VALUES (?, ?, ?, ?)',
+                                   ((run_id, name, fmt, data) for name, fmt, data in blobs))
+            connection.execute('DELETE FROM runs WHERE id NOT IN (SELECT id FROM runs ORDER BY created DESC LIMIT ?)',
+                               (self.max_runs,))
+        return run_id
+
+    # Function to find the id of the run stored for a run key (None if absent)
+    def find(self, run_key):
+        with closing(self._connect()) as connection:
+            row = connection.execute('SELECT id FROM runs WHERE run_key = ?', (self._salted(run_key),)).fetchone()
+        return None if row is None else row[0]
+
+    # Function to load a stored run with its result tables
+    def load(self, run_id):
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                'SELECT id, run_key, created, mode, label, perf_key, season_key, params, total_rows, selected '
+                'FROM runs WHERE id = ?', (run_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            tables = {
+                name: _read_table_bytes(data, fmt)
+                for name, fmt, data in connection.execute(
+                    'SELECT name, format, data FROM run_tables WHERE run_id = ?', (run_id,)
+                )
+            }
+        run = StoredRun(*row, tables=tables)
+        return run._replace(params=json.loads(run.params))
+
+    # Function to list the most recent runs, newest first
+    def list_runs(self, limit=50):
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                f"SELECT {', '.join(RUN_COLUMNS)} FROM runs ORDER BY created DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [RunSummary(*row) for row in rows]
+
+    # Function to compare the AGs selected by two runs: added in `other`,
+    # removed from `base`, and kept by both
+    def diff(self, base_id, other_id):
+        query = 'SELECT ag FROM run_ags WHERE run_id = ? {} SELECT ag FROM run_ags WHERE run_id = ? ORDER BY ag'
+        with closing(self._connect()) as connection:
+            added = [ag for ag, in connection.execute(query.format('EXCEPT'), (other_id, base_id))]
+            removed = [ag for ag, in connection.execute(query.format('EXCEPT'), (base_id, other_id))]
+            kept = [ag for ag, in connection.execute(query.format('INTERSECT'), (base_id, other_id))]
+        return RunDiff(added, removed, kept)
+
+    # Function to delete one run, or every run
+    def delete(self, run_id=None):
+        with closing(self._connect()) as connection, connection:
+            if run_id is None:
+                connection.execute('DELETE FROM runs')
+            else:
+                connection.execute('DELETE FROM runs WHERE id = ?', (run_id,))
+
+
+# Shared by every session in this server process
+run_store = RunStore()
@@ -0,0 +1,154 @@
+import numpy as np
+
+from filters import FilterPipeline, row_criteria, sales_band_thresholds
+
+# Parts of the composite score, in display order
+SCORE_COMPONENTS = {
+    'sales_band': "Sales band",
+    'availability': "Availability",
+    'dynamics': "Surplus / lost sales dynamics",
+    'dormant': "Dormant days",
+    'salethrough': "Global STR",
+}
+
+DEFAULT_WEIGHTS = {component: 1.0 for component in SCORE_COMPONENTS}
+DEFAULT_TOP_K = 25
+
+# Availability scores fall to 0 this many points outside the target range
+AVAILABILITY_SLACK = 25.0
+
+# Highest score for a row the matching hard filter rejects, so only rows
+# passing every filter reach 1
+BELOW_ONE = np.nextafter(1.0, 0.0)
+
+# Hard-filter criteria the score has no component for; rows failing them are
+# kept below 1
+UNSCORED_LABELS = ('Assortment richness',)
+
+
+# Function to keep the scores of failing rows below 1
+def _cap(score, failing):
+    return np.where(failing, np.minimum(score, BELOW_ONE), score)
+
+
+# Function to scale values to [0, 1] by how far they reach a minimum.
+# `strict` matches a `>` filter: a value equal to the minimum stays below 1.
+# With a minimum of 0 or less, every passing value scores 1.
+def _ramp(values, minimum, strict=False):
+    failing = values <= minimum if strict else values < minimum
+    if minimum > 0:
+        return _cap(np.clip(values / np.float64(minimum), 0.0, 1.0), failing)
+    return (~failing).astype(np.float64)
+
+
+# Function to score sales: 1 strictly inside the percentile band, falling
+# off in proportion to how far below or above it a value is
+def _sales_band_score(df, str_values, params):
+    sales = df['SUM sales'].to_numpy(dtype=np.float64)
+    top, bottom = sales_band_thresholds(sales, params['top_sales_percentile'], params['bottom_sales_percentile'])
+    score = np.ones(len(sales))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        below = sales <= bottom
+        score[below] = sales[below] / bottom if bottom > 0 else 0.0
+        above = sales >= top
+        score[above] = top / sales[above]
+    return _cap(np.clip(np.nan_to_num(score), 0.0, 1.0), below | above)
+
+
+def _availability_score(df, str_values, params):
+    availability = df['AVG availability (%)'].to_numpy(dtype=np.float64)
+    distance = np.maximum(params['min_availability'] - availability, availability - params['max_availability'])
+    return _cap(np.clip(1.0 - np.maximum(distance, 0.0) / AVAILABILITY_SLACK, 0.0, 1.0), distance > 0)
+
+
+# Both surplus and lost sales are needed, so the weaker of the two counts
+def _dynamics_score(df, str_values, params):
+    return np.minimum(_ramp(df['Surplus cost'].to_numpy(dtype=np.float64), params['min_surplus'], strict=True),
+                      _ramp(df['Lost sales'].to_numpy(dtype=np.float64), params['min_lost_sales'], strict=True))
+
+
+def _dormant_score(df, str_values, params):
+    return _ramp(df['Dormant days'].to_numpy(dtype=np.float64), params['min_age'])
+
+
+# AGs missing from the seasonal file have no STR and score 0 here
+def _salethrough_score(df, str_values, params):
+    limit = np.float64(params['max_salethrough'])
+    over = np.maximum(str_values - limit, 0.0) / max(100.0 - limit, 1.0)
+    return np.nan_to_num(_cap(np.clip(1.0 - over, 0.0, 1.0), str_values > limit))
+
+
+_COMPONENT_SCORES = {
+    'sales_band': _sales_band_score,
+    'availability': _availability_score,
+    'dynamics': _dynamics_score,
+    'dormant': _dormant_score,
+    'salethrough': _salethrough_score,
+}
+
+
+# Function to score one component for every row, in [0, 1]
+def component_score(component, df, str_values, params):
+    return _COMPONENT_SCORES[component](df, str_values, params)
+
+
+# Function to find the rows failing a hard filter the score has no component for
+def _unscored_failures(df, params):
+    criteria = [criterion for criterion in row_criteria(params) if criterion.label in UNSCORED_LABELS]
+    masks = FilterPipeline(criteria).masks(df)
+    passing = np.ones(len(df), dtype=bool)
+    for mask in masks.values():
+        np.logical_and(passing, mask, out=passing)
+    return ~passing
+
+
+# Function to compute the weighted composite score of every AG, in [0, 1].
+# With every weight positive, a score of exactly 1 means the AG passes every
+# hard filter; any other AG scores below 1. `str_values` holds each row's
+# Global STR (NaN when the AG has none).
+# Components are added one at a time, so only one is held in memory.
+def composite_score(df, str_values, params, weights=None):
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    total_weight = sum(weights[component] for component in SCORE_COMPONENTS)
+    scores = np.zeros(len(df))
+    if total_weight <= 0:
+        return scores
+    perfect = ~_unscored_failures(df, params)
+    for component in SCORE_COMPONENTS:
+        if weights[component] > 0:
+            score = component_score(component, df, str_values, params)
+            np.logical_and(perfect, score == 1.0, out=perfect)
+            scores += (weights[component] / total_weight) * score
+    # Rounding in the weighted sum must not move a row across 1
+    scores = np.minimum(scores, BELOW_ONE)
+    scores[perfect] = 1.0
+    return scores
+
+
+# Function to find the positions of the k largest values, best first, in
+# O(n) plus a sort of the k winners. NaN ranks last. Ties go to the larger
+# `tiebreak` value when given, then to the earlier row.
+def top_k_positions(values, k, tiebreak=None):
+    values = np.asarray(values, dtype=np.float64)
+    k = max(0, min(int(k), len(values)))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    keys = np.where(np.isnan(values), -np.inf, values)
+    if k < len(keys):
+        # The k-th largest value; keep every row above it and the best rows equal to it
+        cutoff = keys[np.argpartition(keys, len(keys) - k)[len(keys) - k]]
+        above = np.flatnonzero(keys > cutoff)
+        tied = np.flatnonzero(keys == cutoff)
+        if tiebreak is None:
+            tied = tied[:k - len(above)]
+        else:
+            tied = tied[top_k_positions(np.asarray(tiebreak, dtype=np.float64)[tied], k - len(above))]
+        positions = np.concatenate([above, tied])
+    else:
+        positions = np.arange(len(keys))
+    if tiebreak is None:
+        order = np.lexsort((positions, -keys[positions]))
+    else:
+        second = np.asarray(tiebreak, dtype=np.float64)[positions]
+        order = np.lexsort((positions, -np.where(np.isnan(second), -np.inf, second), -keys[positions]))
+    return positions[order]
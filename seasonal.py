@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Seasonal metrics that can be joined onto the performance rows
+STR_COLUMNS = [
+    'Global STR (%)', 'Global Discount STR (%)', 'Global Full price STR (%)',
+    'Local STR (%)', 'Local Discount STR (%)', 'Local Full Price STR (%)'
+]
+
+MAX_CACHED_INDEXES = 8
+
+
+class SeasonalIndex:
+    # AG keys of one seasonal upload, dictionary-encoded to integer codes, with
+    # every seasonal metric stored as an array aligned to those codes. Each
+    # array has a trailing NaN so that code -1 (AG not in the seasonal file)
+    # gathers NaN without a separate mask. With more than one key column
+    # (e.g. a store and the AG), rows are keyed on the combination.
+
+    def __init__(self, season_df, columns=None, key_columns=('AG',)):
+        columns = STR_COLUMNS if columns is None else columns
+        self.key_columns = tuple(key_columns)
+        if self.key_columns == ('AG',):
+            keys = pd.Index(season_df['AG'].to_numpy())
+        else:
+            keys = pd.MultiIndex.from_arrays([season_df[col].to_numpy() for col in self.key_columns])
+
+        # Keep the first row per key so the join cannot multiply performance rows
+        first = ~keys.duplicated()
+        self.duplicates = int(len(keys) - first.sum())
+        self.categories = keys[first]
+
+        self.columns = [col for col in columns if col in season_df.columns]
+        self._values = {}
+        for col in self.columns:
+            values = season_df[col].to_numpy(dtype=np.float64)[first]
+            self._values[col] = np.append(values, np.nan)
+
+    def __len__(self):
+        return len(self.categories)
+
+    def memory_bytes(self):
+        return int(self.categories.memory_usage(deep=True)) + sum(v.nbytes for v in self._values.values())
+
+    # Function to map AG keys to seasonal codes (-1 when the AG is missing)
+    def codes_for(self, ags):
+        if isinstance(ags.dtype, pd.CategoricalDtype):
+            # Translate the (small) category list once, then gather per row
+            mapping = np.append(self.categories.get_indexer(ags.cat.categories), -1)
+            return mapping[ags.cat.codes.to_numpy()]
+        return self.categories.get_indexer(ags.to_numpy())
+
+    # Function to map the key columns of a frame's rows to seasonal codes
+    def codes_for_rows(self, df):
+        if self.key_columns == ('AG',):
+            return self.codes_for(df['AG'])
+        return self.categories.get_indexer(
+            pd.MultiIndex.from_arrays([df[col].to_numpy() for col in self.key_columns])
+        )
+
+    # Function to gather one seasonal metric for the given codes
+    def gather(self, column, codes):
+        return self._values[column][codes]
+
+    # Function to attach seasonal metrics to the rows selected by `keep`
+    def join(self, df, codes, keep=None, columns=('Global STR (%)',)):
+        keep = codes >= 0 if keep is None else keep
+        joined = df[keep].reset_index(drop=True)
+        kept_codes = codes[keep]
+        for col in columns:
+            if col in self._values:
+                joined[col] = self.gather(col, kept_codes)
+        return joined
+
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+# Function to list the cached indexes, e.g. for memory reports
+def cached_indexes():
+    with _lock:
+        return list(_indexes.values())
+
+
+# Function to get the index for a seasonal upload, building it on first use
+def seasonal_index_for(key, season_df, key_columns=('AG',)):
+    key = key if tuple(key_columns) == ('AG',) else (key, tuple(key_columns))
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index, True
+
+    index = SeasonalIndex(season_df, key_columns=key_columns)
+    with _lock:
+        _indexes[key] = index
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index, False
@@ -0,0 +1,316 @@
+import glob
+import os
+import tempfile
+from collections import OrderedDict
+from contextlib import closing
+from importlib.util import find_spec
+
+import pandas as pd
+
+from cleaning import NUMERIC_COLUMNS, SENTINELS, _STRIP_PATTERN
+from compact import compact_frame
+from filters import FUNNEL_COLUMNS, append_funnel_step, row_criteria, sales_band_criteria
+from formats import SEASONAL_COLUMNS, detect_format
+from ingest import content_key
+from kpi import AVAILABILITY, DORMANT, INVENTORY, SALES_THROUGH, kpis_from_codes
+from pipeline import DEFAULT_PARAMS, SelectionResult, _timed
+from seasonal import STR_COLUMNS
+
+# The SQL backend runs when DuckDB is installed
+DUCKDB = find_spec('duckdb') is not None
+
+# Uploads are written here so DuckDB can scan them like any other file
+SPILL_DIR = os.environ.get('AG_SQL_SPILL_DIR', os.path.join(tempfile.gettempdir(), 'ag_sql'))
+MAX_SPILLED_FILES = int(os.environ.get('AG_SQL_SPILL_FILES', '16'))
+
+# Directory the app may query files from directly (unset: uploads only)
+SQL_DATA_DIR = os.environ.get('AG_SQL_DATA_DIR')
+
+# DuckDB settings: worker threads, the memory it may use (e.g. '4GB'; DuckDB's
+# default is 80% of RAM) and where it spills once that is reached
+SQL_THREADS = int(os.environ.get('AG_SQL_THREADS', os.cpu_count() or 1))
+SQL_MEMORY_LIMIT = os.environ.get('AG_SQL_MEMORY_LIMIT')
+SQL_TEMP_DIRECTORY = os.environ.get('AG_SQL_TEMP_DIR', os.path.join(SPILL_DIR, 'duckdb'))
+
+# Whitespace stripped around cell values, as str.strip() does for exports
+_WHITESPACE = ' \t\n\r\x0b\x0c\u00a0'
+
+# The numeric cleaning rules of cleaning.clean_column as SQL macros: the
+# plain cast first, then sentinels, unicode minus, accounting negatives and
+# stripped separators. Missing, sentinel, unparseable and infinite cells
+# become 0.
+_MACROS = """
+CREATE OR REPLACE TEMP MACRO ag_finite(number) AS CASE WHEN isfinite(number) THEN number END;
+CREATE OR REPLACE TEMP MACRO ag_strip(value) AS trim(CAST(value AS VARCHAR), {whitespace});
+CREATE OR REPLACE TEMP MACRO ag_parse(text) AS
+    (CASE WHEN starts_with(text, '(') AND ends_with(text, ')') THEN -1 ELSE 1 END)
+    * TRY_CAST(regexp_replace(trim(text, '()'), {pattern}, '', 'g') AS DOUBLE);
+CREATE OR REPLACE TEMP MACRO ag_number(value) AS CASE
+    WHEN ag_finite(TRY_CAST(value AS DOUBLE)) IS NOT NULL THEN TRY_CAST(value AS DOUBLE)
+    WHEN list_contains([{sentinels}], ag_strip(value)) THEN 0.0
+    ELSE COALESCE(ag_finite(ag_parse(replace(ag_strip(value), '−', '-'))), 0.0)
+END;
+"""
+
+
+# Function to quote a string as a SQL literal
+def _literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+# Function to quote a column name as a SQL identifier
+def _ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+# Function to open a DuckDB connection with the configured limits and the
+# cleaning macros
+def connect(threads=SQL_THREADS, memory_limit=SQL_MEMORY_LIMIT, temp_directory=SQL_TEMP_DIRECTORY):
+    import duckdb
+
+    config = {'threads': max(1, int(threads))}
+    if memory_limit:
+        config['memory_limit'] = memory_limit
+    if temp_directory:
+        config['temp_directory'] = temp_directory
+    con = duckdb.connect(config=config)
+    con.execute(_MACROS.format(
+        whitespace=_literal(_WHITESPACE),
+        pattern=_literal(_STRIP_PATTERN.replace(r'\s', r'\s\x{00A0}')),
+        sentinels=', '.join(_literal(value) for value in sorted(SENTINELS)),
+    ))
+    return con
+
+
+# Function to write uploaded bytes to a file DuckDB can scan, once per
+# content. The oldest files are removed beyond MAX_SPILLED_FILES.
+def spill_upload(data, name, directory=SPILL_DIR):
+    os.makedirs(directory, exist_ok=True)
+    ext = os.path.splitext(str(name))[1].lower()
+    path = os.path.join(directory, content_key(data) + ext)
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+            f.write(data)
+        os.replace(f.name, path)
+
+    spilled = sorted((entry for entry in os.scandir(directory) if entry.is_file()),
+                     key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in spilled[MAX_SPILLED_FILES:]:
+        if entry.path != path:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+    return path
+
+
+# Function to find the files a relative path or glob names inside a data
+# directory, refusing anything that resolves outside it
+def server_files(pattern, data_dir=SQL_DATA_DIR):
+    if not data_dir:
+        raise ValueError("Querying server files is disabled; set AG_SQL_DATA_DIR to enable it.")
+    root = os.path.realpath(data_dir)
+    if os.path.isabs(pattern) or '..' in pattern.replace('\\', '/').split('/'):
+        raise ValueError(f"Give a path relative to the data directory, not '{pattern}'.")
+    files = sorted(
+        path for path in glob.glob(os.path.join(root, pattern), recursive=True)
+        if os.path.isfile(path) and os.path.realpath(path).startswith(root + os.sep)
+    )
+    if not files:
+        raise ValueError(f"No files match '{pattern}' in the data directory.")
+    return files
+
+
+# Function to key a set of files on their paths, sizes and modification
+# times, so a changed extract is queried again without hashing its contents
+def files_key(paths):
+    stats = [(path, os.stat(path).st_size, os.stat(path).st_mtime_ns) for path in paths]
+    return content_key(b'', ('files', tuple(stats)))
+
+
+# Function to register a file, a glob or a list of files as a view in the
+# connection. Returns the view's column names in file order.
+def register_source(con, name, source):
+    paths = [os.fspath(path) for path in source] if isinstance(source, (list, tuple)) else [os.fspath(source)]
+    fmt = detect_format(paths[0])
+    files = _literal(paths[0]) if len(paths) == 1 else '[' + ', '.join(_literal(path) for path in paths) + ']'
+
+    if fmt == 'parquet':
+        scan = f"read_parquet({files})"
+    elif fmt == 'arrow':
+        # DuckDB scans a pyarrow dataset lazily, pushing columns and filters down
+        import pyarrow.dataset as ds
+
+        con.register(f"{name}_arrow", ds.dataset(paths, format='feather'))
+        scan = f"{name}_arrow"
+    else:
+        # Keys and numeric columns are read as text and cleaned by ag_number
+        header = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM read_csv({files})").fetchall()]
+        text = [col for col in header if col == 'AG' or col in NUMERIC_COLUMNS]
+        types = '{' + ', '.join(f"{_literal(col)}: 'VARCHAR'" for col in text) + '}'
+        scan = f"read_csv({files}, header = true, types = {types})"
+
+    con.execute(f"CREATE OR REPLACE TEMP VIEW {_ident(name)} AS SELECT * FROM {scan}")
+    return [row[0] for row in con.execute(f"DESCRIBE {_ident(name)}").fetchall()]
+
+
+# Function to build the select list that cleans a source's columns: AG as
+# text, numeric columns through ag_number, everything else unchanged
+def _cleaned_columns(columns, usecols=None):
+    selected = []
+    for col in columns:
+        if usecols is not None and col not in usecols:
+            continue
+        if col == 'AG':
+            selected.append("CAST(AG AS VARCHAR) AS AG")
+        elif col in NUMERIC_COLUMNS:
+            selected.append(f"ag_number({_ident(col)}) AS {_ident(col)}")
+        else:
+            selected.append(_ident(col))
+    return selected
+
+
+# Function to compile criteria into one SQL predicate per label, ANDed
+# within a label as FilterPipeline.masks does. Thresholds are bound as
+# parameters.
+def compile_criteria(criteria):
+    predicates = OrderedDict()
+    values = OrderedDict()
+    for criterion in criteria:
+        predicates.setdefault(criterion.label, []).append(f"{_ident(criterion.column)} {criterion.op} ?")
+        values.setdefault(criterion.label, []).append(float(criterion.value))
+    return [(label, '(' + ' AND '.join(parts) + ')', values[label]) for label, parts in predicates.items()]
+
+
+# The KPI rules of kpi.kpi_codes as CASE expressions: the first two rules that
+# fire, padded with Sales Through and then Inventory Reduction
+_DORMANT = '"Dormant days" > 80'
+_INVENTORY = '"Surplus cost" > 2 * "Lost sales"'
+_AVAILABILITY = '"AVG availability (%)" < 75'
+KPI_SQL = f"""
+    CASE WHEN {_DORMANT} THEN {DORMANT} WHEN {_INVENTORY} THEN {INVENTORY}
+         WHEN {_AVAILABILITY} THEN {AVAILABILITY} ELSE {SALES_THROUGH} END AS _first_kpi,
+    CASE WHEN {_DORMANT} THEN
+             CASE WHEN {_INVENTORY} THEN {INVENTORY} WHEN {_AVAILABILITY} THEN {AVAILABILITY}
+                  ELSE {SALES_THROUGH} END
+         WHEN {_INVENTORY} THEN CASE WHEN {_AVAILABILITY} THEN {AVAILABILITY} ELSE {SALES_THROUGH} END
+         WHEN {_AVAILABILITY} THEN {SALES_THROUGH}
+         ELSE {INVENTORY} END AS _second_kpi
+"""
+
+
+# Function to compute the sales band thresholds with quantile_cont (linear
+# interpolation, as np.percentile) and count the rows in the same scan.
+# With exact_quantiles=False, DuckDB's approx_quantile sketch is used instead
+# of holding every SUM sales value.
+def sales_band_sql(con, params, exact_quantiles=True):
+    quantile = 'quantile_cont' if exact_quantiles else 'approx_quantile'
+    total_rows, top, bottom = con.execute(
+        f"SELECT count(*), {quantile}(sales, ?), {quantile}(sales, ?) "
+        "FROM (SELECT ag_number(\"SUM sales\") AS sales FROM perf)",
+        [(100 - params['top_sales_percentile']) / 100, params['bottom_sales_percentile'] / 100],
+    ).fetchone()
+    return int(total_rows), top, bottom
+
+
+# Function to count each criterion's rejections in one scan, matching
+# filters.combine_masks, plus how many survivors have a seasonal row
+def funnel_sql(con, compiled, total_rows):
+    flags, remaining, alone, params = [], [], [], []
+    for i, (_, predicate, values) in enumerate(compiled):
+        flags.append(f"{predicate} AS _c{i}")
+        remaining.append(f"count_if({' AND '.join(f'_c{j}' for j in range(i + 1))})")
+        alone.append(f"count_if(NOT _c{i})")
+        params.extend(values)
+    passed = ' AND '.join(f'_c{i}' for i in range(len(compiled)))
+    counts = con.execute(
+        f"SELECT {', '.join(remaining + alone)}, count_if({passed} AND _matched) "
+        f"FROM (SELECT {', '.join(flags)}, AG IN (SELECT AG FROM season) AS _matched FROM perf)",
+        params,
+    ).fetchone()
+
+    rows = []
+    before = total_rows
+    for i, (label, _, _) in enumerate(compiled):
+        after = int(counts[i])
+        rows.append([label, before - after, after, int(counts[len(compiled) + i])])
+        before = after
+    return append_funnel_step(pd.DataFrame(rows, columns=FUNNEL_COLUMNS), 'Seasonal match', int(counts[-1]))
+
+
+# Function to run the whole selection as SQL in DuckDB: the sales band, the
+# row filters, the first-row-per-AG inner join on the seasonal file, the
+# maximum salethrough and the KPI rules. Sources are Parquet, CSV or Arrow
+# files (a path, a glob or a list of paths) and are scanned out of core on
+# every thread; only the selected rows are fetched into pandas.
+def select_pilot_ags_sql(perf, season, params=None, extra_seasonal_columns=(), usecols=None,
+                         exact_quantiles=True, funnel=True, con=None):
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    if con is None:
+        with closing(connect()) as con:
+            return select_pilot_ags_sql(perf, season, params, extra_seasonal_columns, usecols,
+                                        exact_quantiles, funnel, con)
+    timings = {}
+
+    with _timed(timings, 'sql_sources'):
+        perf_names = register_source(con, 'perf_source', perf)
+        season_names = register_source(con, 'season_source', season)
+    if 'Global STR (%)' not in season_names:
+        raise ValueError("Required column 'Global STR (%)' not found in seasonal data.")
+    usecols = None if usecols is None else set(usecols)
+    season_columns = [col for col in ['Global STR (%)'] + list(extra_seasonal_columns)
+                      if col in STR_COLUMNS and col in season_names]
+
+    # Each file is parsed and cleaned once into a DuckDB table, which spills
+    # to disk beyond the memory limit. Row numbers keep the results in file
+    # order; the first seasonal row per AG wins, as in SeasonalIndex.
+    with _timed(timings, 'sql_load'):
+        con.execute(f"CREATE OR REPLACE TEMP TABLE perf AS SELECT row_number() OVER () AS _row, "
+                    f"{', '.join(_cleaned_columns(perf_names, usecols))} FROM perf_source")
+        con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE season AS
+            SELECT * EXCLUDE (_row) FROM (
+                SELECT row_number() OVER () AS _row,
+                       {', '.join(_cleaned_columns(season_names, set(SEASONAL_COLUMNS)))}
+                FROM season_source
+            )
+            QUALIFY row_number() OVER (PARTITION BY AG ORDER BY _row) = 1
+        """)
+
+    with _timed(timings, 'sql_sales_band'):
+        total_rows, top, bottom = sales_band_sql(con, params, exact_quantiles)
+    if total_rows == 0:
+        raise ValueError("No data available for analysis.")
+    compiled = compile_criteria(sales_band_criteria(top, bottom) + row_criteria(params))
+    where = ' AND '.join(predicate for _, predicate, _ in compiled)
+    values = [value for _, _, label_values in compiled for value in label_values]
+
+    funnel_df = None
+    if funnel:
+        with _timed(timings, 'sql_funnel'):
+            funnel_df = funnel_sql(con, compiled, total_rows)
+
+    with _timed(timings, 'sql_select'):
+        # Seasonal metrics replace any performance columns of the same name
+        replaced = [col for col in season_columns if col in perf_names and (usecols is None or col in usecols)]
+        excluded = ', '.join(['_row'] + [_ident(col) for col in replaced])
+        seasonal = ', '.join(f"season.{_ident(col)}" for col in season_columns)
+        results = con.execute(f"""
+            SELECT perf.* EXCLUDE ({excluded}), {seasonal}, {KPI_SQL}
+            FROM perf JOIN season USING (AG)
+            WHERE {where} AND season."Global STR (%)" <= ?
+            ORDER BY perf._row
+        """, values + [float(params['max_salethrough'])]).df()
+    if funnel_df is not None:
+        funnel_df = append_funnel_step(funnel_df, 'Maximum salethrough', len(results))
+
+    with _timed(timings, 'kpi'):
+        first = results.pop('_first_kpi').to_numpy()
+        second = results.pop('_second_kpi').to_numpy()
+        results = compact_frame(results)
+        recommendations, kpi_results = kpis_from_codes(results, first, second)
+        results = results.assign(**{'KPI Recommendations': recommendations})
+
+    return SelectionResult(results, kpi_results, funnel_df, total_rows, timings)
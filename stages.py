@@ -0,0 +1,66 @@
+import hashlib
+from collections import namedtuple
+
+from profiling import Profiler
+
+# One node of the analysis graph: `fn` receives the outputs of `inputs`, in
+# order, and `params` holds every parameter value the stage reads
+Stage = namedtuple('Stage', ['name', 'fn', 'inputs', 'params'])
+
+# What happened to a stage during a run
+StageStatus = namedtuple('StageStatus', ['stage', 'recomputed', 'seconds'])
+
+
+class StageGraph:
+    # Memoizes each stage's output on its upstream keys and its own params.
+    # Keys are derived without running anything, and outputs are pulled
+    # lazily, so a stage only recomputes when something it depends on changed
+    # and an unchanged upstream stage is never touched.
+
+    def __init__(self, stages, store, profiler=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self._store = store
+        self.profiler = Profiler() if profiler is None else profiler
+        self._values = {}
+        self.keys = {}
+        self.log = []
+        for stage in stages:
+            self.keys[stage.name] = self._key(stage)
+
+    def _key(self, stage):
+        upstream = tuple(self.keys[name] for name in stage.inputs)
+        params = tuple(sorted((stage.params or {}).items()))
+        return hashlib.blake2b(repr((stage.name, upstream, params)).encode(), digest_size=16).hexdigest()
+
+    # Function to check whether a stage's stored output is still valid
+    def is_current(self, name):
+        cached = self._store.get(name)
+        return cached is not None and cached[0] == self.keys[name]
+
+    # Function to get a stage's output, recomputing only what is stale
+    def get(self, name):
+        if name in self._values:
+            return self._values[name]
+
+        stage = self.stages[name]
+        cached = self._store.get(name)
+        if cached is not None and cached[0] == self.keys[name]:
+            self.log.append(StageStatus(name, False, 0.0))
+            value = cached[1]
+            self.profiler.record_hit(name, value)
+        else:
+            args = [self.get(upstream) for upstream in stage.inputs]
+            value = self.profiler.measure(name, stage.fn, *args)
+            self.log.append(StageStatus(name, True, self.profiler.records[-1].seconds))
+            self._store[name] = (self.keys[name], value)
+
+        self._values[name] = value
+        return value
+
+    @property
+    def recomputed(self):
+        return [status.stage for status in self.log if status.recomputed]
+
+    @property
+    def reused(self):
+        return [status.stage for status in self.log if not status.recomputed]
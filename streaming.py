@@ -0,0 +1,154 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from cleaning import REPORT_COLUMNS, clean_frame
+from compact import compact_frame
+from filters import (
+    FUNNEL_COLUMNS, FilterPipeline, append_funnel_step, row_criteria, sales_band_criteria,
+    sales_band_thresholds
+)
+from formats import iter_table_chunks
+
+DEFAULT_CHUNKSIZE = 250_000
+DEFAULT_SKETCH_K = 800
+
+# Outcome of a chunked selection run
+StreamResult = namedtuple('StreamResult', ['df', 'funnel', 'total_rows', 'report', 'thresholds'])
+
+
+class QuantileSketch:
+    # KLL streaming quantile sketch. Memory is O(k) items regardless of how
+    # many values are fed in. Results are exact (matching np.percentile) until
+    # the first compaction; after that, each quantile is typically within 1/k
+    # and rarely beyond 3/k of the true normalized rank (0.125% / 0.375% at the
+    # default k=800), inside the 0.5% the chunked mode promises.
+
+    def __init__(self, k=DEFAULT_SKETCH_K, seed=0):
+        self.k = k
+        self.count = 0
+        self._levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def exact(self):
+        return len(self._levels) == 1
+
+    @property
+    def size(self):
+        return sum(len(level) for level in self._levels)
+
+    def _capacity(self, height):
+        depth = len(self._levels) - 1 - height
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self._levels[0] = np.concatenate([self._levels[0], values])
+        self._compress()
+
+    # Function to halve every over-full level, promoting a random half upwards
+    def _compress(self):
+        height = 0
+        while height < len(self._levels):
+            level = self._levels[height]
+            if len(level) > self._capacity(height):
+                if height + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                level = np.sort(level)
+                odd = len(level) % 2
+                promoted = level[odd + self._rng.integers(2)::2]
+                self._levels[height + 1] = np.concatenate([self._levels[height + 1], promoted])
+                self._levels[height] = level[:odd]
+            height += 1
+
+    # Function to get a percentile (0-100) with np.percentile's linear interpolation
+    def percentile(self, q):
+        if self.count == 0:
+            raise ValueError("Cannot compute a percentile of an empty sketch")
+        values = np.concatenate(self._levels)
+        weights = np.concatenate([
+            np.full(len(level), 2.0 ** height) for height, level in enumerate(self._levels)
+        ])
+        order = np.argsort(values, kind='stable')
+        values, weights = values[order], weights[order]
+        # Each retained item stands for `weight` consecutive ranks; use their centre
+        positions = np.cumsum(weights) - (weights + 1) / 2
+        return float(np.interp(q / 100 * (self.count - 1), positions, values))
+
+
+# Function to merge per-chunk cleaning reports into one
+def _merge_reports(reports, max_examples=5):
+    merged = {}
+    for report in reports:
+        for col, row in report.iterrows():
+            if col not in merged:
+                merged[col] = {'missing': 0, 'sentinel': 0, 'unparseable': 0, 'examples': []}
+            entry = merged[col]
+            for key in ('missing', 'sentinel', 'unparseable'):
+                entry[key] += int(row[key])
+            for example in row['examples']:
+                if example not in entry['examples'] and len(entry['examples']) < max_examples:
+                    entry['examples'].append(example)
+    report = pd.DataFrame.from_dict(merged, orient='index', columns=REPORT_COLUMNS)
+    report.index.name = 'Column'
+    return report
+
+
+# Function to run the performance-file selection chunk by chunk.
+# Row-local filters are applied to each chunk and only survivors are kept,
+# while SUM sales feeds a quantile sketch; the sales band is applied to the
+# survivors once the whole file has been seen. Peak memory depends on the
+# chunk size and the number of survivors, not on the file size.
+# With exact_quantiles=True the SUM sales column alone is kept instead of the
+# sketch (8 bytes per row), reproducing np.percentile exactly.
+def stream_select(source, params, fmt='csv', chunksize=DEFAULT_CHUNKSIZE, usecols=None,
+                  sketch_k=DEFAULT_SKETCH_K, exact_quantiles=False):
+    pipeline = FilterPipeline(row_criteria(params))
+    sketch = QuantileSketch(k=sketch_k)
+    sales = []
+    survivors, reports, funnels = [], [], []
+    total_rows = 0
+
+    for chunk in iter_table_chunks(source, fmt=fmt, chunksize=chunksize, usecols=usecols):
+        chunk, report = clean_frame(chunk)
+        reports.append(report)
+        total_rows += len(chunk)
+        if exact_quantiles:
+            sales.append(chunk['SUM sales'].to_numpy(dtype=np.float64))
+        else:
+            sketch.update(chunk['SUM sales'].to_numpy())
+
+        kept, funnel = pipeline.run(chunk)
+        survivors.append(kept)
+        funnels.append(funnel.set_index('Criterion'))
+
+    if total_rows == 0:
+        return StreamResult(pd.DataFrame(), pd.DataFrame(columns=FUNNEL_COLUMNS), 0,
+                            _merge_reports(reports), (np.nan, np.nan))
+
+    # Chunks are filtered in the same criterion order, so funnel counts add up
+    funnel = funnels[0].copy()
+    for chunk_funnel in funnels[1:]:
+        funnel += chunk_funnel
+    funnel = funnel.reset_index()
+
+    if exact_quantiles:
+        thresholds = sales_band_thresholds(
+            np.concatenate(sales), params['top_sales_percentile'], params['bottom_sales_percentile']
+        )
+    else:
+        thresholds = (
+            sketch.percentile(100 - params['top_sales_percentile']),
+            sketch.percentile(params['bottom_sales_percentile']),
+        )
+    survivors = compact_frame(pd.concat(survivors, ignore_index=True))
+    filtered_df, _ = FilterPipeline(sales_band_criteria(*thresholds)).run(survivors)
+
+    # The sales band only ever sees survivors, so its standalone count is unknown
+    funnel = append_funnel_step(funnel, 'Sales percentile band', len(filtered_df), rejected_alone=pd.NA)
+    funnel['Rejected alone'] = funnel['Rejected alone'].astype('Int64')
+    return StreamResult(filtered_df, funnel, total_rows, _merge_reports(reports), thresholds)
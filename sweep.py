@@ -0,0 +1,136 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from filters import Criterion, FilterPipeline, sales_band_thresholds
+
+# Parameters the sensitivity grid can sweep: name -> (column, comparison)
+SWEEP_AXES = {
+    'min_availability': ('AVG availability (%)', '>='),
+    'max_availability': ('AVG availability (%)', '<='),
+    'min_skus': ('SKU Qty', '>='),
+    'min_surplus': ('Surplus cost', '>'),
+    'min_age': ('Dormant days', '>='),
+    'max_salethrough': ('Global STR (%)', '<='),
+}
+
+SWEEP_LABELS = {
+    'min_availability': 'Min availability (%)',
+    'max_availability': 'Max availability (%)',
+    'min_skus': 'Min SKUs',
+    'min_surplus': 'Min surplus cost',
+    'min_age': 'Min average age (days)',
+    'max_salethrough': 'Max salethrough (%)',
+}
+
+# Selected-AG counts for every combination of the swept thresholds
+SweepResult = namedtuple('SweepResult', ['counts', 'params', 'values', 'base_rows'])
+
+
+# Function to bin each row by how many grid thresholds it passes.
+# For lower bounds (>=, >) a row in bin b passes thresholds 0..b-1; for upper
+# bounds (<=, <) it passes thresholds b..m-1.
+def _threshold_bins(values, thresholds, op):
+    side = 'right' if op in ('>=', '<') else 'left'
+    return np.searchsorted(thresholds, values, side=side)
+
+
+# Function to count the rows passing every combination of thresholds.
+# Rows are histogrammed over their per-axis bins once, then cumulative sums
+# along each axis turn bin counts into pass counts, so the cost is
+# O(rows + grid cells) instead of O(rows * grid cells).
+def sensitivity_counts(columns, grid):
+    params = list(grid)
+    values = [np.unique(np.asarray(grid[param], dtype=np.float64)) for param in params]
+    shape = tuple(len(v) + 1 for v in values)
+
+    valid = np.ones(len(next(iter(columns.values()))), dtype=bool)
+    for param in params:
+        valid &= ~np.isnan(columns[param])
+
+    bins = []
+    for param, thresholds in zip(params, values):
+        _, op = SWEEP_AXES[param]
+        bins.append(_threshold_bins(columns[param][valid], thresholds, op))
+
+    flat = np.ravel_multi_index(bins, shape) if bins else np.zeros(int(valid.sum()), dtype=np.intp)
+    counts = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+
+    for axis, param in enumerate(params):
+        _, op = SWEEP_AXES[param]
+        if op in ('>=', '>'):
+            # Threshold j keeps every row in bins j+1..m
+            counts = np.flip(np.cumsum(np.flip(counts, axis), axis=axis), axis)
+            counts = np.delete(counts, 0, axis=axis)
+        else:
+            # Threshold j keeps every row in bins 0..j
+            counts = np.cumsum(counts, axis=axis)
+            counts = np.delete(counts, -1, axis=axis)
+
+    return SweepResult(counts, params, values, int(valid.sum()))
+
+
+# Function to run the sweep for the full selection. Criteria that are not
+# swept (sales band, minimum products, minimum lost sales, seasonal match)
+# are applied once as a base mask.
+def sweep_selection(df, params, grid, season_index):
+    top_threshold, bottom_threshold = sales_band_thresholds(
+        df['SUM sales'], params['top_sales_percentile'], params['bottom_sales_percentile']
+    )
+    base = FilterPipeline([
+        Criterion('Sales percentile band', 'SUM sales', '<', top_threshold),
+        Criterion('Sales percentile band', 'SUM sales', '>', bottom_threshold),
+        Criterion('Assortment richness', 'Product Qty', '>=', params['min_products']),
+        Criterion('Lost sales', 'Lost sales', '>', params['min_lost_sales']),
+    ])
+    masks = base.masks(df)
+    keep = np.logical_and.reduce(list(masks.values()))
+
+    rows = df[keep]
+    columns = {}
+    for param in grid:
+        column, _ = SWEEP_AXES[param]
+        if column == 'Global STR (%)':
+            # AGs without seasonal data gather NaN and drop out of every cell
+            columns[param] = season_index.gather(column, season_index.codes_for(rows['AG']))
+        else:
+            columns[param] = rows[column].to_numpy(dtype=np.float64)
+    return sensitivity_counts(columns, grid)
+
+
+# Function to build integer grid values spanning the data, always including
+# the current setting so the grid contains today's selection
+def default_grid(df, params, points=5):
+    grid = {}
+    for param, (column, _) in SWEEP_AXES.items():
+        if column.endswith('(%)'):
+            low, high = 0, 100
+        else:
+            data = df[column].to_numpy(dtype=np.float64) if column in df.columns else np.zeros(1)
+            low, high = 0, max(float(np.nanpercentile(data, 90)), 1.0)
+        values = np.unique(np.round(np.linspace(low, high, points)).astype(int))
+        grid[param] = np.unique(np.append(values, int(params[param])))
+    return grid
+
+
+# Function to take a 2-D slice of the grid for a heatmap, with the other
+# parameters fixed at the given values
+def grid_slice(result, x_param, y_param, fixed):
+    index = []
+    for param, values in zip(result.params, result.values):
+        if param in (x_param, y_param):
+            index.append(slice(None))
+        else:
+            index.append(int(np.abs(values - fixed[param]).argmin()))
+    plane = result.counts[tuple(index)]
+
+    x_axis, y_axis = result.params.index(x_param), result.params.index(y_param)
+    if x_axis < y_axis:
+        plane = plane.T
+    x_values = result.values[x_axis]
+    y_values = result.values[y_axis]
+    return pd.DataFrame(
+        [(x, y, int(plane[i, j])) for i, y in enumerate(y_values) for j, x in enumerate(x_values)],
+        columns=[x_param, y_param, 'Selected AGs'],
+    )
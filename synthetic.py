@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from formats import PERFORMANCE_COLUMNS, SEASONAL_COLUMNS
+
+# Rows generated per block; blocks are seeded separately so any size is
+# reproducible without holding the whole file in memory
+GENERATOR_BLOCK_ROWS = 500_000
+
+# Messy spellings of "no value" seen in real exports
+MISSING_SPELLINGS = np.array(['', '—', '–', 'N/A', 'n/a', '-', 'null'], dtype=object)
+
+
+# Function to name the i-th AG
+def ag_names(start, stop):
+    return np.char.add('AG', np.char.zfill(np.arange(start, stop).astype(str), 7)).astype(object)
+
+
+# Function to turn a share of a numeric column into export-style strings:
+# thousands separators and currency or percent signs, missing placeholders
+# and the occasional unparseable cell
+def _messy(rng, values, messy, prefix='', suffix='', decimals=2):
+    out = values.astype(object)
+    n = len(values)
+    formatted = np.flatnonzero(rng.random(n) < messy * 5)
+    out[formatted] = [f"{prefix}{v:,.{decimals}f}{suffix}" for v in values[formatted]]
+    missing = np.flatnonzero(rng.random(n) < messy)
+    out[missing] = MISSING_SPELLINGS[rng.integers(0, len(MISSING_SPELLINGS), len(missing))]
+    broken = np.flatnonzero(rng.random(n) < messy / 20)
+    out[broken] = '#REF!'
+    return out
+
+
+# Function to generate one block of performance rows
+def performance_block(start, rows, seed=0, messy=0.02):
+    rng = np.random.default_rng([seed, start])
+    sales = rng.lognormal(9, 1.2, rows).round(2)
+    df = pd.DataFrame({
+        'AG': ag_names(start, start + rows),
+        'SUM sales': sales,
+        'SKU Qty': rng.poisson(25, rows),
+        'Product Qty': rng.poisson(18, rows),
+        'AVG availability (%)': np.clip(rng.normal(80, 12, rows), 0, 100).round(2),
+        'Dormant days': rng.gamma(2, 25, rows).round(0),
+        'Surplus cost': (sales * rng.beta(2, 8, rows)).round(2),
+        'Lost sales': (sales * rng.beta(1.5, 10, rows)).round(2),
+    }, columns=PERFORMANCE_COLUMNS)
+    df['SUM sales'] = _messy(rng, df['SUM sales'].to_numpy(), messy, prefix='$')
+    df['Surplus cost'] = _messy(rng, df['Surplus cost'].to_numpy(), messy)
+    df['Lost sales'] = _messy(rng, df['Lost sales'].to_numpy(), messy)
+    df['AVG availability (%)'] = _messy(rng, df['AVG availability (%)'].to_numpy(), messy, suffix='%')
+    return df
+
+
+# Function to generate the seasonal rows for one block of AGs. About
+# `coverage` of the AGs appear, a few twice, in shuffled order.
+def seasonal_block(start, rows, seed=0, messy=0.02, coverage=0.9, duplicates=0.001):
+    rng = np.random.default_rng([seed, start, 1])
+    present = np.flatnonzero(rng.random(rows) < coverage)
+    present = np.concatenate([present, present[rng.random(len(present)) < duplicates]])
+    rng.shuffle(present)
+    n = len(present)
+    df = pd.DataFrame({'AG': ag_names(start, start + rows)[present]})
+    for col in SEASONAL_COLUMNS[1:]:
+        values = np.clip(rng.normal(60, 20, n), 0, 100).round(1)
+        df[col] = _messy(rng, values, messy, suffix='%', decimals=1)
+    return df
+
+
+# Function to write a performance and a seasonal CSV with `rows` AGs,
+# returning both paths. Existing files for the same settings are reused.
+def write_synthetic_pair(directory, rows, seed=0, messy=0.02, block_rows=GENERATOR_BLOCK_ROWS):
+    os.makedirs(directory, exist_ok=True)
+    perf_path = os.path.join(directory, f"performance_{rows}_{seed}_{messy:g}.csv")
+    season_path = os.path.join(directory, f"seasonal_{rows}_{seed}_{messy:g}.csv")
+    if os.path.exists(perf_path) and os.path.exists(season_path):
+        return perf_path, season_path
+
+    # Write to temporary names so an interrupted run is not mistaken for data
+    with open(perf_path + '.tmp', 'w', newline='') as perf_out, \
+            open(season_path + '.tmp', 'w', newline='') as season_out:
+        for start in range(0, rows, block_rows):
+            block = min(block_rows, rows - start)
+            performance_block(start, block, seed, messy).to_csv(perf_out, index=False, header=start == 0)
+            seasonal_block(start, block, seed, messy).to_csv(season_out, index=False, header=start == 0)
+    os.replace(perf_path + '.tmp', perf_path)
+    os.replace(season_path + '.tmp', season_path)
+    return perf_path, season_path
+
+
+# Function to write a long-format performance CSV with `rows` AGs in each of
+# `periods` weeks (a `Week` column first), returning its path. The seasonal
+# file from write_synthetic_pair with the same settings covers its AGs.
+def write_synthetic_periods(directory, rows, periods, seed=0, messy=0.02, block_rows=GENERATOR_BLOCK_ROWS):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"performance_{rows}x{periods}_{seed}_{messy:g}.csv")
+    if os.path.exists(path):
+        return path
+
+    with open(path + '.tmp', 'w', newline='') as out:
+        for week in range(1, periods + 1):
+            for start in range(0, rows, block_rows):
+                block = performance_block(start, min(block_rows, rows - start), seed * 1000 + week, messy)
+                block.insert(0, 'Week', week)
+                block.to_csv(out, index=False, header=week == 1 and start == 0)
+    os.replace(path + '.tmp', path)
+    return path
@@ -0,0 +1,16 @@
+import pytest
+
+from pipeline import load_input
+from synthetic import write_synthetic_pair
+
+
+# A seeded performance/seasonal CSV pair with export-style messy values
+@pytest.fixture(scope='session')
+def synthetic_pair(tmp_path_factory):
+    return write_synthetic_pair(str(tmp_path_factory.mktemp('synthetic')), 20_000, seed=11)
+
+
+# The cleaned performance frame of the synthetic pair
+@pytest.fixture
+def performance(synthetic_pair):
+    return load_input(synthetic_pair[0])
@@ -0,0 +1,45 @@
+import filecmp
+
+import pandas as pd
+import pytest
+
+from benchmark import benchmark_size, compare_to_baseline, parse_size, result_digest
+from pipeline import DEFAULT_PARAMS, select_pilot_ags
+from synthetic import performance_block, write_synthetic_pair
+
+
+def test_synthetic_data_is_reproducible(tmp_path):
+    first = write_synthetic_pair(str(tmp_path / 'a'), 3_000, seed=4, block_rows=1_000)
+    second = write_synthetic_pair(str(tmp_path / 'b'), 3_000, seed=4, block_rows=1_000)
+    for left, right in zip(first, second):
+        assert filecmp.cmp(left, right, shallow=False)
+    # Blocks are seeded on their start row, so any block can be rebuilt alone
+    perf = pd.read_csv(first[0], dtype=str, keep_default_na=False)
+    block = performance_block(1_000, 1_000, seed=4).astype(str).replace('nan', '')
+    pd.testing.assert_frame_equal(perf.iloc[1_000:2_000].reset_index(drop=True), block.astype(object),
+                                  check_dtype=False)
+
+
+def test_report_digest_matches_the_library(tmp_path):
+    report = benchmark_size(2_000, str(tmp_path), dict(DEFAULT_PARAMS), repeat=1)
+    perf_path, season_path = write_synthetic_pair(str(tmp_path), 2_000)
+    result = select_pilot_ags(perf_path, season_path)
+    assert report['rows'] == 2_000 and report['selected'] == len(result.results)
+    assert report['digest'] == result_digest(result.results, result.kpi_results, result.funnel)
+    if 'duckdb_digest' in report:
+        assert report['duckdb_digest'] == report['digest']
+
+
+def test_baseline_comparison_flags_changes():
+    baseline = {'sizes': {'1k': {'digest': 'a', 'selected': 5, 'timings': {'filter': 1.0, 'kpi': 0.01}}}}
+    same = {'sizes': {'1k': {'digest': 'a', 'selected': 5, 'timings': {'filter': 1.1, 'kpi': 0.04}}}}
+    assert compare_to_baseline(same, baseline, 0.25) == []
+    slower = {'sizes': {'1k': {'digest': 'b', 'selected': 6, 'timings': {'filter': 1.5}}}}
+    problems = compare_to_baseline(slower, baseline, 0.25)
+    assert len(problems) == 2
+    assert "results changed (5 -> 6 AGs)" in problems[0] and "filter slowed" in problems[1]
+
+
+@pytest.mark.parametrize('text, rows', [('1k', 1_000), ('2.5M', 2_500_000), ('750', 750)])
+def test_parse_size(text, rows):
+    assert parse_size(text) == rows
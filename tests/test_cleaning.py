@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cleaning import clean_column, clean_frame
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('1,234.5', 1234.5),
+    ('$1,000', 1000.0),
+    ('£12', 12.0),
+    ('85.5%', 85.5),
+    ('-5', -5.0),
+    ('−5', -5.0),
+    ('(1,234)', -1234.0),
+    (' 42 ', 42.0),
+    ('1e3', 1000.0),
+])
+def test_parses_export_spellings(raw, expected):
+    values, counts = clean_column(pd.Series([raw, '1'], dtype=object))
+    assert values[0] == expected
+    assert counts['unparseable'] == 0
+
+
+def test_counts_coerced_values():
+    series = pd.Series(['1', None, '—', 'N/A', '#REF!', 'inf', '-Infinity', '$inf'], dtype=object)
+    values, counts = clean_column(series)
+    assert values.tolist() == [1.0] + [0.0] * 7
+    assert (counts['missing'], counts['sentinel'], counts['unparseable']) == (1, 2, 4)
+    assert counts['examples'] == ['#REF!', 'inf', '-Infinity', '$inf']
+
+
+def test_numeric_columns_drop_non_finite_values():
+    values, counts = clean_column(pd.Series([1.5, np.nan, np.inf, -np.inf]), dtype=np.float32)
+    assert values.dtype == np.float32
+    assert values.tolist() == [1.5, 0.0, 0.0, 0.0]
+    assert (counts['missing'], counts['unparseable']) == (1, 2)
+
+
+def test_clean_frame_reports_every_present_column():
+    df = pd.DataFrame({'AG': ['A', 'B'], 'SUM sales': ['$1,000', 'Infinity'], 'SKU Qty': [3, 4]})
+    cleaned, report = clean_frame(df)
+    assert cleaned['SUM sales'].tolist() == [1000.0, 0.0]
+    assert report.loc['SUM sales', 'unparseable'] == 1
+    assert report.loc['SKU Qty', 'missing'] == 0
+    assert 'AG' not in report.index
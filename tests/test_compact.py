@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from cleaning import clean_frame
+from compact import compact_frame, downcast_values, freeze_frame, trim_categories
+from formats import read_table
+from pipeline import select_pilot_ags
+
+
+def test_downcasts_are_lossless():
+    whole = np.array([0.0, 3.0, 70_000.0])
+    assert downcast_values(whole).dtype == np.int32
+    halves = np.array([0.5, 1.25, np.nan])
+    assert downcast_values(halves).dtype == np.float32
+    cents = np.array([0.1, 1234.57])
+    assert downcast_values(cents) is cents
+    for values in (whole, halves):
+        np.testing.assert_array_equal(downcast_values(values).astype(np.float64), values)
+
+
+def test_compact_frame_keeps_values_and_selection(synthetic_pair):
+    cleaned, _ = clean_frame(read_table(synthetic_pair[0]))
+    compacted = compact_frame(cleaned)
+    assert compacted.memory_usage(deep=True).sum() < cleaned.memory_usage(deep=True).sum()
+    for col in cleaned.columns:
+        dtype = object if col == 'AG' else np.float64
+        np.testing.assert_array_equal(np.asarray(compacted[col], dtype=dtype), np.asarray(cleaned[col], dtype=dtype))
+    # Filtering the compact frame selects exactly what the float64 frame does
+    season = read_table(synthetic_pair[1])
+    expected = select_pilot_ags(cleaned, season).results['AG'].astype(str).tolist()
+    assert select_pilot_ags(compacted, season).results['AG'].astype(str).tolist() == expected
+
+
+def test_repeated_keys_become_categories():
+    df = compact_frame(pd.DataFrame({'AG': ['A', 'B'] * 50, 'SUM sales': np.arange(100.0)}))
+    assert isinstance(df['AG'].dtype, pd.CategoricalDtype)
+    assert list(trim_categories(df.head(1))['AG'].cat.categories) == ['A']
+
+
+def test_frozen_frames_are_read_only():
+    frozen = freeze_frame(pd.DataFrame({'SUM sales': [1.0, 2.0]}))
+    assert not frozen['SUM sales'].to_numpy().flags.writeable
@@ -0,0 +1,46 @@
+import gzip
+import io
+
+import pandas as pd
+import pytest
+
+from downloads import DownloadCache, format_size, iter_serialized
+from pipeline import select_pilot_ags
+
+
+@pytest.fixture
+def results(synthetic_pair):
+    return select_pilot_ags(*synthetic_pair).results
+
+
+def test_chunked_csv_matches_to_csv(results):
+    expected = results.to_csv(index=False).encode()
+    assert b''.join(iter_serialized(results, 'csv', chunk_rows=100)) == expected
+    assert gzip.decompress(b''.join(iter_serialized(results, 'csv.gz', chunk_rows=100))) == expected
+
+
+def test_chunked_parquet_round_trips(results):
+    pytest.importorskip('pyarrow')
+    data = b''.join(iter_serialized(results, 'parquet', chunk_rows=100))
+    pd.testing.assert_frame_equal(pd.read_parquet(io.BytesIO(data)), results.reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False)
+
+
+def test_empty_frame_keeps_the_header(results):
+    assert b''.join(iter_serialized(results.head(0), 'csv')) == results.head(0).to_csv(index=False).encode()
+
+
+def test_cache_reuses_and_bounds_bytes(results):
+    cache = DownloadCache(max_bytes=len(results.to_csv(index=False)) * 2)
+    first = cache.serialize(('v1', 'results', 'csv'), results, 'csv')
+    assert cache.serialize(('v1', 'results', 'csv'), results.head(0), 'csv') is first
+    cache.serialize(('v2', 'results', 'csv'), results, 'csv')
+    cache.serialize(('v3', 'results', 'csv'), results, 'csv')
+    assert cache.get(('v1', 'results', 'csv')) is None
+    assert cache.get(('v3', 'results', 'csv')) is not None
+
+
+def test_format_size():
+    assert format_size(512) == "512 B"
+    assert format_size(2048) == "2.0 KB"
+    assert format_size(5 * 1024 ** 3) == "5.0 GB"
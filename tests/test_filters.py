@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from filters import FilterPipeline, build_criteria
+from pipeline import DEFAULT_PARAMS
+
+
+# Function to apply the criteria one after another, as the app did before
+# the filter pipeline
+def chained_filter(df, params):
+    top = np.percentile(df['SUM sales'], 100 - params['top_sales_percentile'])
+    bottom = np.percentile(df['SUM sales'], params['bottom_sales_percentile'])
+    df = df[(df['SUM sales'] < top) & (df['SUM sales'] > bottom)]
+    df = df[(df['AVG availability (%)'] >= params['min_availability'])
+            & (df['AVG availability (%)'] <= params['max_availability'])]
+    df = df[(df['SKU Qty'] >= params['min_skus']) & (df['Product Qty'] >= params['min_products'])]
+    df = df[df['Surplus cost'] > params['min_surplus']]
+    df = df[df['Lost sales'] > params['min_lost_sales']]
+    return df[df['Dormant days'] >= params['min_age']]
+
+
+@pytest.mark.parametrize('changes', [{}, {'min_availability': 70, 'min_skus': 25},
+                                     {'top_sales_percentile': 5, 'bottom_sales_percentile': 60}])
+def test_pipeline_matches_chained_filters(performance, changes):
+    params = {**DEFAULT_PARAMS, **changes}
+    filtered, funnel = FilterPipeline.from_params(performance, params).run(performance)
+    expected = chained_filter(performance, params)
+    assert len(expected)
+    assert filtered.index.tolist() == expected.index.tolist()
+    assert funnel['Remaining'].iloc[-1] == len(expected)
+
+
+def test_funnel_counts(performance):
+    params = dict(DEFAULT_PARAMS)
+    pipeline = FilterPipeline(build_criteria(performance, params))
+    _, funnel = pipeline.run(performance)
+    masks = pipeline.masks(performance)
+    assert funnel['Criterion'].tolist() == list(masks)
+    remaining = np.r_[len(performance), funnel['Remaining'].to_numpy()]
+    assert (funnel['Rejected'].to_numpy() == remaining[:-1] - remaining[1:]).all()
+    assert funnel['Rejected alone'].tolist() == [int((~mask).sum()) for mask in masks.values()]
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+from formats import PERFORMANCE_COLUMNS, iter_table_chunks, read_table, to_columnar_bytes
+
+pytest.importorskip('pyarrow')
+
+
+# Function to compare frames whatever null marker a reader used
+def assert_same_table(left, right):
+    pd.testing.assert_frame_equal(left.astype(object).where(left.notna(), None),
+                                  right.astype(object).where(right.notna(), None))
+
+
+@pytest.fixture
+def raw(synthetic_pair):
+    return pd.read_csv(synthetic_pair[0])
+
+
+def test_csv_reader_matches_pandas(synthetic_pair, raw):
+    assert_same_table(read_table(synthetic_pair[0]), raw)
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+def test_columnar_round_trip(raw, fmt):
+    data = to_columnar_bytes(raw, fmt)
+    assert_same_table(read_table(data, fmt=fmt), raw)
+    usecols = ['AG', 'SUM sales']
+    assert read_table(data, fmt=fmt, usecols=usecols).columns.tolist() == usecols
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'parquet', 'arrow'])
+def test_chunks_cover_the_table(synthetic_pair, raw, fmt):
+    data = to_columnar_bytes(raw, fmt) if fmt != 'csv' else synthetic_pair[0]
+    chunks = list(iter_table_chunks(data, fmt=fmt, chunksize=3_000, usecols=PERFORMANCE_COLUMNS))
+    # Feather files are written as a single batch
+    assert len(chunks) > 1 or fmt == 'arrow'
+    assert_same_table(pd.concat(chunks, ignore_index=True), raw[PERFORMANCE_COLUMNS])
+
+
+def test_unknown_format_raises(raw):
+    with pytest.raises(ValueError, match="Unsupported"):
+        read_table(b'', fmt='xlsx')
+    with pytest.raises(ValueError, match="Unsupported"):
+        to_columnar_bytes(raw, 'xlsx')
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from grouped import group_codes, group_percentiles, select_grouped_ags
+from pipeline import select_pilot_ags
+from synthetic import write_synthetic_pair, write_synthetic_periods
+
+ROWS = 2_000
+WEEKS = 3
+
+
+@pytest.fixture(scope='module')
+def files(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('grouped'))
+    _, season_path = write_synthetic_pair(directory, ROWS, seed=5)
+    return write_synthetic_periods(directory, ROWS, WEEKS, seed=5), season_path
+
+
+def test_groups_match_separate_runs(files):
+    perf_path, season_path = files
+    perf = pd.read_csv(perf_path, dtype={'Week': np.int64})
+    selection = select_grouped_ags(perf, season_path, 'Week')
+    for week in range(1, WEEKS + 1):
+        expected = select_pilot_ags(perf[perf['Week'] == week].drop(columns='Week'), season_path).results
+        grouped = selection.results[selection.results['Week'] == week]
+        assert grouped['AG'].tolist() == expected['AG'].tolist()
+    qualified = selection.results.groupby('AG', observed=True)['Week'].nunique()
+    consistency = selection.consistency.set_index('AG')
+    assert consistency['Groups qualified'].sort_index().tolist() == qualified.sort_index().tolist()
+    assert (consistency['Groups present'] == WEEKS).all()
+
+
+def test_missing_ags_and_repeated_rows(files):
+    perf_path, season_path = files
+    perf = pd.read_csv(perf_path)
+    perf.loc[::50, 'AG'] = None
+    # Every row listed twice: still one group per (AG, week) pair
+    selection = select_grouped_ags(pd.concat([perf, perf], ignore_index=True), season_path, 'Week')
+    consistency = selection.consistency
+    assert len(consistency)
+    assert consistency['AG'].notna().all()
+    assert (consistency['Groups present'] <= WEEKS).all()
+    assert (consistency['Groups qualified'] <= consistency['Groups present']).all()
+    assert (consistency['Qualified share'] <= 1).all()
+
+
+@pytest.mark.parametrize('q', [0, 20, 30, 70, 80, 100])
+def test_group_percentiles_match_numpy(q):
+    rng = np.random.default_rng(q)
+    df = pd.DataFrame({'Store': rng.choice(['a', 'b', 'c', None], 5_000),
+                       'SUM sales': rng.lognormal(9, 1, 5_000)})
+    # Store "d" has a single row
+    df.loc[0, 'Store'] = 'd'
+    codes, labels = group_codes(df, 'Store')
+    result = group_percentiles(df['SUM sales'], codes, len(labels), q)
+    for code, label in enumerate(labels):
+        assert result[code] == np.percentile(df.loc[df['Store'] == label, 'SUM sales'], q)
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from formats import SEASONAL_COLUMNS
+from ingest import IngestCache, data_digest
+from pipeline import load_input
+
+
+@pytest.fixture
+def perf_bytes(synthetic_pair):
+    with open(synthetic_pair[0], 'rb') as f:
+        return f.read()
+
+
+def test_same_bytes_hit_the_cache(perf_bytes):
+    cache = IngestCache()
+    first = cache.load(perf_bytes)
+    second = cache.load(bytes(perf_bytes))
+    assert not first.hit and second.hit
+    assert first.key == second.key
+    pd.testing.assert_frame_equal(second.df, load_input(perf_bytes))
+    with pytest.raises(ValueError):
+        second.df['SUM sales'].to_numpy()[0] = 1
+
+
+def test_content_and_config_change_the_key(perf_bytes):
+    cache = IngestCache()
+    key = cache.load(perf_bytes).key
+    assert cache.load(perf_bytes + b'AG9999999,1,1,1,1,1,1,1\n').key != key
+    assert cache.load(perf_bytes, usecols=['AG', 'SUM sales']).key != key
+    assert cache.misses == 3
+
+
+def test_digest_skips_reading_the_bytes(perf_bytes):
+    cache = IngestCache()
+    digest = data_digest(perf_bytes)
+    cache.load(perf_bytes, digest=digest)
+
+    def unread():
+        raise AssertionError("bytes read on a cache hit")
+
+    assert cache.load(unread, digest=digest).hit
+
+
+def test_sessions_share_one_copy(perf_bytes):
+    cache = IngestCache()
+    first = cache.load(perf_bytes, session_id='a', slot='performance')
+    second = cache.load(perf_bytes, session_id='b', slot='performance')
+    assert len(cache) == 1 and cache.refcount(first.key) == 2
+    assert np.shares_memory(first.df['SUM sales'].to_numpy(), second.df['SUM sales'].to_numpy())
+    cache.release('a')
+    assert cache.refcount(first.key) == 1
+
+
+def test_held_datasets_survive_eviction(perf_bytes):
+    cache = IngestCache(max_entries=1)
+    held = cache.load(perf_bytes, session_id='a', slot='performance').key
+    other = cache.load(perf_bytes[:len(perf_bytes) // 2].rsplit(b'\n', 1)[0] + b'\n').key
+    assert cache.get(held) is not None and cache.get(other) is None
+    cache.release('a', 'performance')
+    cache.load(perf_bytes[:len(perf_bytes) // 3].rsplit(b'\n', 1)[0] + b'\n')
+    assert cache.get(held) is None
+
+
+def test_idle_holds_lapse(perf_bytes, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr('ingest.time.monotonic', lambda: clock[0])
+    cache = IngestCache(idle_seconds=60)
+    key = cache.load(perf_bytes, session_id='a', slot='performance').key
+    clock[0] += 61
+    cache.release('b')
+    assert cache.refcount(key) == 0 and len(cache) == 0
+
+
+def test_prefetched_files_load_as_hits(synthetic_pair, perf_bytes):
+    with open(synthetic_pair[1], 'rb') as f:
+        season_bytes = f.read()
+    cache = IngestCache()
+    parses = []
+    parse = cache._parse
+
+    def counted_parse(key, *args):
+        parses.append(key)
+        return parse(key, *args)
+
+    cache._parse = counted_parse
+
+    keys = [cache.prefetch(perf_bytes), cache.prefetch(season_bytes, usecols=SEASONAL_COLUMNS)]
+    assert cache.prefetch(perf_bytes) == keys[0]
+    performance = cache.load(perf_bytes)
+    season = cache.load(season_bytes, usecols=SEASONAL_COLUMNS)
+    assert performance.hit and season.hit and cache.misses == 0
+    assert sorted(parses) == sorted(keys)
+    pd.testing.assert_frame_equal(performance.df, load_input(perf_bytes))
+    pd.testing.assert_frame_equal(season.df, load_input(season_bytes, usecols=SEASONAL_COLUMNS))
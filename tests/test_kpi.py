@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from kpi import assign_kpis, determine_kpi_focuses, get_kpi_rationale
+
+
+# Function to build the KPI outputs row by row, as the app did before
+def kpis_by_row(df):
+    recommendations, rows = [], []
+    for _, row in df.iterrows():
+        kpis = determine_kpi_focuses(row)
+        recommendations.append(', '.join(kpis))
+        rows += [{'AG': row['AG'], 'KPI Focus': kpi, 'Rationale': get_kpi_rationale(kpi)} for kpi in kpis]
+    return recommendations, pd.DataFrame(rows)
+
+
+def test_matches_row_by_row_rules(performance):
+    df = performance.head(3_000)
+    recommendations, kpi_results = assign_kpis(df)
+    expected_recommendations, expected_results = kpis_by_row(df)
+    assert recommendations.tolist() == expected_recommendations
+    assert recommendations.index.equals(df.index)
+    pd.testing.assert_frame_equal(kpi_results.astype(object), expected_results.astype(object))
+
+
+def test_every_rule_combination():
+    # Each row sits on or past a rule threshold: dormant > 80, surplus > 2 x
+    # lost sales, availability < 75
+    cases = [(dormant, surplus, availability)
+             for dormant in (80, 81) for surplus in (200, 201) for availability in (75, 74.9)]
+    df = pd.DataFrame({
+        'AG': [f'AG{i}' for i in range(len(cases))],
+        'Dormant days': [case[0] for case in cases],
+        'Surplus cost': [case[1] for case in cases],
+        'Lost sales': np.full(len(cases), 100.0),
+        'AVG availability (%)': [case[2] for case in cases],
+    })
+    recommendations, _ = assign_kpis(df)
+    assert recommendations.tolist() == kpis_by_row(df)[0]
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from paging import filter_positions, format_page, get_page, sort_positions
+from pipeline import select_pilot_ags
+
+
+@pytest.fixture
+def results(synthetic_pair):
+    return select_pilot_ags(*synthetic_pair).results
+
+
+@pytest.mark.parametrize('column', ['SUM sales', 'KPI Recommendations'])
+@pytest.mark.parametrize('ascending', [True, False])
+def test_sort_matches_pandas(results, column, ascending):
+    positions = sort_positions(results, np.arange(len(results)), column, ascending)
+    key = results[column].astype(str) if column == 'KPI Recommendations' else results[column]
+    expected = key.sort_values(ascending=ascending, kind='stable').index
+    assert results.index[positions].tolist() == expected.tolist()
+
+
+def test_filters_match_pandas(results):
+    positions = filter_positions(results, 'SUM sales', low=10_000, high=20_000)
+    expected = results['SUM sales'].between(10_000, 20_000)
+    assert positions.tolist() == np.flatnonzero(expected).tolist()
+    positions = filter_positions(results, 'KPI Recommendations', query='sales through')
+    expected = results['KPI Recommendations'].str.contains('Sales Through')
+    assert positions.tolist() == np.flatnonzero(expected).tolist()
+
+
+def test_pages_cover_every_row_once(results):
+    positions = np.arange(len(results))
+    first = get_page(results, positions, page=1, page_size=25)
+    assert first.pages == -(-len(results) // 25) and first.matched == len(results)
+    rows = pd.concat([get_page(results, positions, page, 25).rows for page in range(1, first.pages + 1)])
+    assert rows.index.tolist() == results.index.tolist()
+    assert get_page(results, positions, page=first.pages + 5, page_size=25).page == first.pages
+    assert get_page(results, positions[:0]).pages == 1
+
+
+def test_page_formats_match_the_old_styler(results):
+    page = get_page(results, np.arange(len(results)), page_size=10).rows
+    html = format_page(page).to_html()
+    row = page.iloc[0]
+    assert f"${row['SUM sales']:,.2f}" in html
+    assert f"{row['AVG availability (%)']:.2f}%" in html
+    assert f"${row['Surplus cost']:,.2f}" in html
@@ -0,0 +1,55 @@
+import io
+
+import pandas as pd
+import pytest
+
+from formats import sniff_format, to_columnar_bytes
+from pipeline import load_input, select_pilot_ags
+from synthetic import write_synthetic_pair
+
+pa = pytest.importorskip('pyarrow')
+
+
+@pytest.fixture(scope='module')
+def pair(tmp_path_factory):
+    return write_synthetic_pair(str(tmp_path_factory.mktemp('pipeline')), 5_000, seed=3)
+
+
+# Function to serialize a frame as an Arrow IPC stream
+def arrow_stream_bytes(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def test_sniff_format():
+    df = pd.DataFrame({'AG': ['AG1'], 'SUM sales': [1.0]})
+    assert sniff_format(df.to_csv(index=False).encode()) == 'csv'
+    assert sniff_format(to_columnar_bytes(df, 'parquet')) == 'parquet'
+    assert sniff_format(to_columnar_bytes(df, 'arrow')) == 'arrow'
+    assert sniff_format(arrow_stream_bytes(df)) == 'arrow'
+    assert sniff_format(b'') == 'csv'
+
+
+def test_bytes_inputs_match_paths(pair):
+    perf_path, season_path = pair
+    expected = select_pilot_ags(perf_path, season_path).results.reset_index(drop=True)
+    assert len(expected)
+    raw = pd.read_csv(perf_path, dtype=str)
+    with open(perf_path, 'rb') as f:
+        csv_bytes = f.read()
+    with open(season_path, 'rb') as f:
+        season = f.read()
+    for perf in (csv_bytes, to_columnar_bytes(raw, 'parquet'),
+                 to_columnar_bytes(raw, 'arrow'), arrow_stream_bytes(raw), raw):
+        result = select_pilot_ags(perf, season).results.reset_index(drop=True)
+        pd.testing.assert_frame_equal(result, expected)
+
+
+def test_empty_performance_file_raises(pair):
+    perf_path, season_path = pair
+    empty = load_input(perf_path).head(0)
+    with pytest.raises(ValueError, match="No data available"):
+        select_pilot_ags(empty, season_path)
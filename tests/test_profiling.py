@@ -0,0 +1,31 @@
+import tracemalloc
+
+from profiling import Profiler
+
+
+def test_one_profiler_tracks_memory_at_a_time():
+    first = Profiler(track_memory=True)
+    second = Profiler(track_memory=True)
+    try:
+        assert first.track_memory and tracemalloc.is_tracing()
+        assert not second.track_memory and second.memory_busy
+        with first.stage('allocate') as info:
+            info['rows_out'] = len(bytearray(1 << 20))
+        assert first.records[0].peak_bytes >= 1 << 20
+    finally:
+        second.close()
+        first.close()
+    assert not tracemalloc.is_tracing()
+
+    # Closing at the end of a run frees the claim for the next one
+    third = Profiler(track_memory=True)
+    third.close()
+    assert third.track_memory
+
+
+def test_freed_profiler_releases_memory_tracking():
+    Profiler(track_memory=True)
+    assert not tracemalloc.is_tracing()
+    profiler = Profiler(track_memory=True)
+    profiler.close()
+    assert profiler.track_memory
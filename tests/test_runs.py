@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+import runs
+from pipeline import select_pilot_ags
+from runs import RunStore, rules_version
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RunStore(str(tmp_path / 'runs.sqlite3'), max_runs=3)
+
+
+@pytest.fixture
+def selection(synthetic_pair):
+    return select_pilot_ags(*synthetic_pair)
+
+
+def test_round_trip(store, selection):
+    run_id = store.record('key', 'filters', {'min_age': 30}, selection.results['AG'],
+                          {'results': selection.results, 'kpi_results': selection.kpi_results},
+                          selection.total_ags, perf_key='perf', season_key='season')
+    assert store.find('key') == run_id
+    run = store.load(run_id)
+    assert run.params == {'min_age': 30} and run.selected == len(selection.results)
+    pd.testing.assert_frame_equal(run.tables['results'], selection.results.reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False)
+    # Storing the same key again replaces the run
+    store.record('key', 'filters', {'min_age': 60}, [], {}, 0)
+    assert len(store.list_runs()) == 1
+    assert store.load(store.find('key')).params == {'min_age': 60}
+
+
+def test_runs_from_other_rules_are_not_found(store, monkeypatch):
+    store.record('key', 'filters', {}, ['AG1'], {}, 1)
+    monkeypatch.setattr(runs, 'STORE_VERSION', runs.STORE_VERSION + 1)
+    assert rules_version() != store.version
+    newer = RunStore(store.path)
+    assert newer.find('key') is None
+    assert store.find('key') is not None
+
+
+def test_only_recent_runs_are_kept(store):
+    for i in range(5):
+        store.record(f'key{i}', 'filters', {}, [f'AG{i}'], {}, 1)
+    assert [run.id for run in store.list_runs()] == [5, 4, 3]
+    assert store.find('key0') is None
+
+
+def test_diff(store):
+    base = store.record('a', 'filters', {}, ['AG1', 'AG2', 'AG3'], {}, 3)
+    other = store.record('b', 'filters', {}, ['AG2', 'AG3', 'AG4'], {}, 3)
+    diff = store.diff(base, other)
+    assert (diff.added, diff.removed, diff.kept) == (['AG4'], ['AG1'], ['AG2', 'AG3'])
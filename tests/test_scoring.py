@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import DEFAULT_PARAMS, rank_pilot_ags, select_pilot_ags
+from scoring import BELOW_ONE, composite_score, top_k_positions
+from synthetic import performance_block, seasonal_block
+
+# 1001 rows put both default sales percentiles exactly on a row, so the band
+# edges are real sales values
+ROWS = 1001
+
+
+# Function to build a clean performance/seasonal pair with rows placed
+# exactly on every hard-filter threshold
+def threshold_pair(params):
+    perf = performance_block(0, ROWS, seed=7, messy=0)
+    season = seasonal_block(0, ROWS, seed=7, messy=0, coverage=1.0, duplicates=0)
+    for column in perf.columns[1:]:
+        perf[column] = pd.to_numeric(perf[column])
+    # Distinct sales keep the percentile rows unique
+    perf['SUM sales'] = np.arange(1, ROWS + 1, dtype=np.float64) * 10
+    # A base row that passes everything, copied and nudged onto each threshold
+    base = {'AVG availability (%)': 80.0, 'SKU Qty': 25, 'Product Qty': 25, 'Surplus cost': 500.0,
+            'Lost sales': 500.0, 'Dormant days': 90.0}
+    on_threshold = [
+        {'AVG availability (%)': params['min_availability']},
+        {'AVG availability (%)': params['max_availability']},
+        {'SKU Qty': params['min_skus']},
+        {'SKU Qty': params['min_skus'] - 1},
+        {'Product Qty': params['min_products']},
+        {'Product Qty': params['min_products'] - 1},
+        {'Surplus cost': params['min_surplus']},
+        {'Lost sales': params['min_lost_sales']},
+        {'Dormant days': params['min_age']},
+        {'Dormant days': params['min_age'] - 1},
+        {},
+        {},
+    ]
+    middle = ROWS // 2
+    for offset, change in enumerate(on_threshold):
+        for column, value in {**base, **change}.items():
+            perf.loc[middle + offset, column] = value
+    # Sales exactly on the band edges, otherwise passing
+    for position in ((ROWS - 1) * params['bottom_sales_percentile'] // 100,
+                     (ROWS - 1) * (100 - params['top_sales_percentile']) // 100):
+        for column, value in base.items():
+            perf.loc[position, column] = value
+    # The last two base rows sit on and just over the salethrough limit
+    season['Global STR (%)'] = 50.0
+    last = middle + len(on_threshold) - 1
+    season.loc[season['AG'] == perf.loc[last - 1, 'AG'], 'Global STR (%)'] = params['max_salethrough']
+    season.loc[season['AG'] == perf.loc[last, 'AG'], 'Global STR (%)'] = params['max_salethrough'] + 0.1
+    return perf, season
+
+
+def test_perfect_scores_match_hard_filters():
+    params = dict(DEFAULT_PARAMS)
+    perf, season = threshold_pair(params)
+    selected = set(select_pilot_ags(perf, season, params).results['AG'])
+    ranking = rank_pilot_ags(perf, season, params, k=ROWS)
+    perfect = set(ranking.results.loc[ranking.results['Score'] == 1.0, 'AG'])
+    assert selected
+    assert perfect == selected
+    assert (ranking.scores[ranking.scores != 1.0] <= BELOW_ONE).all()
+
+
+def test_band_edges_score_below_one():
+    params = dict(DEFAULT_PARAMS)
+    perf, season = threshold_pair(params)
+    ranking = rank_pilot_ags(perf, season, params, k=ROWS)
+    sales = perf['SUM sales'].to_numpy()
+    edges = np.percentile(sales, [params['bottom_sales_percentile'], 100 - params['top_sales_percentile']])
+    on_edge = ranking.results['SUM sales'].isin(edges)
+    assert on_edge.sum() == 2
+    assert (ranking.results.loc[on_edge, 'Score'] < 1.0).all()
+
+
+def test_zero_weights_score_zero():
+    perf, season = threshold_pair(DEFAULT_PARAMS)
+    weights = {component: 0.0 for component in ('sales_band', 'availability', 'dynamics', 'dormant',
+                                                'salethrough')}
+    scores = composite_score(perf, np.full(len(perf), 50.0), DEFAULT_PARAMS, weights)
+    assert not scores.any()
+
+
+def test_top_k_breaks_ties_by_tiebreak_then_row():
+    values = np.array([0.5, 0.9, 0.9, np.nan, 0.9, 0.1])
+    assert top_k_positions(values, 3).tolist() == [1, 2, 4]
+    tiebreak = np.array([0, 1, 3, 0, 3, 0])
+    assert top_k_positions(values, 2, tiebreak).tolist() == [2, 4]
+    assert top_k_positions(values, 10).tolist() == [1, 2, 4, 0, 5, 3]
+
+
+@pytest.mark.parametrize('k', [0, -1])
+def test_top_k_empty(k):
+    assert len(top_k_positions(np.ones(3), k)) == 0
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from formats import SEASONAL_COLUMNS
+from pipeline import load_input
+from seasonal import SeasonalIndex
+
+
+def test_join_matches_merge_on_first_rows(synthetic_pair, performance):
+    season = load_input(synthetic_pair[1], usecols=SEASONAL_COLUMNS)
+    index = SeasonalIndex(season)
+    assert index.duplicates == season['AG'].duplicated().sum() > 0
+
+    codes = index.codes_for(performance['AG'])
+    joined = index.join(performance, codes, columns=['Global STR (%)', 'Local STR (%)'])
+    first_rows = season[['AG', 'Global STR (%)', 'Local STR (%)']].drop_duplicates('AG', keep='first')
+    expected = pd.merge(performance.astype({'AG': object}), first_rows.astype({'AG': object}),
+                        on='AG', how='inner')
+    assert joined['AG'].astype(object).tolist() == expected['AG'].tolist()
+    for col in ('Global STR (%)', 'Local STR (%)'):
+        np.testing.assert_array_equal(joined[col].to_numpy(dtype=np.float64),
+                                      expected[col].to_numpy(dtype=np.float64))
+
+
+def test_first_row_wins():
+    season = pd.DataFrame({'AG': ['A', 'B', 'A', 'C', 'B'], 'Global STR (%)': [10.0, 20.0, 30.0, 40.0, 50.0]})
+    index = SeasonalIndex(season)
+    assert index.duplicates == 2
+    codes = index.codes_for(pd.Series(['B', 'A', 'D', 'C']))
+    np.testing.assert_array_equal(index.gather('Global STR (%)', codes), [20.0, 10.0, np.nan, 40.0])
+
+
+def test_categorical_and_text_keys_agree():
+    season = pd.DataFrame({'AG': ['A', 'B', 'C'], 'Global STR (%)': [1.0, 2.0, 3.0]})
+    index = SeasonalIndex(season)
+    ags = pd.Series(['C', 'X', 'A', 'C'])
+    np.testing.assert_array_equal(index.codes_for(ags.astype('category')), index.codes_for(ags))
+
+
+def test_keys_on_group_and_ag():
+    season = pd.DataFrame({'Store': [1, 1, 2, 2], 'AG': ['A', 'B', 'A', 'A'],
+                           'Global STR (%)': [1.0, 2.0, 3.0, 4.0]})
+    index = SeasonalIndex(season, key_columns=('Store', 'AG'))
+    assert index.duplicates == 1
+    rows = pd.DataFrame({'Store': [2, 1, 2], 'AG': ['A', 'B', 'B']})
+    np.testing.assert_array_equal(index.gather('Global STR (%)', index.codes_for_rows(rows)), [3.0, 2.0, np.nan])
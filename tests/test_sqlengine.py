@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cleaning import clean_column
+from pipeline import DEFAULT_PARAMS, select_pilot_ags
+from sqlengine import connect, select_pilot_ags_sql
+
+pytest.importorskip('duckdb')
+
+
+@pytest.mark.parametrize('changes', [{}, {'min_availability': 70, 'max_salethrough': 50},
+                                     {'top_sales_percentile': 5, 'bottom_sales_percentile': 60}])
+def test_matches_pandas(synthetic_pair, changes):
+    params = {**DEFAULT_PARAMS, **changes}
+    expected = select_pilot_ags(*synthetic_pair, params)
+    result = select_pilot_ags_sql(*synthetic_pair, params)
+    assert len(expected.results)
+    assert result.total_ags == expected.total_ags
+    assert result.results['AG'].astype(str).tolist() == expected.results['AG'].astype(str).tolist()
+    for col in ('SUM sales', 'Surplus cost', 'Global STR (%)'):
+        np.testing.assert_array_equal(result.results[col].to_numpy(dtype=np.float64),
+                                      expected.results[col].to_numpy(dtype=np.float64))
+    assert result.results['KPI Recommendations'].tolist() == expected.results['KPI Recommendations'].tolist()
+    pd.testing.assert_frame_equal(result.funnel[['Criterion', 'Remaining']],
+                                  expected.funnel[['Criterion', 'Remaining']], check_dtype=False)
+
+
+def test_cleaning_macro_matches_clean_column():
+    raw = ['1,234.5', '$1,000', '85.5%', '-5', '−5', '(1,234)', ' 42 ', '—', 'N/A', None, '#REF!', 'inf',
+           '-Infinity', '1e3', '']
+    expected, _ = clean_column(pd.Series(raw, dtype=object))
+    with connect(threads=1, temp_directory=None) as con:
+        values = [con.execute('SELECT ag_number(?)', [value]).fetchone()[0] for value in raw]
+    np.testing.assert_array_equal(values, expected)
@@ -0,0 +1,43 @@
+from stages import Stage, StageGraph
+
+
+# Function to build a three-stage chain that records every call
+def chain(calls, load_param, filter_param):
+    def stage(name, offset):
+        def run(*args):
+            calls.append(name)
+            return sum(args) + offset
+        return run
+
+    return [
+        Stage('load', stage('load', load_param), (), {'file': load_param}),
+        Stage('filter', stage('filter', filter_param), ('load',), {'threshold': filter_param}),
+        Stage('render', stage('render', 0), ('filter',), {}),
+    ]
+
+
+def test_only_stale_stages_recompute():
+    store, calls = {}, []
+    graph = StageGraph(chain(calls, 1, 10), store)
+    assert graph.get('render') == 11
+    assert calls == ['load', 'filter', 'render']
+
+    calls.clear()
+    graph = StageGraph(chain(calls, 1, 10), store)
+    assert graph.get('render') == 11
+    assert calls == [] and graph.reused == ['render']
+
+    calls.clear()
+    graph = StageGraph(chain(calls, 1, 20), store)
+    assert graph.get('render') == 21
+    assert calls == ['filter', 'render']
+    assert graph.recomputed == ['filter', 'render'] and graph.reused == ['load']
+
+
+def test_keys_follow_upstream_changes():
+    first = StageGraph(chain([], 1, 10), {})
+    second = StageGraph(chain([], 2, 10), {})
+    assert first.keys['filter'] != second.keys['filter']
+    assert first.keys['render'] != second.keys['render']
+    assert not second.is_current('render')
+    assert StageGraph(chain([], 1, 10), {}).keys == first.keys
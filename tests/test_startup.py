@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+from benchmark import ANALYSIS_MODULES, STARTUP_BUDGET, benchmark_startup, startup_problems
+
+
+def test_upload_page_skips_the_analysis_stack():
+    startup = benchmark_startup(repeat=1)
+    assert startup['errors'] == []
+    assert startup['loaded'] == []
+
+
+def test_light_modules_import_without_pandas():
+    code = ("import sys, formats, runs, stages; "
+            f"print([name for name in {ANALYSIS_MODULES!r} if name in sys.modules])")
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    completed = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, cwd=repo)
+    assert completed.stdout.strip() == '[]'
+
+
+def test_startup_problems():
+    fine = {'errors': [], 'first_run': 0.0, 'rerun': 0.0, 'loaded': []}
+    assert startup_problems(fine) == []
+    slow = dict(fine, first_run=STARTUP_BUDGET + 1, loaded=['pandas'])
+    problems = startup_problems(slow)
+    assert len(problems) == 2 and "pandas imported" in problems[1]
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from pipeline import (
+    DEFAULT_PARAMS, apply_seasonal, build_season_index, filter_performance, load_input, select_pilot_ags
+)
+from formats import SEASONAL_COLUMNS
+from streaming import QuantileSketch, stream_select
+
+
+def test_exact_mode_matches_the_full_pipeline(synthetic_pair, performance):
+    perf_path, season_path = synthetic_pair
+    params = dict(DEFAULT_PARAMS)
+    stream = stream_select(perf_path, params, chunksize=3_000, exact_quantiles=True)
+    assert stream.total_rows == len(performance)
+
+    filtered, funnel = filter_performance(performance, params)
+    assert stream.df['AG'].tolist() == filtered['AG'].tolist()
+    assert stream.funnel['Remaining'].iloc[-1] == funnel['Remaining'].iloc[-1]
+
+    season_index = build_season_index(load_input(season_path, usecols=SEASONAL_COLUMNS))
+    streamed, _ = apply_seasonal(stream.df, stream.funnel, season_index, params['max_salethrough'])
+    expected = select_pilot_ags(perf_path, season_path, params).results
+    assert len(expected)
+    assert streamed['AG'].tolist() == expected['AG'].tolist()
+
+
+def test_sketch_is_exact_before_compacting():
+    values = np.random.default_rng(1).lognormal(9, 1.2, 300)
+    sketch = QuantileSketch()
+    sketch.update(values)
+    assert sketch.exact
+    for q in (0, 20, 30, 80, 100):
+        assert sketch.percentile(q) == pytest.approx(np.percentile(values, q))
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_sketch_rank_error_within_half_a_percent(seed):
+    values = np.random.default_rng(seed).lognormal(9, 1.2, 1_000_000)
+    sketch = QuantileSketch(seed=seed)
+    for chunk in np.array_split(values, 100):
+        sketch.update(chunk)
+    assert not sketch.exact
+    assert sketch.size < 4 * sketch.k
+    ordered = np.sort(values)
+    for q in range(1, 100):
+        rank = np.searchsorted(ordered, sketch.percentile(q)) / len(values)
+        assert abs(rank - q / 100) <= 0.005, q
+
+
+def test_empty_sketch_raises():
+    with pytest.raises(ValueError):
+        QuantileSketch().percentile(50)
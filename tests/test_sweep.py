@@ -0,0 +1,40 @@
+import numpy as np
+
+from formats import SEASONAL_COLUMNS
+from pipeline import DEFAULT_PARAMS, build_season_index, load_input, select_pilot_ags
+from sweep import default_grid, grid_slice, sweep_selection
+
+
+def test_grid_cells_match_full_runs(synthetic_pair, performance):
+    season = load_input(synthetic_pair[1], usecols=SEASONAL_COLUMNS)
+    params = dict(DEFAULT_PARAMS)
+    grid = default_grid(performance, params)
+    result = sweep_selection(performance, params, grid, build_season_index(season))
+    assert result.counts.shape == tuple(len(values) for values in result.values)
+
+    rng = np.random.default_rng(0)
+    cells = [tuple(rng.integers(0, n) for n in result.counts.shape) for _ in range(20)]
+    # The current settings are always on the grid
+    cells.append(tuple(int(np.flatnonzero(values == params[param])[0])
+                       for param, values in zip(result.params, result.values)))
+    for cell in cells:
+        cell_params = dict(params, **{param: values[i]
+                                      for param, values, i in zip(result.params, result.values, cell)})
+        expected = len(select_pilot_ags(performance, season, cell_params).results)
+        assert result.counts[cell] == expected, cell_params
+
+
+def test_grid_slice_fixes_the_other_axes(performance):
+    columns = ['min_availability', 'min_age']
+    params = dict(DEFAULT_PARAMS)
+    grid = {param: values for param, values in default_grid(performance, params).items() if param in columns}
+    season = build_season_index(performance[['AG']].assign(**{'Global STR (%)': 0.0}))
+    result = sweep_selection(performance, params, grid, season)
+    plane = grid_slice(result, 'min_availability', 'min_age', params)
+    assert len(plane) == result.counts.size
+    row = plane[(plane['min_availability'] == params['min_availability'])
+                & (plane['min_age'] == params['min_age'])]
+    assert row['Selected AGs'].iloc[0] == result.counts[
+        np.flatnonzero(result.values[0] == params['min_availability'])[0],
+        np.flatnonzero(result.values[1] == params['min_age'])[0],
+    ]